@@ -4,38 +4,38 @@ Handles job analysis, email generation, and email sending
 """
 
 import os
-import json
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
+import time
+import uuid
 from datetime import datetime
 from typing import Dict, Any, Optional
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, g, Response, stream_with_context
 from flask_cors import CORS
 
 # Import our utilities and services
-from utils.env_manager import getenv, getenv_int, getenv_bool, get_env_manager
-from services.ai_agent import analyze_job_post
+from utils.env_manager import getenv, getenv_int, getenv_bool, getenv_float, get_env_manager
+from utils.deadline import set_deadline, reset_deadline, get_request_timeout, get_call_timeout, DeadlineExceeded
+from utils import json_codec
+from utils.json_codec import FastJSONProvider
+from services.ai_agent import analyze_job_post, get_analysis_cache_key
 from services.ai_settings import get_ai_settings_service
+from services.ai_metrics import get_ai_metrics
+from services.prompt_builder import get_profile_prefix_cache
+from services.circuit_breaker import get_circuit_stats
+from services.singleflight import get_singleflight
+from services.scheduler import get_provider_scheduler, set_priority, reset_priority, INTERACTIVE, PREFILTER
+from services.model_routing import get_stage_report, PRE_FILTER
+from services.provider_prober import get_provider_prober
+from services.batch_analysis import run_batch_analysis, analyze_jobs_ordered, summarize_batch, get_batch_job_limit
+from services.job_prefilter import ai_pre_filter_decisions, keyword_pre_filter_decisions, build_prefilter_response
+from services.email_service import get_email_service, CREDENTIALS_ERROR
+from services.email_outbox import get_email_outbox, resolve_idempotency_key
+from services.response_compression import compress_response, get_transfer_stats, get_compression_config
+from services.route_helpers import (health_status, server_error, parse_analyze_request, parse_prefilter_request,
+                                    parse_send_request, queued_send_response, duplicate_send_response, sent_response)
 # Import resume parsing utility
 from utils.resume_parser import parse_resume_file, get_resume_skills_for_job
 
-# Import AI libraries with availability checks
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-
-try:
-    from groq import Groq
-    GROQ_AVAILABLE = True
-except ImportError:
-    GROQ_AVAILABLE = False
-
 def setup_logging():
     """Setup logging configuration for production deployment"""
     import logging
@@ -78,12 +78,15 @@ def setup_logging():
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = FastJSONProvider(app)  # orjson when installed, compact outside debug
 CORS(app)  # Enable CORS for Chrome extension
 
 # Configuration from environment
 DEBUG = getenv_bool('DEBUG', False)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads'
+# Send application emails through the background outbox instead of inline
+EMAIL_QUEUE_ENABLED = getenv_bool('EMAIL_QUEUE_ENABLED', True)
 
 # Ensure required directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -93,68 +96,60 @@ os.makedirs('logs', exist_ok=True)
 if not DEBUG:
     setup_logging()
 
-class EmailService:
-    """Service for sending emails"""
-    
-    def __init__(self):
-        self.smtp_server = getenv('SMTP_SERVER', 'smtp.gmail.com')
-        self.smtp_port = getenv_int('SMTP_PORT', 587)
-        self.email = getenv('EMAIL_ADDRESS')
-        self.password = getenv('EMAIL_PASSWORD')
-        
-    def send_email(self, to_email: str, subject: str, body: str, attachment_path: Optional[str] = None) -> Dict[str, Any]:
-        """Send email with optional attachment"""
-        
-        if not self.email or not self.password:
-            return {
-                'success': False, 
-                'error': 'Email credentials not configured. Please set EMAIL_ADDRESS and EMAIL_PASSWORD in .env file'
-            }
-        
+@app.before_request
+def start_request_deadline():
+    """Start the deadline that bounds provider calls made by this request"""
+    g.deadline_token = set_deadline(get_request_timeout(request.headers.get('X-Request-Timeout')))
+
+@app.teardown_request
+def end_request_deadline(error=None):
+    """Clear the request deadline"""
+    token = g.pop('deadline_token', None)
+    if token is not None:
         try:
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = self.email
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            # Add body to email
-            msg.attach(MIMEText(body, 'plain'))
-            
-            # Add attachment if provided
-            if attachment_path and os.path.exists(attachment_path):
-                with open(attachment_path, "rb") as attachment:
-                    part = MIMEBase('application', 'octet-stream')
-                    part.set_payload(attachment.read())
-                
-                encoders.encode_base64(part)
-                part.add_header(
-                    'Content-Disposition',
-                    f'attachment; filename= {os.path.basename(attachment_path)}'
-                )
-                msg.attach(part)
-            
-            # Connect to server and send email
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.email, self.password)
-            text = msg.as_string()
-            server.sendmail(self.email, to_email, text)
-            server.quit()
-            
-            return {
-                'success': True,
-                'message': f'Email sent successfully to {to_email}'
-            }
-            
-        except Exception as e:
-            return {
-                'success': False,
-                'error': f'Failed to send email: {str(e)}'
-            }
+            reset_deadline(token)
+        except ValueError:
+            pass
+
+# Provider call priority per endpoint; anything not listed is interactive
+ROUTE_PRIORITIES = {
+    'pre_filter_jobs': PREFILTER,
+    'analyze_jobs': PREFILTER
+}
+
+@app.before_request
+def start_request_priority():
+    """Queue this request's provider calls under its endpoint's priority class"""
+    g.priority_token = set_priority(ROUTE_PRIORITIES.get(request.endpoint, INTERACTIVE))
+
+@app.before_request
+def start_provider_prober():
+    """Start this worker's background provider prober on its first request"""
+    get_provider_prober().ensure_started()
+
+@app.before_request
+def start_email_outbox():
+    """Start this worker's email senders on its first request, so messages queued before a restart go out"""
+    if EMAIL_QUEUE_ENABLED:
+        get_email_outbox().ensure_started()
+
+@app.teardown_request
+def end_request_priority(error=None):
+    """Clear the request priority class"""
+    token = g.pop('priority_token', None)
+    if token is not None:
+        try:
+            reset_priority(token)
+        except ValueError:
+            pass
+
+@app.after_request
+def compress_json_response(response):
+    """Compress JSON and NDJSON bodies for clients that accept gzip or brotli, counting bytes per endpoint"""
+    return compress_response(response, request.headers.get('Accept-Encoding'), request.endpoint or 'unmatched')
 
 # Initialize services
-email_service = EmailService()
+email_service = get_email_service()
 
 # Debug information
 if DEBUG:
@@ -165,50 +160,108 @@ if DEBUG:
 @app.route('/')
 def home():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'running',
-        'service': 'LinkedIn Job Assistant API',
-        'version': '1.0.0',
-        'timestamp': datetime.now().isoformat()
-    })
+    return jsonify(health_status())
 
 @app.route('/api/analyze-job', methods=['POST'])
 def analyze_job():
     """Analyze job post for relevance and generate application email"""
     
+    try:
+        job_data, user_profile, error = parse_analyze_request(request.get_json())
+        if error:
+            return jsonify({'error': error}), 400
+        
+        # Get AI settings for analysis (email generation route, plus the
+        # classify route when it uses a different model)
+        ai_service = get_ai_settings_service()
+        ai_settings = ai_service.get_analysis_config()
+        
+        # Analyze job using AI agent with stored settings. Identical requests in
+        # flight at the same time (several tabs, duplicate triggers) share one analysis.
+        cache_key = get_analysis_cache_key(job_data, user_profile, ai_settings)
+        result, shared = get_singleflight('analyze-job').do(
+            cache_key,
+            lambda: analyze_job_post(job_data, user_profile, ai_settings)
+        )
+        if shared and DEBUG:
+            app.logger.info(f"Job analysis shared with an identical in-flight request: {cache_key[:12]}")
+        
+        # Log analysis for debugging
+        if DEBUG:
+            app.logger.info(f"Job analysis completed: {result['status']} for job: {job_data.get('title', 'Unknown')}")
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        app.logger.error(f"Error in job analysis: {str(e)}")
+        return jsonify(server_error('Internal server error during job analysis', e, DEBUG)), 500
+
+@app.route('/api/analyze-jobs', methods=['POST'])
+def analyze_jobs():
+    """
+    Analyze a batch of job posts against one user profile
+    
+    Settings and the profile are resolved once for the whole batch, and jobs are
+    analyzed with bounded concurrency. Results come back in input order, each
+    with its own success flag; with "stream": true they are sent as NDJSON
+    lines in completion order (each tagged with its index), then a summary line.
+    """
+    
     try:
         data = request.get_json()
         
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        job_data = data.get('job_data', {})
+        jobs = data.get('jobs', [])
         user_profile = data.get('user_profile', {})
         
-        if not job_data:
-            return jsonify({'error': 'Job data is required'}), 400
+        if not jobs or not isinstance(jobs, list):
+            return jsonify({'error': 'Jobs array is required'}), 400
         
-        # Get AI settings for analysis
-        ai_service = get_ai_settings_service()
-        ai_settings = ai_service.get_active_provider_config()
+        max_concurrency = data.get('max_concurrency')
+        if max_concurrency is not None:
+            try:
+                max_concurrency = min(int(max_concurrency), getenv_int('ANALYZE_BATCH_CONCURRENCY', 4))
+            except (TypeError, ValueError):
+                return jsonify({'error': 'max_concurrency must be a number'}), 400
+        
+        # Every job gets its own deadline window, so only as many as fit in this request's deadline
+        max_jobs = get_batch_job_limit(max_concurrency)
+        if len(jobs) > max_jobs:
+            return jsonify({'error': f'At most {max_jobs} jobs per batch', 'max_jobs': max_jobs}), 400
+        
+        # Resolve AI settings once for the whole batch
+        ai_settings = get_ai_settings_service().get_analysis_config()
+        
+        if data.get('stream'):
+            def generate():
+                start_time = time.monotonic()
+                results = []
+                for outcome in run_batch_analysis(jobs, user_profile, ai_settings, max_concurrency):
+                    results.append(outcome)
+                    yield json_codec.dumps(outcome) + '\n'
+                summary = summarize_batch(results, time.monotonic() - start_time)
+                summary['done'] = True
+                yield json_codec.dumps(summary) + '\n'
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
         
-        # Analyze job using AI agent with stored settings
-        result = analyze_job_post(job_data, user_profile, ai_settings)
+        result = analyze_jobs_ordered(jobs, user_profile, ai_settings, max_concurrency)
         
-        # Log analysis for debugging
         if DEBUG:
-            app.logger.info(f"Job analysis completed: {result['status']} for job: {job_data.get('title', 'Unknown')}")
+            app.logger.info(f"Batch analysis completed: {result['succeeded']}/{result['count']} jobs "
+                            f"({result['fallback']} fallbacks) in {result['elapsed']}s")
         
         return jsonify(result)
         
     except Exception as e:
-        error_msg = f"Error in job analysis: {str(e)}"
-        app.logger.error(error_msg)
-        
-        return jsonify({
-            'error': 'Internal server error during job analysis',
-            'details': str(e) if DEBUG else None
-        }), 500
+        app.logger.error(f"Error in batch job analysis: {str(e)}")
+        return jsonify(server_error('Internal server error during batch job analysis', e, DEBUG)), 500
+
+def get_idempotency_key(message: Dict[str, Any], index: Optional[int] = None) -> str:
+    """Get a send's idempotency key, scoped by this request's Idempotency-Key header (see resolve_idempotency_key)"""
+    return resolve_idempotency_key(message, request.headers.get('Idempotency-Key'), index)
 
 @app.route('/api/send-email', methods=['POST'])
 def send_email():
@@ -216,41 +269,176 @@ def send_email():
     
     try:
         data = request.get_json()
+        message, error = parse_send_request(data)
+        if error:
+            return jsonify({'error': error}), 400
+        to_email = message['to_email']
         
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        to_email = data.get('email')
-        subject = data.get('subject')
-        body = data.get('body')
+        # Retried or double-submitted sends carry the same key and are not sent twice
+        idempotency_key = get_idempotency_key(data)
         
-        if not all([to_email, subject, body]):
-            return jsonify({'error': 'Email, subject, and body are required'}), 400
+        if EMAIL_QUEUE_ENABLED:
+            if not email_service.is_configured():
+                return jsonify({'success': False, 'error': CREDENTIALS_ERROR}), 500
+            
+            # Queue for the background senders; delivery state is polled via /api/email-status/<id>
+            record = get_email_outbox().enqueue(idempotency_key=idempotency_key, **message)
+            if record['duplicate']:
+                app.logger.info(f"Duplicate email to {to_email}, returning {record['id']}")
+            else:
+                app.logger.info(f"Email to {to_email} queued as {record['id']}")
+            payload, status = queued_send_response(record, to_email)
+            return jsonify(payload), status
         
-        # Check for resume attachment
-        attachment_path = None
-        if 'resume_path' in data and data['resume_path']:
-            attachment_path = data['resume_path']
-            if not os.path.exists(attachment_path):
-                return jsonify({'error': 'Resume file not found'}), 400
+        # Reserve the key before sending, so a concurrent double-submit can't send a second copy
+        outbox = get_email_outbox()
+        record = outbox.reserve_inline(idempotency_key=idempotency_key, **message)
+        if record['duplicate']:
+            app.logger.info(f"Duplicate email to {to_email}, already {record['status']} as {record['id']}")
+            return jsonify(duplicate_send_response(record, to_email))
         
         # Send email
-        result = email_service.send_email(to_email, subject, body, attachment_path)
+        try:
+            result = email_service.send_email(**message)
+        except Exception as e:
+            outbox.finish_inline(record['id'], f"Failed to send email: {str(e)}")
+            raise
+        record = outbox.finish_inline(record['id'], None if result['success'] else result['error'])
         
         if result['success']:
             app.logger.info(f"Email sent successfully to {to_email}")
-            return jsonify(result)
+            return jsonify(sent_response(result, record))
         else:
             app.logger.error(f"Failed to send email: {result['error']}")
             return jsonify(result), 500
             
     except Exception as e:
         app.logger.error(f"Error sending email: {str(e)}")
+        return jsonify(server_error('Internal server error while sending email', e, DEBUG)), 500
+
+@app.route('/api/send-emails', methods=['POST'])
+def send_emails():
+    """Queue a batch of application emails, paced per recipient domain"""
+    
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        messages = data.get('messages')
+        if not messages or not isinstance(messages, list):
+            return jsonify({'error': 'Messages array is required'}), 400
+        
+        max_messages = getenv_int('EMAIL_BATCH_MAX_MESSAGES', 100)
+        if len(messages) > max_messages:
+            return jsonify({'error': f'At most {max_messages} messages per batch'}), 400
+        
+        if not EMAIL_QUEUE_ENABLED:
+            return jsonify({'success': False, 'error': 'Bulk sending needs the email queue (EMAIL_QUEUE_ENABLED=True)'}), 503
+        if not email_service.is_configured():
+            return jsonify({'success': False, 'error': CREDENTIALS_ERROR}), 500
+        
+        # A top-level resume_path is attached to every message without its own
+        shared_resume = data.get('resume_path')
+        valid = []
+        results = [None] * len(messages)
+        for index, message in enumerate(messages):
+            if not isinstance(message, dict) or not all([message.get('email'), message.get('subject'), message.get('body')]):
+                results[index] = {'index': index, 'success': False, 'error': 'Email, subject, and body are required'}
+                continue
+            resume_path = message.get('resume_path') or shared_resume
+            if resume_path and not os.path.exists(resume_path):
+                results[index] = {'index': index, 'success': False, 'error': 'Resume file not found'}
+                continue
+            valid.append((index, {**message, 'resume_path': resume_path,
+                                  'idempotency_key': get_idempotency_key(message, index)}))
+        
+        batch_id = uuid.uuid4().hex
+        outbox = get_email_outbox()
+        records = outbox.enqueue_many([message for _, message in valid], batch_id) if valid else []
+        for (index, _), record in zip(valid, records):
+            results[index] = {'index': index, 'success': True, 'id': record['id'], 'status': record['status'],
+                              'duplicate': record['duplicate']}
+        duplicates = sum(1 for record in records if record['duplicate'])
+        app.logger.info(f"Email batch {batch_id}: {len(records) - duplicates} of {len(messages)} messages queued, "
+                        f"{duplicates} duplicates")
+        
+        response = {
+            'success': bool(records),
+            'batch_id': batch_id,
+            'queued': len(records) - duplicates,
+            'duplicates': duplicates,
+            'rejected': len(messages) - len(records),
+            'status_url': f"/api/email-batch/{batch_id}",
+            'results': results
+        }
+        
+        # Optionally hold the request until the batch is delivered, within the request deadline
+        if data.get('wait') and len(records) > duplicates:
+            wait_until = time.monotonic() + get_call_timeout(getenv_float('EMAIL_BATCH_WAIT_SECONDS', 20.0))
+            batch = outbox.get_batch_status(batch_id)
+            while not batch['complete'] and time.monotonic() < wait_until:
+                time.sleep(0.2)
+                batch = outbox.get_batch_status(batch_id)
+            # Duplicates keep their original message (and batch), so only new messages are updated
+            delivered = {message['id']: message for message in batch['messages']}
+            for (index, _), record in zip(valid, records):
+                message = delivered.get(record['id'])
+                if message is None:
+                    continue
+                results[index].update({'status': message['status'], 'attempts': message['attempts'],
+                                       'error': message['last_error']})
+                results[index]['success'] = message['status'] != 'failed'
+            response.update({
+                'complete': batch['complete'],
+                'counts': batch['counts'],
+                'elapsed_seconds': batch['elapsed_seconds'],
+                'messages_per_second': batch['messages_per_second']
+            })
+            return jsonify(response), 200 if batch['complete'] else 202
+        
+        return jsonify(response), 202 if records else 400
+        
+    except DeadlineExceeded as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
+        app.logger.error(f"Error queuing email batch: {str(e)}")
         return jsonify({
-            'error': 'Internal server error while sending email',
+            'error': 'Internal server error while queuing emails',
             'details': str(e) if app.debug else None
         }), 500
 
+@app.route('/api/email-batch/<batch_id>', methods=['GET'])
+def get_email_batch(batch_id):
+    """Get the delivery state and send rate of an email batch"""
+    try:
+        batch = get_email_outbox().get_batch_status(batch_id)
+        
+        if batch is None:
+            return jsonify({'success': False, 'error': 'Unknown batch id'}), 404
+        
+        return jsonify({'success': True, **batch})
+        
+    except Exception as e:
+        app.logger.error(f"Error getting email batch status: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/email-status/<message_id>', methods=['GET'])
+def get_email_status(message_id):
+    """Get the delivery state of a queued email"""
+    try:
+        record = get_email_outbox().get_status(message_id)
+        
+        if record is None:
+            return jsonify({'success': False, 'error': 'Unknown email id'}), 404
+        
+        return jsonify({'success': True, **record})
+        
+    except Exception as e:
+        app.logger.error(f"Error getting email status: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/upload-resume', methods=['POST'])
 def upload_resume():
     """Upload resume file"""
@@ -271,8 +459,8 @@ def upload_resume():
         if file_extension not in allowed_extensions:
             return jsonify({'error': 'Invalid file type. Allowed: PDF, DOC, DOCX, TXT'}), 400
         
-        # Save file
-        filename = f"resume_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_extension}"
+        # Save file (threaded and gevent workers can take two uploads in the same second)
+        filename = f"resume_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.{file_extension}"
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         file.save(file_path)
         
@@ -413,6 +601,18 @@ def get_ai_settings():
         print(f"❌ Error in get_ai_settings: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
+# Optional per-provider settings accepted by POST /api/ai-settings
+OPTIONAL_AI_SETTINGS = [
+    'model',
+    'structured_output',
+    'job_token_budget',
+    'enable_hedging',
+    'hedge_model',
+    'hedge_percentile',
+    'rate_limits',
+    'base_url'
+]
+
 @app.route('/api/ai-settings', methods=['POST'])
 def save_ai_settings():
     """Save AI provider settings"""
@@ -434,6 +634,9 @@ def save_ai_settings():
             'max_tokens': data.get('max_tokens', 1500),
             'enable_optimizations': data.get('enable_optimizations', True)
         }
+        for key in OPTIONAL_AI_SETTINGS:
+            if key in data:
+                additional_settings[key] = data[key]
         
         ai_service = get_ai_settings_service()
         result = ai_service.store_api_key(provider, api_key, additional_settings)
@@ -455,6 +658,38 @@ def clear_ai_settings():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/ai-settings/stage-routes', methods=['GET'])
+def get_stage_routes():
+    """Get the provider/model routed to each pipeline stage, with per-stage cost and latency"""
+    try:
+        ai_service = get_ai_settings_service()
+        
+        return jsonify({
+            'success': True,
+            'routes': ai_service.get_stage_routes(),
+            'report': get_stage_report()
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/ai-settings/stage-routes', methods=['POST'])
+def save_stage_routes():
+    """Save provider/model/max_tokens routes for pipeline stages"""
+    try:
+        data = request.get_json()
+        
+        if not data or 'routes' not in data:
+            return jsonify({'success': False, 'error': 'Routes are required'})
+        
+        ai_service = get_ai_settings_service()
+        result = ai_service.save_stage_routes(data['routes'])
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
 @app.route('/api/ai-settings/key-status', methods=['GET'])
 def get_api_key_status():
     """Get API key status for a provider"""
@@ -511,14 +746,62 @@ def test_ai_connection():
         if not provider or not api_key:
             return jsonify({'success': False, 'error': 'Provider and API key are required'})
         
+        # Recent background probe results answer the test unless a live call is requested
         ai_service = get_ai_settings_service()
-        result = ai_service.test_provider_connection(provider, api_key, model)
+        result = ai_service.test_provider_connection(provider, api_key, model, use_cache=not data.get('live', False))
         
         return jsonify(result)
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/ai-metrics', methods=['GET'])
+def get_ai_metrics_endpoint():
+    """Get AI provider call metrics for this worker process"""
+    try:
+        metrics = get_ai_metrics()
+        
+        return jsonify({
+            'success': True,
+            'parse_failures': metrics.get_parse_failure_stats(),
+            'prompt_prefix_cache': get_profile_prefix_cache().stats(),
+            'circuits': get_circuit_stats(),
+            'scheduler': get_provider_scheduler().stats(),
+            'stages': get_stage_report(),
+            'probes': get_provider_prober().get_status(),
+            'metrics': metrics.snapshot()
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/email-metrics', methods=['GET'])
+def get_email_metrics_endpoint():
+    """Get outgoing email metrics for this worker process"""
+    try:
+        return jsonify({
+            'success': True,
+            'smtp_pool': email_service.pool.stats(),
+            'attachment_cache': email_service.attachment_cache.stats(),
+            'outbox': get_email_outbox().stats() if EMAIL_QUEUE_ENABLED else None
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/transfer-metrics', methods=['GET'])
+def get_transfer_metrics_endpoint():
+    """Get response body bytes before and after compression per endpoint for this worker process"""
+    try:
+        return jsonify({
+            'success': True,
+            'compression': get_compression_config(),
+            'endpoints': get_transfer_stats().stats()
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
 @app.route('/api/ai-settings/get-key', methods=['POST'])
 def get_api_key_for_display():
     """Get full API key for display purposes (when user explicitly requests to show it)"""
@@ -592,243 +875,40 @@ def pre_filter_jobs():
     """Pre-filter jobs using AI to determine relevance quickly before full analysis"""
     
     try:
-        data = request.get_json()
+        params, error = parse_prefilter_request(request.get_json())
+        if error:
+            return jsonify({'error': error}), 400
+        jobs, user_profile = params['jobs'], params['user_profile']
+        response_mode, fields = params['response_mode'], params['fields']
         
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        jobs = data.get('jobs', [])
-        user_profile = data.get('user_profile', {})
-        
-        if not jobs:
-            return jsonify({'error': 'Jobs array is required'}), 400
-        
-        # Get AI settings for analysis
+        # Get AI settings routed to the pre-filter stage
         ai_service = get_ai_settings_service()
-        ai_settings = ai_service.get_active_provider_config()
+        ai_settings = ai_service.get_stage_config(PRE_FILTER)
         
         # If AI is available, use it for smart pre-filtering
         if ai_settings and ai_settings.get('api_key'):
             try:
                 # Use AI for intelligent pre-filtering
-                filtered_jobs = ai_pre_filter_jobs(jobs, user_profile, ai_settings)
+                decisions = ai_pre_filter_decisions(jobs, user_profile, ai_settings)
                 
-                app.logger.info(f"AI pre-filtered {len(jobs)} jobs to {len(filtered_jobs)} relevant jobs")
+                app.logger.info(f"AI pre-filtered {len(jobs)} jobs to {len(decisions)} relevant jobs")
                 
-                return jsonify({
-                    'success': True,
-                    'filteredJobs': filtered_jobs,
-                    'originalCount': len(jobs),
-                    'filteredCount': len(filtered_jobs),
-                    'method': 'ai'
-                })
+                return jsonify(build_prefilter_response(jobs, decisions, 'ai', response_mode, fields))
                 
             except Exception as ai_error:
                 app.logger.warning(f"AI pre-filtering failed: {ai_error}, falling back to keyword filtering")
                 # Fall through to keyword-based filtering
         
         # Fallback: Use keyword-based filtering
-        filtered_jobs = keyword_pre_filter_jobs(jobs, user_profile)
+        decisions = keyword_pre_filter_decisions(jobs, user_profile)
         
-        app.logger.info(f"Keyword pre-filtered {len(jobs)} jobs to {len(filtered_jobs)} relevant jobs")
+        app.logger.info(f"Keyword pre-filtered {len(jobs)} jobs to {len(decisions)} relevant jobs")
         
-        return jsonify({
-            'success': True,
-            'filteredJobs': filtered_jobs,
-            'originalCount': len(jobs),
-            'filteredCount': len(filtered_jobs),
-            'method': 'keyword'
-        })
+        return jsonify(build_prefilter_response(jobs, decisions, 'keyword', response_mode, fields))
         
     except Exception as e:
         app.logger.error(f"Error in pre-filtering jobs: {str(e)}")
-        return jsonify({
-            'error': 'Internal server error during job pre-filtering',
-            'details': str(e) if DEBUG else None
-        }), 500
-
-def ai_pre_filter_jobs(jobs, user_profile, ai_settings):
-    """Use AI to intelligently pre-filter jobs with a lightweight approach"""
-    
-    # Create a concise prompt for quick relevance assessment
-    user_skills = ', '.join(user_profile.get('skills', []))
-    user_domain = user_profile.get('domain', 'Software Development')
-    excluded_roles = ', '.join(user_profile.get('excludedRoles', []))
-    
-    filtered_jobs = []
-    
-    # Process jobs in batches for efficiency
-    batch_size = 5
-    for i in range(0, len(jobs), batch_size):
-        batch = jobs[i:i + batch_size]
-        
-        try:
-            # Create batch prompt for multiple jobs at once
-            batch_prompt = f"""
-            User Profile:
-            - Skills: {user_skills}
-            - Domain: {user_domain}
-            - Excluded roles: {excluded_roles}
-            
-            Analyze the following {len(batch)} jobs for relevance. For each job, respond with only "RELEVANT", "MAYBE", or "NOT_RELEVANT".
-            
-            """
-            
-            for idx, job in enumerate(batch):
-                job_summary = f"""
-                Job {idx + 1}:
-                Title: {job.get('title', 'Unknown')}
-                Company: {job.get('company', 'Unknown')}
-                Description: {(job.get('description', '') + ' ' + job.get('content', ''))[:300]}
-                """
-                batch_prompt += job_summary + "\n"
-            
-            batch_prompt += "\nRespond with exactly one line per job: Job1: RELEVANT/MAYBE/NOT_RELEVANT, Job2: RELEVANT/MAYBE/NOT_RELEVANT, etc."
-            
-            # Use AI for batch analysis
-            if ai_settings.get('provider') == 'openai' and OPENAI_AVAILABLE:
-                client = openai.OpenAI(api_key=ai_settings.get('api_key'))
-                response = client.chat.completions.create(
-                    model=ai_settings.get('model', 'gpt-4'),
-                    messages=[
-                        {"role": "system", "content": "You are a job relevance analyzer. Respond concisely with only the requested format."},
-                        {"role": "user", "content": batch_prompt}
-                    ],
-                    max_tokens=200,
-                    temperature=0.3
-                )
-                ai_response = response.choices[0].message.content.strip()
-                
-            elif ai_settings.get('provider') == 'groq' and GROQ_AVAILABLE:
-                client = Groq(api_key=ai_settings.get('api_key'))
-                response = client.chat.completions.create(
-                    model=ai_settings.get('model', 'llama3-8b-8192'),
-                    messages=[
-                        {"role": "system", "content": "You are a job relevance analyzer. Respond concisely with only the requested format."},
-                        {"role": "user", "content": batch_prompt}
-                    ],
-                    max_tokens=200,
-                    temperature=0.3
-                )
-                ai_response = response.choices[0].message.content.strip()
-            
-            else:
-                # Fallback to keyword filtering for this batch
-                for job in batch:
-                    if keyword_match_job(job, user_profile):
-                        filtered_jobs.append(job)
-                continue
-            
-            # Parse AI response and filter jobs
-            response_lines = ai_response.split('\n')
-            for idx, job in enumerate(batch):
-                try:
-                    if idx < len(response_lines):
-                        line = response_lines[idx].upper()
-                        if 'RELEVANT' in line or 'MAYBE' in line:
-                            filtered_jobs.append(job)
-                    else:
-                        # If response is incomplete, include job to be safe
-                        filtered_jobs.append(job)
-                except:
-                    # If parsing fails, include job to be safe
-                    filtered_jobs.append(job)
-                    
-        except Exception as e:
-            app.logger.warning(f"AI batch analysis failed: {e}, falling back to keyword matching for batch")
-            # Fallback to keyword filtering for this batch
-            for job in batch:
-                if keyword_match_job(job, user_profile):
-                    filtered_jobs.append(job)
-    
-    return filtered_jobs
-
-def keyword_match_job(job, user_profile):
-    """Quick keyword matching for a single job"""
-    user_skills = user_profile.get('skills', [])
-    excluded_roles = [role.lower() for role in user_profile.get('excludedRoles', [])]
-    
-    # Convert skills to lowercase for matching
-    if isinstance(user_skills, list):
-        user_skills_lower = [skill.lower() for skill in user_skills]
-    else:
-        user_skills_lower = []
-    
-    job_content = f"{job.get('title', '')} {job.get('company', '')} {job.get('description', '')} {job.get('content', '')}".lower()
-    
-    # Basic relevance scoring
-    score = 0
-    
-    # Technical keywords that indicate relevant jobs
-    tech_keywords = ['developer', 'engineer', 'programmer', 'software', 'python', 'javascript', 'api', 'backend', 'frontend', 'ml', 'ai', 'data']
-    for keyword in tech_keywords:
-        if keyword in job_content:
-            score += 1
-    
-    # User skills matching (higher weight)
-    for skill in user_skills_lower:
-        if skill and skill in job_content:
-            score += 3
-    
-    # Check for excluded roles (negative score)
-    excluded_found = False
-    for excluded in excluded_roles:
-        if excluded and excluded in job_content:
-            excluded_found = True
-            break
-    
-    # Include job if score is positive and no excluded roles found
-    return score > 2 and not excluded_found
-
-def keyword_pre_filter_jobs(jobs, user_profile):
-    """Use keyword-based filtering as fallback"""
-    
-    user_skills = user_profile.get('skills', [])
-    user_domain = user_profile.get('domain', '').lower()
-    excluded_roles = [role.lower() for role in user_profile.get('excludedRoles', [])]
-    
-    # Convert skills to lowercase for matching
-    if isinstance(user_skills, list):
-        user_skills_lower = [skill.lower() for skill in user_skills]
-    else:
-        user_skills_lower = []
-    
-    filtered_jobs = []
-    
-    for job in jobs:
-        job_content = f"{job.get('title', '')} {job.get('company', '')} {job.get('description', '')} {job.get('content', '')}".lower()
-        
-        # Basic relevance scoring
-        score = 0
-        
-        # Technical keywords that indicate relevant jobs
-        tech_keywords = ['developer', 'engineer', 'programmer', 'software', 'python', 'javascript', 'api', 'backend', 'frontend', 'ml', 'ai', 'data']
-        for keyword in tech_keywords:
-            if keyword in job_content:
-                score += 1
-        
-        # User skills matching (higher weight)
-        for skill in user_skills_lower:
-            if skill and skill in job_content:
-                score += 3
-        
-        # Domain matching
-        if user_domain and user_domain in job_content:
-            score += 2
-        
-        # Check for excluded roles (negative score)
-        excluded_found = False
-        for excluded in excluded_roles:
-            if excluded and excluded in job_content:
-                excluded_found = True
-                score -= 5  # Heavy penalty for excluded roles
-                break
-        
-        # Include job if score is positive and no excluded roles found
-        if score > 2 and not excluded_found:
-            filtered_jobs.append(job)
-    
-    return filtered_jobs
+        return jsonify(server_error('Internal server error during job pre-filtering', e, DEBUG)), 500
 
 # ==================== MAIN APPLICATION ====================
 
@@ -846,14 +926,22 @@ if __name__ == '__main__':
         
     print(f"🔗 Available endpoints:")
     print(f"   - POST /api/analyze-job - Analyze job posts")
+    print(f"   - POST /api/analyze-jobs - Analyze a batch of job posts")
     print(f"   - POST /api/send-email - Send application emails")
+    print(f"   - POST /api/send-emails - Queue a batch of application emails")
+    print(f"   - GET /api/email-status/<id> - Delivery state of a queued email")
+    print(f"   - GET /api/email-batch/<id> - Delivery state of an email batch")
     print(f"   - POST /api/upload-resume - Upload resume files")
     print(f"   - GET/POST /api/user-profile - Manage user profile")
     print(f"   - POST /api/test-email - Test email configuration")
     print(f"   - GET/POST/DELETE /api/ai-settings - Manage AI settings")
     print(f"   - GET /api/ai-settings/key-status - Check API key status")
     print(f"   - POST /api/ai-settings/get-key - Get API key for display")
+    print(f"   - GET/POST /api/ai-settings/stage-routes - Per-stage model routing")
     print(f"   - POST /api/test-ai - Test AI connection")
+    print(f"   - GET /api/ai-metrics - AI provider call metrics")
+    print(f"   - GET /api/email-metrics - SMTP pool, attachment cache and outbox metrics")
+    print(f"   - GET /api/transfer-metrics - Response bytes and compression per endpoint")
     print(f"   - POST /api/parse-resume - Parse resumes for skills")
     print(f"   - POST /api/pre-filter-jobs - Pre-filter jobs using AI")
     
@@ -0,0 +1,420 @@
+"""
+ASGI entry point for the LinkedIn Job Assistant API
+Serves the high-volume endpoints with native async handlers, so one process
+keeps thousands of analyses in flight, and every other route through the
+Flask app on a bridge thread pool
+
+Run with: uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
+
+from utils.env_manager import getenv_int
+from utils.deadline import set_deadline, reset_deadline, get_request_timeout
+from utils import json_codec
+from services.ai_agent import analyze_job_post_async, get_analysis_cache_key
+from services.ai_settings import get_ai_settings_service
+from services.singleflight import get_singleflight
+from services.scheduler import set_priority, reset_priority, INTERACTIVE
+from services.model_routing import PRE_FILTER
+from services.provider_prober import get_provider_prober
+from services.job_prefilter import ai_pre_filter_decisions_async, keyword_pre_filter_decisions, build_prefilter_response
+from services.email_service import CREDENTIALS_ERROR
+from services.email_outbox import get_email_outbox, resolve_idempotency_key
+from services.response_compression import encode_body
+from services.route_helpers import (health_status, server_error, parse_analyze_request, parse_prefilter_request,
+                                    parse_send_request, queued_send_response, duplicate_send_response, sent_response)
+from app import app as flask_app, DEBUG, EMAIL_QUEUE_ENABLED, ROUTE_PRIORITIES, email_service
+
+MAX_CONTENT_LENGTH = flask_app.config['MAX_CONTENT_LENGTH']
+
+# Threads running Flask for routes without a native handler
+_bridge_executor = ThreadPoolExecutor(max_workers=max(1, getenv_int('ASGI_WSGI_THREADS', 16)),
+                                      thread_name_prefix='wsgi-bridge')
+
+
+class RequestBodyTooLarge(Exception):
+    """Raised when a request body exceeds MAX_CONTENT_LENGTH"""
+    pass
+
+
+class Request:
+    """The parts of an ASGI HTTP request the native handlers use"""
+
+    def __init__(self, scope: Dict[str, Any], body: bytes):
+        self.scope = scope
+        self.method = scope['method']
+        self.path = scope['path']
+        self.body = body
+        self.headers = {}
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').lower()
+            value = value.decode('latin-1')
+            self.headers[name] = f"{self.headers[name]},{value}" if name in self.headers else value
+
+    def get_json(self) -> Optional[Any]:
+        """Parse the JSON body (None if it is empty or not valid JSON)"""
+        if not self.body:
+            return None
+        try:
+            return json_codec.loads(self.body)
+        except ValueError:
+            return None
+
+
+# ==================== NATIVE ROUTES ====================
+
+async def home(request: Request) -> Tuple[Dict[str, Any], int]:
+    """Health check endpoint"""
+    return health_status(), 200
+
+
+async def analyze_job(request: Request) -> Tuple[Dict[str, Any], int]:
+    """Analyze job post for relevance and generate application email"""
+
+    try:
+        job_data, user_profile, error = parse_analyze_request(request.get_json())
+        if error:
+            return {'error': error}, 400
+
+        ai_settings = await asyncio.to_thread(get_ai_settings_service().get_analysis_config)
+
+        # Identical requests in flight at the same time share one analysis
+        cache_key = get_analysis_cache_key(job_data, user_profile, ai_settings)
+        result, shared = await get_singleflight('analyze-job').do_async(
+            cache_key,
+            lambda: analyze_job_post_async(job_data, user_profile, ai_settings)
+        )
+        if shared and DEBUG:
+            flask_app.logger.info(f"Job analysis shared with an identical in-flight request: {cache_key[:12]}")
+
+        if DEBUG:
+            flask_app.logger.info(f"Job analysis completed: {result['status']} for job: {job_data.get('title', 'Unknown')}")
+
+        return result, 200
+
+    except Exception as e:
+        flask_app.logger.error(f"Error in job analysis: {str(e)}")
+        return server_error('Internal server error during job analysis', e, DEBUG), 500
+
+
+async def pre_filter_jobs(request: Request) -> Tuple[Dict[str, Any], int]:
+    """Pre-filter jobs using AI to determine relevance quickly before full analysis"""
+
+    try:
+        params, error = parse_prefilter_request(request.get_json())
+        if error:
+            return {'error': error}, 400
+        jobs, user_profile = params['jobs'], params['user_profile']
+        response_mode, fields = params['response_mode'], params['fields']
+
+        ai_settings = await asyncio.to_thread(get_ai_settings_service().get_stage_config, PRE_FILTER)
+
+        if ai_settings and ai_settings.get('api_key'):
+            try:
+                decisions = await ai_pre_filter_decisions_async(jobs, user_profile, ai_settings)
+
+                flask_app.logger.info(f"AI pre-filtered {len(jobs)} jobs to {len(decisions)} relevant jobs")
+
+                return build_prefilter_response(jobs, decisions, 'ai', response_mode, fields), 200
+
+            except Exception as ai_error:
+                flask_app.logger.warning(f"AI pre-filtering failed: {ai_error}, falling back to keyword filtering")
+
+        decisions = keyword_pre_filter_decisions(jobs, user_profile)
+
+        flask_app.logger.info(f"Keyword pre-filtered {len(jobs)} jobs to {len(decisions)} relevant jobs")
+
+        return build_prefilter_response(jobs, decisions, 'keyword', response_mode, fields), 200
+
+    except Exception as e:
+        flask_app.logger.error(f"Error in pre-filtering jobs: {str(e)}")
+        return server_error('Internal server error during job pre-filtering', e, DEBUG), 500
+
+
+async def send_email(request: Request) -> Tuple[Dict[str, Any], int]:
+    """Send application email"""
+
+    try:
+        data = request.get_json()
+        message, error = parse_send_request(data)
+        if error:
+            return {'error': error}, 400
+        to_email = message['to_email']
+
+        # Retried or double-submitted sends carry the same key and are not sent twice
+        idempotency_key = resolve_idempotency_key(data, request.headers.get('idempotency-key'))
+        outbox = get_email_outbox()
+
+        if EMAIL_QUEUE_ENABLED:
+            if not email_service.is_configured():
+                return {'success': False, 'error': CREDENTIALS_ERROR}, 500
+
+            record = await asyncio.to_thread(outbox.enqueue, idempotency_key=idempotency_key, **message)
+            if record['duplicate']:
+                flask_app.logger.info(f"Duplicate email to {to_email}, returning {record['id']}")
+            else:
+                flask_app.logger.info(f"Email to {to_email} queued as {record['id']}")
+            return queued_send_response(record, to_email)
+
+        record = await asyncio.to_thread(outbox.reserve_inline, idempotency_key=idempotency_key, **message)
+        if record['duplicate']:
+            flask_app.logger.info(f"Duplicate email to {to_email}, already {record['status']} as {record['id']}")
+            return duplicate_send_response(record, to_email), 200
+
+        try:
+            result = await email_service.send_email_async(**message)
+        except Exception as e:
+            # A cancelled send may have gone out, so it keeps its reservation until claim_timeout
+            await asyncio.to_thread(outbox.finish_inline, record['id'], f"Failed to send email: {str(e)}")
+            raise
+        record = await asyncio.to_thread(outbox.finish_inline, record['id'], None if result['success'] else result['error'])
+
+        if result['success']:
+            flask_app.logger.info(f"Email sent successfully to {to_email}")
+            return sent_response(result, record), 200
+        else:
+            flask_app.logger.error(f"Failed to send email: {result['error']}")
+            return result, 500
+
+    except Exception as e:
+        flask_app.logger.error(f"Error sending email: {str(e)}")
+        return server_error('Internal server error while sending email', e, DEBUG), 500
+
+
+# (method, path) -> (Flask endpoint name, handler); the endpoint name picks the priority class
+NATIVE_ROUTES = {
+    ('GET', '/'): ('home', home),
+    ('POST', '/api/analyze-job'): ('analyze_job', analyze_job),
+    ('POST', '/api/pre-filter-jobs'): ('pre_filter_jobs', pre_filter_jobs),
+    ('POST', '/api/send-email'): ('send_email', send_email)
+}
+
+
+# ==================== ASGI APPLICATION ====================
+
+async def app(scope: Dict[str, Any], receive, send):
+    """ASGI application: native handlers for NATIVE_ROUTES, the Flask app for everything else"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    route = NATIVE_ROUTES.get((scope['method'], scope['path']))
+    if route is None:
+        await _wsgi_bridge(scope, receive, send)
+        return
+
+    # Lifespan events are optional in ASGI; start on first request like the Flask app
+    start_background_services()
+
+    endpoint, handler = route
+    try:
+        body = await _read_body(scope, receive)
+    except RequestBodyTooLarge:
+        await _send_json(send, Request(scope, b''), {'error': 'Request body too large'}, 413, endpoint)
+        return
+    request = Request(scope, body)
+
+    # Bound this request's provider calls and queue them under its endpoint's priority class
+    deadline_token = set_deadline(get_request_timeout(request.headers.get('x-request-timeout')))
+    priority_token = set_priority(ROUTE_PRIORITIES.get(endpoint, INTERACTIVE))
+    try:
+        payload, status = await handler(request)
+    finally:
+        reset_priority(priority_token)
+        reset_deadline(deadline_token)
+
+    await _send_json(send, request, payload, status, endpoint)
+
+
+def start_background_services():
+    """Start this process's provider prober and email senders if they aren't running"""
+    get_provider_prober().ensure_started()
+    if EMAIL_QUEUE_ENABLED:
+        get_email_outbox().ensure_started()
+
+
+async def _lifespan(receive, send):
+    """Handle ASGI lifespan startup and shutdown"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                start_background_services()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            get_provider_prober().stop()
+            get_email_outbox().stop()
+            _bridge_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def _read_body(scope: Dict[str, Any], receive) -> bytes:
+    """
+    Read the full request body
+
+    Raises:
+        RequestBodyTooLarge: If the body exceeds MAX_CONTENT_LENGTH
+    """
+    for name, value in scope.get('headers', []):
+        if name.lower() == b'content-length' and value.isdigit() and int(value) > MAX_CONTENT_LENGTH:
+            raise RequestBodyTooLarge()
+
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_CONTENT_LENGTH:
+            raise RequestBodyTooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            break
+    return b''.join(chunks)
+
+
+def _cors_headers(request: Request) -> list:
+    """CORS headers matching the Flask app's flask_cors defaults (any origin, echoed back)"""
+    origin = request.headers.get('origin')
+    if not origin:
+        return []
+    return [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+
+
+async def _send_json(send, request: Request, payload: Any, status: int, endpoint: str = 'unmatched'):
+    """Send a JSON response encoded and compressed like the Flask app's jsonify()"""
+    body = json_codec.dumps_bytes(payload, flask_app.json.default, flask_app.json.sort_keys) + b'\n'
+    body, encoding = encode_body(body, request.headers.get('accept-encoding'), endpoint)
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode('latin-1')),
+        (b'vary', b'Accept-Encoding')
+    ] + _cors_headers(request)
+    if encoding:
+        headers.append((b'content-encoding', encoding.encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+# ==================== WSGI BRIDGE ====================
+
+async def _wsgi_bridge(scope: Dict[str, Any], receive, send):
+    """
+    Serve a request with the Flask app on a bridge thread
+
+    The response is streamed as the app produces it, so NDJSON endpoints
+    (e.g. /api/analyze-jobs) still deliver each line as it is ready.
+    """
+    try:
+        body = await _read_body(scope, receive)
+    except RequestBodyTooLarge:
+        await _send_json(send, Request(scope, b''), {'error': 'Request body too large'}, 413)
+        return
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    environ = _build_environ(scope, body)
+
+    def emit(item):
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    def run():
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = headers
+            return write
+
+        def write(data):
+            flush_start()
+            if data:
+                emit(('body', data))
+
+        def flush_start():
+            if not response.get('started'):
+                response['started'] = True
+                emit(('start', response['status'], response['headers']))
+
+        try:
+            result = flask_app(environ, start_response)
+            try:
+                for chunk in result:
+                    write(chunk)
+                flush_start()
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+            emit(('end',))
+        except Exception as e:
+            emit(('error', e))
+
+    loop.run_in_executor(_bridge_executor, run)
+
+    started = False
+    while True:
+        item = await queue.get()
+        if item[0] == 'start':
+            started = True
+            headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in item[2]]
+            await send({'type': 'http.response.start', 'status': item[1], 'headers': headers})
+        elif item[0] == 'body':
+            await send({'type': 'http.response.body', 'body': item[1], 'more_body': True})
+        elif item[0] == 'end':
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        else:
+            flask_app.logger.error(f"WSGI bridge error for {scope['method']} {scope['path']}: {item[1]}", exc_info=item[1])
+            if not started:
+                await _send_json(send, Request(scope, b''), {'error': 'Internal server error'}, 500)
+            else:
+                await send({'type': 'http.response.body', 'body': b''})
+            return
+
+
+def _build_environ(scope: Dict[str, Any], body: bytes) -> Dict[str, Any]:
+    """Build the WSGI environ for an ASGI HTTP scope"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    if client:
+        environ['REMOTE_ADDR'] = client[0]
+        environ['REMOTE_PORT'] = str(client[1])
+
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = name if name == 'CONTENT_TYPE' else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
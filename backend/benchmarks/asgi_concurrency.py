@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+ASGI concurrency benchmark
+Fires bursts of concurrent /api/analyze-job requests at the ASGI app (asgi.py)
+in-process over httpx's ASGI transport, against the fake provider, and reports
+wall time, throughput, latency percentiles and how many analyses came back from
+the provider rather than the rule-based fallback. With --threads, the same
+burst also goes through the Flask app on a thread pool of that size, the way a
+gthread worker would serve it.
+
+The provider call scheduler and async connection pool are sized to the largest
+burst so the numbers show how many analyses one process keeps in flight.
+
+Usage:
+    cd backend && python benchmarks/asgi_concurrency.py --concurrency 100,1000,2000
+    cd backend && python benchmarks/asgi_concurrency.py --concurrency 500 --threads 16 \\
+        --provider-args "--latency-ms 2000 --latency-dist fixed"
+"""
+
+import argparse
+import asyncio
+import contextlib
+import copy
+import json
+import os
+import secrets
+import shlex
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from services.ai_metrics import percentile
+from tools import fake_provider
+
+DEFAULT_SAMPLES = os.path.join(BACKEND_DIR, 'benchmarks', 'data', 'sample_jobs.jsonl')
+
+# Well-formed fake key; the fake provider accepts anything
+FAKE_OPENAI_KEY = 'sk-proj-' + 'asgibench' * 5
+
+PROFILE = {
+    'name': 'ASGI Benchmark',
+    'domain': 'Python Backend Development + AI/ML',
+    'skills': ['Python', 'Flask', 'FastAPI', 'PostgreSQL', 'Docker'],
+    'preferredRoles': ['Backend Developer', 'AI/ML Engineer'],
+    'excludedRoles': ['Frontend', 'Sales']
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Measure concurrent in-flight analyses served by the ASGI app')
+    parser.add_argument('--concurrency', default='100,1000,2000', help='Comma-separated burst sizes (default: 100,1000,2000)')
+    parser.add_argument('--threads', type=int, default=0,
+                        help='Also run each burst through the Flask app on this many threads (default: off)')
+    parser.add_argument('--samples', default=DEFAULT_SAMPLES, help='JSONL sample jobs ({"job": {...}} per line)')
+    parser.add_argument('--provider-args', default='--latency-ms 1000 --latency-dist fixed',
+                        help='Arguments for the in-process fake provider (see tools/fake_provider.py --help)')
+    parser.add_argument('--connections', type=int, default=None,
+                        help='ASYNC_AI_MAX_CONNECTIONS for the provider client (default: the largest burst)')
+    parser.add_argument('--deadline', type=float, default=60, help='REQUEST_DEADLINE_SECONDS for the run (default: 60)')
+    return parser.parse_args(argv)
+
+
+def configure_environment(workdir, max_concurrency, connections, deadline):
+    """Throwaway settings and limits sized for the largest burst; must run before the app is imported"""
+    os.environ.update({
+        'AI_SETTINGS_FILE': os.path.join(workdir, 'ai_settings.json'),
+        'CRYPTO_MASTER_KEY': secrets.token_urlsafe(32),
+        'RATE_LIMIT_DB': os.path.join(workdir, 'rate_limits.sqlite3'),
+        'SINGLEFLIGHT_DIR': os.path.join(workdir, 'singleflight'),
+        'OPENAI_RPM': '100000000',
+        'OPENAI_TPM': '100000000000',
+        'SCHEDULER_MAX_CONCURRENCY': str(max_concurrency),
+        'ASYNC_AI_MAX_CONNECTIONS': str(connections),
+        'ASYNC_AI_MAX_KEEPALIVE': str(connections),
+        'REQUEST_DEADLINE_SECONDS': str(deadline),
+        'AI_REQUEST_TIMEOUT': str(deadline),
+        # Calls queue on this process's CPU at large bursts; don't let that trip the
+        # provider's slow-call breaker and turn the next run into fallbacks
+        'CIRCUIT_SLOW_CALL_SECONDS': str(deadline),
+        'PROBER_ENABLED': 'False',
+        'EMAIL_QUEUE_ENABLED': 'False',
+        'DEBUG': 'False'
+    })
+
+
+def build_requests(jobs, count, offset):
+    """Unique analyze requests, so coalescing doesn't merge them"""
+    bodies = []
+    for number in range(offset, offset + count):
+        job = copy.deepcopy(jobs[number % len(jobs)])
+        field = 'description' if job.get('description') else 'content'
+        job[field] = f"{job.get(field, '')}\nReference: ASGI-{number}"
+        bodies.append({'job_data': job, 'user_profile': PROFILE})
+    return bodies
+
+
+def summarize(label, count, wall, latencies, outcomes):
+    ok = outcomes.count('ai')
+    print(f"{label:>12} {count:>6} {wall:>8.2f}s {count / wall:>9.1f} "
+          f"{percentile(latencies, 50):>8.2f}s {percentile(latencies, 95):>8.2f}s "
+          f"{percentile(latencies, 99):>8.2f}s {ok:>6} {outcomes.count('fallback'):>8} {outcomes.count('error'):>6}")
+    return {'mode': label, 'requests': count, 'wall_seconds': wall, 'requests_per_second': count / wall,
+            'p50': percentile(latencies, 50), 'p95': percentile(latencies, 95), 'p99': percentile(latencies, 99),
+            'ai': ok, 'fallback': outcomes.count('fallback'), 'errors': outcomes.count('error')}
+
+
+def outcome(status, result):
+    if status != 200:
+        return 'error'
+    return 'fallback' if result.get('fallback') else 'ai'
+
+
+async def run_asgi_burst(client, bodies):
+    """Send every request at once and wait for all of them"""
+    async def one(body):
+        start = time.monotonic()
+        response = await client.post('/api/analyze-job', json=body)
+        return time.monotonic() - start, outcome(response.status_code, response.json())
+
+    start = time.monotonic()
+    results = await asyncio.gather(*(one(body) for body in bodies))
+    return time.monotonic() - start, results
+
+
+def run_thread_burst(flask_app, bodies, threads):
+    """Serve the same burst with the Flask app on a fixed thread pool"""
+    client = flask_app.test_client()
+
+    def one(body):
+        start = time.monotonic()
+        response = client.post('/api/analyze-job', json=body)
+        return time.monotonic() - start, outcome(response.status_code, response.get_json())
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(one, bodies))
+    return time.monotonic() - start, results
+
+
+async def run(args, bursts, jobs, provider_url):
+    import httpx
+    import asgi
+
+    transport = httpx.ASGITransport(app=asgi.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://asgi', timeout=args.deadline + 30) as client:
+        response = await client.post('/api/ai-settings', json={
+            'provider': 'openai',
+            'api_key': FAKE_OPENAI_KEY,
+            'model': 'gpt-4o-mini',
+            'base_url': provider_url
+        })
+        if not response.json().get('success'):
+            raise RuntimeError(f"Could not store AI settings: {response.text}")
+
+        print(f"\n{'mode':>12} {'reqs':>6} {'wall':>9} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} "
+              f"{'ai':>6} {'fallback':>8} {'errors':>6}")
+        runs = []
+        offset = 0
+        for count in bursts:
+            bodies = build_requests(jobs, count, offset)
+            offset += count
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                wall, results = await run_asgi_burst(client, bodies)
+            runs.append(summarize('asgi', count, wall, [r[0] for r in results], [r[1] for r in results]))
+
+            if args.threads:
+                bodies = build_requests(jobs, count, offset)
+                offset += count
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    wall, results = await asyncio.to_thread(run_thread_burst, asgi.flask_app, bodies, args.threads)
+                runs.append(summarize(f"threads:{args.threads}", count, wall,
+                                      [r[0] for r in results], [r[1] for r in results]))
+        return runs
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    bursts = [int(count) for count in args.concurrency.split(',') if count.strip()]
+
+    with open(args.samples, 'r', encoding='utf-8') as f:
+        jobs = [json.loads(line)['job'] for line in f if line.strip()]
+
+    workdir = tempfile.mkdtemp(prefix='job_assistant_asgi_')
+    configure_environment(workdir, max(bursts), args.connections or max(bursts), args.deadline)
+
+    provider = fake_provider.make_server(fake_provider.parse_args(shlex.split(args.provider_args) + ['--port', '0']))
+    threading.Thread(target=provider.serve_forever, daemon=True).start()
+    provider_url = 'http://%s:%d/v1' % provider.server_address[:2]
+    print(f"🧪 Fake provider at {provider_url} ({args.provider_args})")
+
+    try:
+        asyncio.run(run(args, bursts, jobs, provider_url))
+    finally:
+        provider.shutdown()
+        print(f"\n📊 Fake provider: {provider.RequestHandlerClass.config.stats}")
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Email sending throughput benchmark
+Sends messages through EmailService against the local SMTP sink, once the way
+it worked before pooling (fresh connection and login per message, attachment
+re-encoded every time) and once over the SMTP connection pool with the
+attachment cache, and reports messages/sec, latency and message build time
+
+Usage:
+    cd backend && python benchmarks/email_throughput.py --messages 500 --concurrency 4
+    cd backend && python benchmarks/email_throughput.py --sink-args "--greeting-latency-ms 80 --latency-ms 10"
+"""
+
+import argparse
+import os
+import shlex
+import smtplib
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from services.ai_metrics import percentile
+from services.email_service import EmailService
+from tools import smtp_sink
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Compare per-message SMTP connections with the connection pool')
+    parser.add_argument('--messages', type=int, default=300, help='Messages per mode (default: 300)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Sending threads (default: 4)')
+    parser.add_argument('--pool-size', type=int, default=4, help='SMTP_POOL_SIZE for the pooled run (default: 4)')
+    parser.add_argument('--attachment-kb', type=int, default=200, help='Size of the attached resume (0 for none)')
+    parser.add_argument('--sink-args', default='--greeting-latency-ms 30 --latency-ms 5',
+                        help='Arguments for the in-process SMTP sink; the greeting delay stands in for '
+                             'connection and TLS setup (see tools/smtp_sink.py --help)')
+    return parser.parse_args(argv)
+
+
+class UnpooledEmailService(EmailService):
+    """EmailService sending the way it did before pooling and caching: one connection per message"""
+
+    def render_message(self, to_email: str, subject: str, body: str, attachment_path=None) -> str:
+        return self.build_message(to_email, subject, body, attachment_path).as_string()
+
+    def deliver(self, to_email: str, text: str):
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+        if self.use_tls:
+            server.starttls()
+        server.login(self.email, self.password)
+        server.sendmail(self.email, to_email, text)
+        server.quit()
+
+
+def run_mode(service, messages, concurrency, attachment_path):
+    """Send messages from concurrent threads and collect per-message latency"""
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    counter = iter(range(messages))
+
+    def sender():
+        while True:
+            with lock:
+                number = next(counter, None)
+            if number is None:
+                return
+            started = time.monotonic()
+            result = service.send_email(
+                f"hr{number % 50}@example.com",
+                f"Application #{number}",
+                'Dear Hiring Team,\n\nPlease find my resume attached.\n\nBest regards',
+                attachment_path
+            )
+            elapsed = time.monotonic() - started
+            with lock:
+                latencies.append(elapsed)
+                if not result['success']:
+                    failures.append(result['error'])
+
+    start_time = time.monotonic()
+    threads = [threading.Thread(target=sender) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start_time
+
+    return {
+        'messages': messages,
+        'failed': len(failures),
+        'elapsed_seconds': round(elapsed, 3),
+        'messages_per_second': round(messages / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'first_error': failures[0] if failures else None
+    }
+
+
+def time_render(service, attachment_path, rounds=50):
+    """Average milliseconds to build and serialize one message"""
+    start_time = time.perf_counter()
+    for number in range(rounds):
+        service.render_message(f"hr{number}@example.com", f"Application #{number}", 'Dear Hiring Team', attachment_path)
+    return (time.perf_counter() - start_time) / rounds * 1000
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sink = smtp_sink.make_server(smtp_sink.parse_args(shlex.split(args.sink_args) + ['--port', '0']))
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    host, port = sink.server_address[:2]
+
+    os.environ.update({
+        'SMTP_SERVER': host,
+        'SMTP_PORT': str(port),
+        'SMTP_USE_TLS': 'False',
+        'EMAIL_ADDRESS': 'benchmark@example.com',
+        'EMAIL_PASSWORD': 'benchmark',
+        'SMTP_POOL_SIZE': str(args.pool_size)
+    })
+
+    attachment_path = None
+    with tempfile.TemporaryDirectory(prefix='email_bench_') as workdir:
+        if args.attachment_kb:
+            attachment_path = os.path.join(workdir, 'resume.pdf')
+            with open(attachment_path, 'wb') as f:
+                f.write(os.urandom(args.attachment_kb * 1024))
+
+        print(f"📭 SMTP sink at {host}:{port} ({args.sink_args or 'no latency'})")
+        print(f"✉️  {args.messages} messages per mode, {args.concurrency} threads, "
+              f"{args.attachment_kb} KB attachment\n")
+
+        results = {}
+        for name, service in (('per-message', UnpooledEmailService()), ('pooled', EmailService())):
+            results[name] = run_mode(service, args.messages, args.concurrency, attachment_path)
+            row = results[name]
+            print(f"{name:<12} {row['messages_per_second']:>8.1f} msg/s   p50 {row['p50_ms']:>7.1f} ms   "
+                  f"p95 {row['p95_ms']:>7.1f} ms   failed {row['failed']}")
+            if row['first_error']:
+                print(f"             first error: {row['first_error']}")
+            if name == 'pooled':
+                print(f"             pool: {service.pool.stats()}")
+                print(f"             attachment cache: {service.attachment_cache.stats()}")
+                service.pool.close_all()
+            print(f"             message build: {time_render(service, attachment_path):.2f} ms")
+
+    sink.shutdown()
+    speedup = results['pooled']['messages_per_second'] / max(results['per-message']['messages_per_second'], 0.001)
+    print(f"\n🚀 Pooled sending: {speedup:.1f}x the per-message throughput")
+    print(f"📊 SMTP sink: {sink.RequestHandlerClass.config.snapshot()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
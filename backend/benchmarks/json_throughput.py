@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+JSON throughput benchmark
+Measures CPU time per /api/pre-filter-jobs request on large job payloads with
+Flask's default JSON provider and with FastJSONProvider on each codec backend
+(stdlib and orjson). The codec column is decoding the request body plus
+encoding the response; the request column is the whole request through the
+Flask test client, on the keyword path so no provider is involved.
+
+Usage:
+    cd backend && python benchmarks/json_throughput.py
+    cd backend && python benchmarks/json_throughput.py --jobs 100,1000 --requests 20
+"""
+
+import argparse
+import contextlib
+import copy
+import json
+import os
+import secrets
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_SAMPLES = os.path.join(BACKEND_DIR, 'benchmarks', 'data', 'sample_jobs.jsonl')
+
+PROFILE = {
+    'name': 'JSON Benchmark',
+    'domain': 'Python Backend Development + AI/ML',
+    'skills': ['Python', 'Flask', 'FastAPI', 'PostgreSQL', 'Docker'],
+    'preferredRoles': ['Backend Developer', 'AI/ML Engineer'],
+    'excludedRoles': ['Sales']
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Measure JSON CPU cost per pre-filter request')
+    parser.add_argument('--jobs', default='50,200,1000', help='Comma-separated jobs per request (default: 50,200,1000)')
+    parser.add_argument('--requests', type=int, default=30, help='Requests per measurement (default: 30)')
+    parser.add_argument('--samples', default=DEFAULT_SAMPLES, help='JSONL sample jobs ({"job": {...}} per line)')
+    return parser.parse_args(argv)
+
+
+def configure_environment(workdir):
+    """Throwaway settings with no provider configured; must run before the app is imported"""
+    os.environ.update({
+        'AI_SETTINGS_FILE': os.path.join(workdir, 'ai_settings.json'),
+        'CRYPTO_MASTER_KEY': secrets.token_urlsafe(32),
+        'RATE_LIMIT_DB': os.path.join(workdir, 'rate_limits.sqlite3'),
+        'SINGLEFLIGHT_DIR': os.path.join(workdir, 'singleflight'),
+        'PROBER_ENABLED': 'False',
+        'EMAIL_QUEUE_ENABLED': 'False',
+        'DEBUG': 'False'
+    })
+
+
+def build_body(jobs, count):
+    """A pre-filter request of count unique jobs, encoded the way the extension sends it"""
+    batch = []
+    for number in range(count):
+        job = copy.deepcopy(jobs[number % len(jobs)])
+        job['url'] = f"https://www.linkedin.com/feed/update/urn:li:activity:{7200000000000000000 + number}"
+        job['description'] = f"{job.get('description', '')}\nReference: JSON-{number}"
+        batch.append(job)
+    return json.dumps({'jobs': batch, 'user_profile': PROFILE}).encode('utf-8')
+
+
+def cpu_per_call(fn, repeat):
+    """Mean CPU milliseconds per call of fn"""
+    fn()
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) * 1000 / repeat
+
+
+def measure(flask_app, provider, body, repeat):
+    """(codec ms, request ms, response bytes) for one provider"""
+    flask_app.json = provider
+    client = flask_app.test_client()
+    data = provider.loads(body)
+    result = {'success': True, 'filteredJobs': data['jobs'], 'originalCount': len(data['jobs']),
+              'filteredCount': len(data['jobs']), 'method': 'keyword'}
+
+    def codec():
+        provider.loads(body)
+        with flask_app.app_context():
+            provider.response(result)
+
+    def request():
+        response = client.post('/api/pre-filter-jobs', data=body, content_type='application/json')
+        assert response.status_code == 200, response.data[:200]
+        return response
+
+    size = len(request().data)
+    return cpu_per_call(codec, repeat), cpu_per_call(request, repeat), size
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(count) for count in args.jobs.split(',') if count.strip()]
+
+    with open(args.samples, 'r', encoding='utf-8') as f:
+        jobs = [json.loads(line)['job'] for line in f if line.strip()]
+
+    workdir = tempfile.mkdtemp(prefix='job_assistant_json_')
+    configure_environment(workdir)
+    try:
+        from flask.json.provider import DefaultJSONProvider
+        from utils import json_codec
+        from app import app as flask_app
+
+        providers = [('flask-default', None, DefaultJSONProvider(flask_app)),
+                     ('fast:json', 'json', json_codec.FastJSONProvider(flask_app))]
+        if json_codec.ORJSON_AVAILABLE:
+            providers.append(('fast:orjson', 'orjson', json_codec.FastJSONProvider(flask_app)))
+        else:
+            print("⚠️ orjson is not installed; only the stdlib backend is measured")
+
+        print(f"\n{'mode':>14} {'jobs':>6} {'request':>10} {'response':>10} {'codec':>10} {'per req':>10} {'vs default':>10}")
+        backend = json_codec.JSON_BACKEND
+        for count in sizes:
+            body = build_body(jobs, count)
+            baseline = None
+            for label, codec_backend, provider in providers:
+                json_codec.JSON_BACKEND = codec_backend or backend
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+                        contextlib.redirect_stderr(devnull):
+                    codec_ms, request_ms, size = measure(flask_app, provider, body, args.requests)
+                baseline = baseline or request_ms
+                print(f"{label:>14} {count:>6} {len(body) / 1024:>8.1f}KB {size / 1024:>8.1f}KB "
+                      f"{codec_ms:>8.2f}ms {request_ms:>8.2f}ms {baseline / request_ms:>9.2f}x")
+        json_codec.JSON_BACKEND = backend
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+End-to-end API load test
+Replays a weighted mix of analyze, pre-filter, parse-resume and send-email
+requests against the app and reports throughput, p50/p95/p99 latency and error
+rate per endpoint, for each gunicorn worker configuration and client count
+
+By default the fake provider (tools/fake_provider.py) and SMTP sink
+(tools/smtp_sink.py) run in this process and gunicorn is started once per
+worker configuration with throwaway settings, rate-limit and lock files, so the
+run needs no API keys or network and never touches stored settings.
+Worker configurations are "<worker_class>:<workers>" or
+"<worker_class>:<workers>x<threads>"; with several, a closing table compares
+throughput per worker for each mode and client count.
+
+Usage:
+    cd backend && python benchmarks/load_test.py --workers sync:2 gthread:2x8 --concurrency 4,16,32 --duration 30
+    cd backend && python benchmarks/load_test.py --workers sync:1 gthread:1x16 gevent:1 --concurrency 1,8,32
+    cd backend && python benchmarks/load_test.py --provider-args "--latency-ms 800 --error-rate 0.02" \\
+        --mix analyze=6,prefilter=3,parse_resume=1,send_email=0
+    cd backend && python benchmarks/load_test.py --url http://127.0.0.1:5000 --concurrency 8 --duration 20
+"""
+
+import argparse
+import copy
+import importlib.util
+import json
+import os
+import random
+import secrets
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from services.ai_metrics import percentile
+from tools import fake_provider, smtp_sink
+
+DEFAULT_SAMPLES = os.path.join(BACKEND_DIR, 'benchmarks', 'data', 'sample_jobs.jsonl')
+DEFAULT_MIX = 'analyze=5,prefilter=3,parse_resume=1,send_email=1'
+
+# Well-formed fake key; the fake provider accepts anything
+FAKE_OPENAI_KEY = 'sk-proj-' + 'loadtest' * 5
+
+DEFAULT_PROFILE = {
+    'name': 'Load Test',
+    'domain': 'Python Backend Development + AI/ML',
+    'skills': ['Python', 'Flask', 'FastAPI', 'TensorFlow', 'PostgreSQL', 'Docker'],
+    'preferredRoles': ['Backend Developer', 'AI/ML Engineer'],
+    'preferredWorkType': ['Remote', 'Hybrid'],
+    'excludedRoles': ['Frontend', 'Sales', 'DevOps'],
+    'experience': '2 years'
+}
+
+RESUME_TEXT = """Load Test
+loadtest@example.com | +91 98765 43210
+
+SKILLS
+Python, Flask, FastAPI, Django, PostgreSQL, Redis, Docker, AWS, TensorFlow, PyTorch, Git
+
+EXPERIENCE
+Backend Developer, Example Labs (2023 - present)
+- Built REST APIs with Flask and FastAPI serving 2M requests per day
+- Deployed ML models with Docker on AWS
+
+EDUCATION
+B.Tech Computer Science, 2023
+"""
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the Flask API with a realistic traffic mix')
+    parser.add_argument('--url', help='Test an already running server instead of starting gunicorn')
+    parser.add_argument('--workers', nargs='+', default=['sync:2'],
+                        help='Worker configurations to compare, e.g. sync:2 gthread:2x8 (default: sync:2)')
+    parser.add_argument('--concurrency', default='8', help='Comma-separated client counts to run (default: 8)')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per run (default: 20)')
+    parser.add_argument('--warmup', type=float, default=2, help='Seconds of unrecorded traffic before each run')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Endpoint weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--samples', default=DEFAULT_SAMPLES, help='JSONL sample jobs ({"job": {...}} per line)')
+    parser.add_argument('--prefilter-batch', type=int, default=10, help='Jobs per pre-filter request (default: 10)')
+    parser.add_argument('--repeat-jobs', action='store_true',
+                        help='Reuse identical jobs (exercises caching) instead of making each one unique')
+    parser.add_argument('--request-timeout', type=float, default=60, help='Client timeout per request')
+    parser.add_argument('--provider-args', default='--latency-ms 300 --latency-jitter-ms 100',
+                        help='Arguments for the in-process fake provider (see tools/fake_provider.py --help)')
+    parser.add_argument('--sink-args', default='', help='Arguments for the in-process SMTP sink (see tools/smtp_sink.py --help)')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra environment for the gunicorn workers (repeatable)')
+    parser.add_argument('--port', type=int, default=5055, help='Port for the gunicorn under test (default: 5055)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for the request mix')
+    parser.add_argument('--output', help='Write all results to this JSON file')
+    return parser.parse_args(argv)
+
+
+def parse_mix(spec):
+    """Parse 'name=weight,...' into a list of (scenario, weight)"""
+    mix = []
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown endpoint in mix: {name} (choose from {', '.join(SCENARIOS)})")
+        if float(weight or 1) > 0:
+            mix.append((name, float(weight or 1)))
+    if not mix:
+        raise ValueError('The traffic mix is empty')
+    return mix
+
+
+def parse_worker_config(spec):
+    """Parse '<class>:<workers>[x<threads>]' into gunicorn settings"""
+    worker_class, _, size = spec.partition(':')
+    workers, _, threads = (size or '2').partition('x')
+    return {
+        'label': spec,
+        'worker_class': worker_class or 'sync',
+        'workers': int(workers),
+        'threads': int(threads) if threads else 1
+    }
+
+
+class TrafficMix:
+    """Builds request bodies for each scenario"""
+
+    def __init__(self, samples, resume_path, prefilter_batch, unique_jobs, seed=None):
+        self.jobs = [sample['job'] for sample in samples]
+        self.resume_path = resume_path
+        self.prefilter_batch = prefilter_batch
+        self.unique_jobs = unique_jobs
+        self.counter = 0
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+
+    def next_job(self):
+        with self.lock:
+            self.counter += 1
+            number = self.counter
+            job = copy.deepcopy(self.random.choice(self.jobs))
+        if self.unique_jobs:
+            # A unique reference keeps analysis caches and request coalescing out of the numbers
+            field = 'description' if job.get('description') else 'content'
+            job[field] = f"{job.get(field, '')}\nReference: LT-{number}"
+            job['url'] = f"https://www.linkedin.com/jobs/view/{1000000 + number}"
+        return job
+
+    def analyze(self):
+        return '/api/analyze-job', {'job_data': self.next_job(), 'user_profile': DEFAULT_PROFILE}
+
+    def prefilter(self):
+        jobs = [self.next_job() for _ in range(self.prefilter_batch)]
+        return '/api/pre-filter-jobs', {'jobs': jobs, 'user_profile': DEFAULT_PROFILE}
+
+    def parse_resume(self):
+        return '/api/parse-resume', {'file_path': self.resume_path}
+
+    def send_email(self):
+        return '/api/send-email', {
+            'email': f"hr{self.random.randint(1, 50)}@example.com",
+            'subject': 'Application for Python Backend Developer',
+            'body': 'Dear Hiring Team,\n\nPlease find my resume attached.\n\nBest regards,\nLoad Test',
+            'resume_path': self.resume_path
+        }
+
+
+SCENARIOS = {
+    'analyze': TrafficMix.analyze,
+    'prefilter': TrafficMix.prefilter,
+    'parse_resume': TrafficMix.parse_resume,
+    'send_email': TrafficMix.send_email
+}
+
+
+def run_load(base_url, traffic, mix, clients, duration, warmup, timeout, seed=None):
+    """
+    Run a closed loop of clients for warmup + duration seconds
+
+    Returns:
+        List of (scenario, latency seconds, ok, status) for requests started
+        after the warmup
+    """
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    results = []
+    results_lock = threading.Lock()
+    start_time = time.monotonic()
+    record_after = start_time + warmup
+    stop_at = record_after + duration
+
+    def client(client_id):
+        chooser = random.Random(None if seed is None else seed + client_id)
+        session = requests.Session()
+        local = []
+        while True:
+            started = time.monotonic()
+            if started >= stop_at:
+                break
+            name = chooser.choices(names, weights)[0]
+            path, body = SCENARIOS[name](traffic)
+            try:
+                response = session.post(base_url + path, json=body, timeout=timeout)
+                ok = response.status_code < 400
+                status = response.status_code
+            except requests.RequestException as e:
+                ok = False
+                status = type(e).__name__
+            if started >= record_after:
+                local.append((name, time.monotonic() - started, ok, status))
+        session.close()
+        with results_lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def summarize(results, duration):
+    """Per-endpoint and total throughput, latency percentiles and error rates"""
+    by_endpoint = {name: [] for name in SCENARIOS}
+    for name, latency, ok, status in results:
+        by_endpoint[name].append((latency, ok, status))
+    by_endpoint['TOTAL'] = [(latency, ok, status) for _, latency, ok, status in results]
+
+    summary = {}
+    for name, rows in by_endpoint.items():
+        latencies = [latency for latency, _, _ in rows]
+        errors = [status for _, ok, status in rows if not ok]
+        error_statuses = {}
+        for status in errors:
+            error_statuses[str(status)] = error_statuses.get(str(status), 0) + 1
+        summary[name] = {
+            'requests': len(rows),
+            'throughput_rps': round(len(rows) / duration, 2) if duration else 0.0,
+            'error_rate': round(len(errors) / len(rows), 4) if rows else 0.0,
+            'errors': error_statuses,
+            'p50': round(percentile(latencies, 50), 4) if latencies else None,
+            'p95': round(percentile(latencies, 95), 4) if latencies else None,
+            'p99': round(percentile(latencies, 99), 4) if latencies else None
+        }
+    return summary
+
+
+def print_summary(label, clients, summary):
+    print(f"\n== {label} @ {clients} clients ==")
+    print(f"{'endpoint':<14}{'reqs':>7}{'rps':>9}{'err%':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, row in summary.items():
+        if not row['requests']:
+            continue
+        p50, p95, p99 = (f"{row[key] * 1000:.0f}" if row[key] is not None else '-' for key in ('p50', 'p95', 'p99'))
+        print(f"{name:<14}{row['requests']:>7}{row['throughput_rps']:>9.1f}{row['error_rate'] * 100:>8.1f}"
+              f"{p50:>9}{p95:>9}{p99:>9}")
+
+
+def print_comparison(runs):
+    """Compare total throughput and latency per worker across worker configurations"""
+    print("\n📈 Worker mode comparison")
+    print(f"{'workers':<16}{'clients':>8}{'rps':>9}{'rps/worker':>12}{'p95 ms':>9}{'err%':>8}")
+    for run in runs:
+        total = run['endpoints']['TOTAL']
+        p95 = f"{total['p95'] * 1000:.0f}" if total['p95'] is not None else '-'
+        print(f"{run['workers']['label']:<16}{run['clients']:>8}{total['throughput_rps']:>9.1f}"
+              f"{total['throughput_rps'] / run['workers']['workers']:>12.1f}{p95:>9}{total['error_rate'] * 100:>8.1f}")
+
+
+def start_in_process(module, argv):
+    """Start a tools/ server on a free port in a background thread"""
+    server = module.make_server(module.parse_args(argv + ['--port', '0']))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def wait_until_ready(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+        try:
+            if requests.get(base_url + '/', timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server at {base_url} did not become ready in {timeout}s")
+
+
+def start_gunicorn(config, port, env, log_path):
+    """Start gunicorn for one worker configuration"""
+    # gunicorn.conf.py reads the worker class from the environment too, to
+    # monkey-patch before the app is preloaded when it is gevent
+    env = dict(env, GUNICORN_WORKER_CLASS=config['worker_class'], GUNICORN_THREADS=str(config['threads']))
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(config['workers']),
+        '--worker-class', config['worker_class'],
+        '--threads', str(config['threads']),
+        'app:app'
+    ]
+    log_file = open(log_path, 'ab')
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+                               start_new_session=True)
+    process.log_file = log_file
+    return process
+
+
+def stop_gunicorn(process):
+    if process.poll() is None:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+    process.log_file.close()
+
+
+def configure_ai_settings(base_url, provider_url):
+    """Store the fake provider as the openai provider in the throwaway settings file"""
+    response = requests.post(base_url + '/api/ai-settings', json={
+        'provider': 'openai',
+        'api_key': FAKE_OPENAI_KEY,
+        'model': 'gpt-4o-mini',
+        'base_url': provider_url
+    }, timeout=10)
+    result = response.json()
+    if not result.get('success'):
+        raise RuntimeError(f"Could not store AI settings: {result.get('error')}")
+
+
+def build_worker_env(workdir, sink_address, extra):
+    env = dict(os.environ)
+    env.update({
+        'AI_SETTINGS_FILE': os.path.join(workdir, 'ai_settings.json'),
+        'CRYPTO_MASTER_KEY': secrets.token_urlsafe(32),
+        'RATE_LIMIT_DB': os.path.join(workdir, 'rate_limits.sqlite3'),
+        'SINGLEFLIGHT_DIR': os.path.join(workdir, 'singleflight'),
+        # The fake provider has no quota; keep the shared limiter out of the way
+        'OPENAI_RPM': '1000000',
+        'OPENAI_TPM': '1000000000',
+        'PROBER_ENABLED': 'False',
+        'DEBUG': 'False',
+        'SMTP_SERVER': sink_address[0],
+        'SMTP_PORT': str(sink_address[1]),
+        'SMTP_USE_TLS': 'False',
+        'EMAIL_ADDRESS': 'loadtest@example.com',
+        'EMAIL_PASSWORD': 'loadtest',
+        'GUNICORN_ACCESS_LOG': os.devnull,
+        'GUNICORN_ERROR_LOG': os.path.join(workdir, 'gunicorn-error.log')
+    })
+    for item in extra:
+        key, _, value = item.partition('=')
+        env[key] = value
+    return env
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mix = parse_mix(args.mix)
+    client_counts = [int(count) for count in args.concurrency.split(',') if count.strip()]
+
+    with open(args.samples, 'r', encoding='utf-8') as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+
+    workdir = tempfile.mkdtemp(prefix='job_assistant_load_')
+    resume_path = os.path.join(workdir, 'resume.txt')
+    with open(resume_path, 'w', encoding='utf-8') as f:
+        f.write(RESUME_TEXT)
+    traffic = TrafficMix(samples, resume_path, args.prefilter_batch, not args.repeat_jobs, args.seed)
+
+    runs = []
+    provider = sink = None
+    try:
+        if args.url:
+            targets = [({'label': 'external'}, args.url.rstrip('/'))]
+        else:
+            provider = start_in_process(fake_provider, shlex.split(args.provider_args))
+            sink = start_in_process(smtp_sink, shlex.split(args.sink_args))
+            provider_url = 'http://%s:%d/v1' % provider.server_address[:2]
+            print(f"🧪 Fake provider at {provider_url}, SMTP sink at %s:%d" % sink.server_address[:2])
+            env = build_worker_env(workdir, sink.server_address[:2], args.env)
+            targets = [(parse_worker_config(spec), f"http://127.0.0.1:{args.port}") for spec in args.workers]
+
+        for config, base_url in targets:
+            process = None
+            if config.get('worker_class') == 'gevent' and importlib.util.find_spec('gevent') is None:
+                print(f"⚠️  Skipping {config['label']}: gevent is not installed (pip install gevent)")
+                continue
+            if not args.url:
+                print(f"🚀 Starting gunicorn {config['label']} "
+                      f"({config['workers']} x {config['worker_class']}, {config['threads']} threads)")
+                process = start_gunicorn(config, args.port, env, os.path.join(workdir, 'gunicorn.log'))
+            try:
+                wait_until_ready(base_url, process)
+                if not args.url:
+                    configure_ai_settings(base_url, provider_url)
+                for clients in client_counts:
+                    results = run_load(base_url, traffic, mix, clients, args.duration, args.warmup,
+                                       args.request_timeout, args.seed)
+                    summary = summarize(results, args.duration)
+                    print_summary(config['label'], clients, summary)
+                    runs.append({'workers': config, 'clients': clients, 'duration': args.duration, 'endpoints': summary})
+            finally:
+                if process is not None:
+                    stop_gunicorn(process)
+    except KeyboardInterrupt:
+        print("\n🛑 Interrupted")
+    finally:
+        if len(args.workers) > 1 and not args.url and runs:
+            print_comparison(runs)
+        if provider is not None:
+            provider.shutdown()
+            print(f"\n📊 Fake provider: {provider.RequestHandlerClass.config.stats}")
+        if sink is not None:
+            sink.shutdown()
+            print(f"📊 SMTP sink: {sink.RequestHandlerClass.config.snapshot()}")
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'mix': dict(mix), 'runs': runs}, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+    return 0 if runs else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Pre-filter payload benchmark
+Sends feed-sized batches of the sample job posts to /api/pre-filter-jobs
+through the Flask test client (keyword path, no provider) in each response
+shape and reports the response bytes: full job echo, a field projection, and
+the slim 'ids' mode with index, score and label per kept job. With
+--accept-encoding it also reports each response's size on the wire.
+
+Usage:
+    cd backend && python benchmarks/prefilter_payload.py
+    cd backend && python benchmarks/prefilter_payload.py --feeds 25,100,500 --fields title,company,url
+    cd backend && python benchmarks/prefilter_payload.py --accept-encoding gzip
+"""
+
+import argparse
+import contextlib
+import copy
+import json
+import os
+import secrets
+import shutil
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_SAMPLES = os.path.join(BACKEND_DIR, 'benchmarks', 'data', 'sample_jobs.jsonl')
+
+PROFILE = {
+    'name': 'Payload Benchmark',
+    'domain': 'Python Backend Development + AI/ML',
+    'skills': ['Python', 'Flask', 'FastAPI', 'PostgreSQL', 'Docker'],
+    'preferredRoles': ['Backend Developer', 'AI/ML Engineer'],
+    'excludedRoles': ['Frontend', 'Sales']
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Compare pre-filter response sizes per response mode')
+    parser.add_argument('--feeds', default='25,100,500', help='Comma-separated posts per feed scan (default: 25,100,500)')
+    parser.add_argument('--fields', default='title,company,url', help='Fields for the projection run (default: title,company,url)')
+    parser.add_argument('--accept-encoding', default=None,
+                        help='Also request each mode with this Accept-Encoding and report wire sizes (e.g. gzip, br)')
+    parser.add_argument('--samples', default=DEFAULT_SAMPLES, help='JSONL sample jobs ({"job": {...}} per line)')
+    return parser.parse_args(argv)
+
+
+def configure_environment(workdir):
+    """Throwaway settings with no provider configured; must run before the app is imported"""
+    os.environ.update({
+        'AI_SETTINGS_FILE': os.path.join(workdir, 'ai_settings.json'),
+        'CRYPTO_MASTER_KEY': secrets.token_urlsafe(32),
+        'RATE_LIMIT_DB': os.path.join(workdir, 'rate_limits.sqlite3'),
+        'SINGLEFLIGHT_DIR': os.path.join(workdir, 'singleflight'),
+        'PROBER_ENABLED': 'False',
+        'EMAIL_QUEUE_ENABLED': 'False',
+        'DEBUG': 'False'
+    })
+
+
+def build_feed(jobs, count):
+    """count posts cycled from the samples, each with its own activity URL"""
+    feed = []
+    for number in range(count):
+        job = copy.deepcopy(jobs[number % len(jobs)])
+        job['url'] = f"https://www.linkedin.com/feed/update/urn:li:activity:{7200000000000000000 + number}"
+        feed.append(job)
+    return feed
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(count) for count in args.feeds.split(',') if count.strip()]
+    fields = [field.strip() for field in args.fields.split(',') if field.strip()]
+
+    with open(args.samples, 'r', encoding='utf-8') as f:
+        jobs = [json.loads(line)['job'] for line in f if line.strip()]
+
+    workdir = tempfile.mkdtemp(prefix='job_assistant_payload_')
+    configure_environment(workdir)
+    try:
+        from app import app as flask_app
+        client = flask_app.test_client()
+
+        modes = [('full', {}), ('fields', {'fields': fields}), ('ids', {'response_mode': 'ids'})]
+        columns = [(label, options, None) for label, options in modes]
+        if args.accept_encoding:
+            columns += [(f"{label} wire", options, {'Accept-Encoding': args.accept_encoding}) for label, options in modes]
+        print(f"\n{'posts':>6} {'kept':>6} {'request':>10} " + ' '.join(f"{label:>11}" for label, _, _ in columns) +
+              f" {'ids saves':>10}")
+        for count in sizes:
+            feed = build_feed(jobs, count)
+            sizes_by_column = {}
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+                    contextlib.redirect_stderr(devnull):
+                for label, options, headers in columns:
+                    response = client.post('/api/pre-filter-jobs', json={'jobs': feed, 'user_profile': PROFILE, **options},
+                                           headers=headers)
+                    assert response.status_code == 200, response.data[:200]
+                    sizes_by_column[label] = len(response.data)
+                    if headers is None:
+                        kept = response.get_json()['filteredCount']
+            request_size = len(json.dumps({'jobs': feed, 'user_profile': PROFILE}).encode('utf-8'))
+            saved = 1 - sizes_by_column['ids'] / sizes_by_column['full']
+            print(f"{count:>6} {kept:>6} {request_size / 1024:>8.1f}KB " +
+                  ' '.join(f"{sizes_by_column[label] / 1024:>9.1f}KB" for label, _, _ in columns) + f" {saved:>9.1%}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Prompt compaction quality check
+Runs the prompt builder over the stored sample jobs, reports token savings and
+fails if compaction makes a rule-based verdict wrong or drops key job facts
+
+Usage:
+    cd backend && python benchmarks/prompt_quality.py [--samples benchmarks/data/sample_jobs.jsonl]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from services.ai_agent import JobAnalysisAgent
+from services.prompt_builder import build_job_prompt_content
+
+DEFAULT_SAMPLES = os.path.join(BACKEND_DIR, 'benchmarks', 'data', 'sample_jobs.jsonl')
+EMAIL_PATTERN = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b'
+
+
+def load_samples(path):
+    """Load sample jobs from a JSONL file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check_sample(agent, sample, model, budget):
+    """
+    Compare the original and compacted job content for one sample
+
+    Returns:
+        Dictionary with token accounting and a list of regressions
+    """
+    job_data = sample['job']
+    job = agent._parse_job_data(job_data)
+    profile = agent._parse_user_profile(sample.get('profile', {}))
+
+    original = agent._extract_job_content(job)
+    compacted = build_job_prompt_content(job, model, agent.max_tokens, budget)
+
+    problems = []
+    notes = []
+
+    # The rule-based verdict is a cheap proxy for "the model sees the same job".
+    # With a labelled sample only a correct -> incorrect change is a regression;
+    # boilerplate like "87 reactions" can make the original verdict wrong.
+    original_verdict = agent._check_relevance(original.lower(), profile)['is_relevant']
+    compacted_verdict = agent._check_relevance(compacted.text.lower(), profile)['is_relevant']
+    expected = sample.get('expected_status')
+    if expected:
+        expected_verdict = expected == 'RELEVANT'
+        if original_verdict == expected_verdict and compacted_verdict != expected_verdict:
+            problems.append(f'relevance regressed: expected {expected}')
+        elif original_verdict != expected_verdict and compacted_verdict == expected_verdict:
+            notes.append('relevance improved')
+    elif original_verdict != compacted_verdict:
+        problems.append(f'relevance changed: {original_verdict} -> {compacted_verdict}')
+
+    for email in set(re.findall(EMAIL_PATTERN, original)):
+        if email not in compacted.text:
+            problems.append(f'contact email dropped: {email}')
+
+    for field in ('title', 'company', 'location'):
+        value = job_data.get(field)
+        if value and value not in compacted.text:
+            problems.append(f'{field} dropped: {value}')
+
+    return {
+        'id': sample.get('id'),
+        **compacted.to_dict(),
+        'problems': problems,
+        'notes': notes
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check prompt compaction quality against stored samples')
+    parser.add_argument('--samples', default=DEFAULT_SAMPLES, help='JSONL file of sample jobs')
+    parser.add_argument('--model', default='gpt-4', help='Model used to size the token budget')
+    parser.add_argument('--budget', type=int, default=None, help='Job content token budget override')
+    parser.add_argument('--verbose', action='store_true', help='Print compacted text for each sample')
+    args = parser.parse_args()
+
+    agent = JobAnalysisAgent(model=args.model)
+    samples = load_samples(args.samples)
+
+    total_original = 0
+    total_final = 0
+    failures = 0
+
+    print(f"{'sample':<24} {'original':>9} {'prompt':>7} {'saved':>6}  status")
+    print('-' * 64)
+    for sample in samples:
+        report = check_sample(agent, sample, args.model, args.budget)
+        total_original += report['original_tokens']
+        total_final += report['prompt_tokens']
+        status = 'OK' if not report['problems'] else 'REGRESSION: ' + '; '.join(report['problems'])
+        if report['notes']:
+            status += ' (' + '; '.join(report['notes']) + ')'
+        if report['problems']:
+            failures += 1
+        print(f"{report['id']:<24} {report['original_tokens']:>9} {report['prompt_tokens']:>7} "
+              f"{report['saved_tokens']:>6}  {status}")
+        if args.verbose:
+            job = agent._parse_job_data(sample['job'])
+            print(build_job_prompt_content(job, args.model, agent.max_tokens, args.budget).text)
+            print()
+
+    saved = total_original - total_final
+    pct = (saved / total_original * 100) if total_original else 0
+    print('-' * 64)
+    print(f"Total: {total_original} -> {total_final} tokens, saved {saved} ({pct:.1f}%)")
+    print(f"Samples: {len(samples)}, regressions: {failures}")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Offline bulk job analysis
+Streams jobs from a JSONL dump through the analyze_job_post pipeline and writes
+results to JSONL as they finish, with checkpoint/resume and a throughput summary
+
+Each input line is a job object, or {"job_data": {...}, "user_profile": {...}}
+to override the profile for that job. Each output line records the input line
+number, so an interrupted run continues with --resume.
+
+Usage:
+    cd backend && python bulk_analyze.py --input jobs.jsonl --output results.jsonl --profile profile.json
+    cd backend && python bulk_analyze.py --input jobs.jsonl --output results.jsonl --profile profile.json \\
+        --provider openai --api-key test --base-url http://127.0.0.1:8300/v1 --concurrency 16 --rate 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from utils.env_manager import getenv
+from utils.deadline import deadline_scope
+from services.ai_agent import analyze_job_post
+from services.ai_metrics import percentile
+from services.scheduler import priority_scope, BACKGROUND
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze a JSONL dump of job posts offline')
+    parser.add_argument('--input', required=True, help='JSONL file with one job per line')
+    parser.add_argument('--output', required=True, help='JSONL file to write results to')
+    parser.add_argument('--profile', help='JSON file with the user profile used for every job')
+    parser.add_argument('--provider', choices=['openai', 'groq'], help='AI provider (default: stored AI settings)')
+    parser.add_argument('--api-key', help='Provider API key (default: <PROVIDER>_API_KEY)')
+    parser.add_argument('--model', help='Model to use')
+    parser.add_argument('--base-url', help='OpenAI-compatible endpoint, e.g. the local fake provider')
+    parser.add_argument('--concurrency', type=int, default=8, help='Analyses in flight at once (default: 8)')
+    parser.add_argument('--rate', type=float, default=0, help='Maximum jobs started per second (default: unlimited)')
+    parser.add_argument('--timeout', type=float, default=60, help='Deadline per job in seconds (default: 60)')
+    parser.add_argument('--resume', action='store_true', help='Skip jobs already in the output file and append')
+    parser.add_argument('--limit', type=int, default=0, help='Stop after this many jobs')
+    parser.add_argument('--quiet', action='store_true', help="Hide the analysis pipeline's per-job output")
+    return parser.parse_args(argv)
+
+
+def load_ai_settings(args):
+    """Build the analysis configuration from arguments or stored AI settings"""
+    if args.provider:
+        api_key = args.api_key or getenv(f'{args.provider.upper()}_API_KEY')
+        settings = {'provider': args.provider, 'api_key': api_key}
+    else:
+        from services.ai_settings import get_ai_settings_service
+        settings = get_ai_settings_service().get_analysis_config()
+
+    if args.model:
+        settings['model'] = args.model
+    if args.base_url:
+        settings['base_url'] = args.base_url
+    return settings
+
+
+def load_completed_lines(output_path):
+    """Get the input line numbers already written to the output file"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                completed.add(json.loads(line)['line'])
+            except (ValueError, KeyError, TypeError):
+                # A partial last line from an interrupted run is simply redone
+                continue
+    return completed
+
+
+def read_jobs(input_path, completed, limit):
+    """Yield (line number, job data, profile override, parse error) for jobs still to analyze"""
+    yielded = 0
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip() or line_number in completed:
+                continue
+            if limit and yielded >= limit:
+                return
+            yielded += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, None, f'Invalid JSON: {e}'
+                continue
+            if isinstance(record, dict) and 'job_data' in record:
+                yield line_number, record['job_data'], record.get('user_profile'), None
+            else:
+                yield line_number, record, None, None
+
+
+def analyze_one(line_number, job_data, user_profile, ai_settings, timeout):
+    """Analyze one job at background priority, returning its output record"""
+    start_time = time.monotonic()
+    record = {'line': line_number}
+    if isinstance(job_data, dict):
+        record['job_id'] = job_data.get('id') or job_data.get('url')
+    try:
+        with priority_scope(BACKGROUND), deadline_scope(timeout):
+            result = analyze_job_post(job_data, user_profile, ai_settings)
+        record['success'] = result.get('status') != 'ERROR'
+        record['result'] = result
+    except Exception as e:
+        record['success'] = False
+        record['error'] = str(e)
+    record['elapsed'] = round(time.monotonic() - start_time, 4)
+    return record
+
+
+def log(message):
+    """Progress output goes to stderr so --quiet can silence the pipeline's stdout"""
+    print(message, file=sys.stderr, flush=True)
+
+
+class Pacer:
+    """Spaces job starts to at most `rate` per second"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.next_start = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if now < self.next_start:
+            time.sleep(self.next_start - now)
+        self.next_start = max(now, self.next_start) + self.interval
+
+
+def run(args):
+    ai_settings = load_ai_settings(args)
+    if not ai_settings.get('api_key'):
+        log("⚠️ No API key configured; jobs will get rule-based analysis")
+
+    default_profile = {}
+    if args.profile:
+        with open(args.profile, 'r', encoding='utf-8') as f:
+            default_profile = json.load(f)
+
+    completed = load_completed_lines(args.output) if args.resume else set()
+    if completed:
+        log(f"⏩ Resuming: {len(completed)} jobs already in {args.output}")
+
+    stats = {'succeeded': 0, 'failed': 0, 'statuses': {}, 'latencies': []}
+    pacer = Pacer(args.rate)
+    write_lock = threading.Lock()
+    start_time = time.monotonic()
+    interrupted = False
+
+    def record_result(out, record):
+        with write_lock:
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+        stats['succeeded' if record['success'] else 'failed'] += 1
+        stats['latencies'].append(record['elapsed'])
+        status = (record.get('result') or {}).get('status', 'ERROR')
+        stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+        done = stats['succeeded'] + stats['failed']
+        if done % 100 == 0:
+            elapsed = time.monotonic() - start_time
+            log(f"📊 {done} jobs, {done / elapsed:.1f} jobs/s")
+
+    with open(args.output, 'a' if args.resume else 'w', encoding='utf-8') as out, \
+            ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix='bulk-analyze') as executor:
+        pending = set()
+        try:
+            for line_number, job_data, profile, error in read_jobs(args.input, completed, args.limit):
+                if error:
+                    record_result(out, {'line': line_number, 'success': False, 'error': error, 'elapsed': 0.0})
+                    continue
+                while len(pending) >= args.concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record_result(out, future.result())
+                pacer.wait()
+                pending.add(executor.submit(
+                    analyze_one, line_number, job_data, profile or default_profile, ai_settings, args.timeout
+                ))
+        except KeyboardInterrupt:
+            interrupted = True
+            log("\n🛑 Interrupted; finishing jobs in flight (rerun with --resume to continue)")
+
+        for future in pending:
+            record_result(out, future.result())
+
+    elapsed = time.monotonic() - start_time
+    total = stats['succeeded'] + stats['failed']
+    latencies = stats['latencies']
+    summary = {
+        'jobs': total,
+        'succeeded': stats['succeeded'],
+        'failed': stats['failed'],
+        'skipped': len(completed),
+        'statuses': stats['statuses'],
+        'elapsed_seconds': round(elapsed, 2),
+        'jobs_per_second': round(total / elapsed, 2) if elapsed else 0.0,
+        'latency_p50': round(percentile(latencies, 50), 4) if latencies else None,
+        'latency_p95': round(percentile(latencies, 95), 4) if latencies else None,
+        'interrupted': interrupted
+    }
+    log("✅ Bulk analysis summary:")
+    log(json.dumps(summary, indent=2))
+    return 1 if interrupted else 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.concurrency < 1:
+        log("--concurrency must be at least 1")
+        return 2
+    if args.quiet:
+        sys.stdout = open(os.devnull, 'w')
+    # Let the provider call scheduler run as many calls as the CLI keeps in flight
+    os.environ.setdefault('SCHEDULER_MAX_CONCURRENCY', str(args.concurrency))
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,8 +10,34 @@ backlog = 2048
 
 # Worker processes
 workers = getenv_int('GUNICORN_WORKERS', 2)
-worker_class = "sync"
-worker_connections = 1000
+# Requests spend most of their time waiting on AI providers and SMTP, so a
+# worker can serve several at once:
+#   sync    - one request per worker
+#   gthread - GUNICORN_THREADS requests per worker on a thread pool
+#   gevent  - up to GUNICORN_WORKER_CONNECTIONS requests per worker on
+#             greenlets (requires: pip install gevent)
+worker_class = getenv('GUNICORN_WORKER_CLASS', 'sync').lower()
+threads = getenv_int('GUNICORN_THREADS', 8 if worker_class == 'gthread' else 1)
+worker_connections = getenv_int('GUNICORN_WORKER_CONNECTIONS', 1000)
+
+if worker_class == 'gevent':
+    try:
+        # Patch before the preloaded app creates its sockets, locks and threads
+        from gevent import monkey
+        monkey.patch_all(aggressive=False)
+        # httpx loads httpcore on first use, and httpcore imports trio when it
+        # is installed. trio needs select.epoll, which the gevent worker's own
+        # (aggressive) patching removes, so load it now or AI clients fail
+        try:
+            import httpcore
+        except ImportError:
+            pass
+    except ImportError:
+        print("⚠️  gevent is not installed, using the gthread worker instead")
+        worker_class = 'gthread'
+        threads = max(threads, 8)
+# Requests set a deadline (REQUEST_DEADLINE_SECONDS, default 25s) below this
+# timeout so slow AI providers fall back to rule-based analysis in time
 timeout = 30
 keepalive = 2
 
@@ -5,25 +5,68 @@ Analyzes job posts and generates personalized application emails
 
 import os
 import json
+import asyncio
 import re
+import hashlib
 from typing import Dict, Any, Optional
 from dataclasses import dataclass
 from datetime import datetime
+from concurrent.futures import wait, FIRST_COMPLETED, TimeoutError as FuturesTimeoutError
 
 # Import environment utilities
-from utils.env_manager import getenv
+from utils.env_manager import getenv, getenv_bool, getenv_float, parse_bool
+from services.ai_metrics import get_ai_metrics
+from services.ai_client import create_ai_client, chat_completion, create_async_ai_client, async_chat_completion
+from services.circuit_breaker import CircuitOpenError
+from services.rate_limiter import RateLimitExceeded
+from services.hedging import HedgeBudget, get_hedge_budget, get_hedge_delay, submit_with_context
+from services.scheduler import get_provider_scheduler
+from utils.deadline import DeadlineExceeded
+from services.prompt_builder import build_job_prompt_content, build_analysis_messages, build_classification_messages
+from services.model_routing import EMAIL_GENERATION, CLASSIFY, CONNECTION_TEST
+from services.provider_prober import get_provider_prober
 
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
+# Strict schema for provider-native structured output
+ANALYSIS_RESULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "status": {"type": "string", "enum": ["RELEVANT", "NOT RELEVANT"]},
+        "reason": {"type": "string"},
+        "contact": {"type": ["string", "null"]},
+        "email_subject": {"type": "string"},
+        "email_body": {"type": "string"},
+        "attachment_required": {"type": "boolean"}
+    },
+    "required": ["status", "reason", "contact", "email_subject", "email_body", "attachment_required"],
+    "additionalProperties": False
+}
 
-try:
-    from groq import Groq
-    GROQ_AVAILABLE = True
-except ImportError:
-    GROQ_AVAILABLE = False
+# Strict schema for the classification stage of two-stage analysis
+CLASSIFICATION_RESULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "status": {"type": "string", "enum": ["RELEVANT", "NOT RELEVANT"]},
+        "reason": {"type": "string"},
+        "contact": {"type": ["string", "null"]}
+    },
+    "required": ["status", "reason", "contact"],
+    "additionalProperties": False
+}
+
+# Model name prefixes supporting each structured output mode, per provider
+STRUCTURED_OUTPUT_MODELS = {
+    'openai': {
+        'json_schema': ('gpt-4o', 'gpt-4.1', 'gpt-5', 'o1', 'o3', 'o4'),
+        'json_object': ('gpt-3.5-turbo', 'gpt-4-turbo', 'gpt-4-1106', 'gpt-4-0125')
+    },
+    'groq': {
+        'json_schema': ('meta-llama/llama-4', 'moonshotai/kimi-k2', 'openai/gpt-oss'),
+        'json_object': ('llama', 'mixtral', 'gemma', 'qwen', 'deepseek')
+    }
+}
+
+# (provider, model) pairs that rejected response_format at runtime
+_STRUCTURED_OUTPUT_UNSUPPORTED = set()
 
 @dataclass
 class UserProfile:
@@ -59,15 +102,57 @@ class JobAnalysisAgent:
     def __init__(self, provider: str = None, api_key: str = None, **kwargs):
         self.provider = provider or getenv('AI_PROVIDER', 'openai')
         self.api_key = api_key
-        self.model = kwargs.get('model', self._get_default_model())
+        self.model = kwargs.get('model') or self._get_default_model()
         self.temperature = kwargs.get('temperature', 0.7)
         self.max_tokens = kwargs.get('max_tokens', 1500)
         self.enable_optimizations = kwargs.get('enable_optimizations', True)
+        self.structured_output = kwargs.get('structured_output', 'auto')
+        self.job_token_budget = kwargs.get('job_token_budget')
+        self.enable_failover = kwargs.get('enable_failover', True)
+        self.enable_hedging = kwargs.get('enable_hedging', getenv_bool('AI_HEDGING_ENABLED', False))
+        self.hedge_percentile = float(kwargs.get('hedge_percentile') or getenv_float('AI_HEDGE_PERCENTILE', 95.0))
+        self.hedge_model = kwargs.get('hedge_model')
+        self.rate_limits = kwargs.get('rate_limits')
+        self.base_url = kwargs.get('base_url')
+        self.stage = kwargs.get('stage') or EMAIL_GENERATION
+        self.classify_settings = kwargs.get('classify_settings')
+        self.last_usage = None
         
         self.ai_client = None
         if api_key:
             self.setup_ai_client()
     
+    @classmethod
+    def from_settings(cls, ai_settings: dict, **overrides) -> 'JobAnalysisAgent':
+        """
+        Create an agent from a stored provider configuration
+        
+        Args:
+            ai_settings: Provider configuration (provider, api_key, model, ...)
+            **overrides: Agent options that take precedence over the settings
+            
+        Returns:
+            Configured JobAnalysisAgent
+        """
+        options = {
+            'model': ai_settings.get('model'),
+            'temperature': ai_settings.get('temperature', 0.7),
+            'max_tokens': ai_settings.get('max_tokens', 1500),
+            'enable_optimizations': ai_settings.get('enable_optimizations', True),
+            'structured_output': ai_settings.get('structured_output', 'auto'),
+            'job_token_budget': ai_settings.get('job_token_budget'),
+            'hedge_percentile': ai_settings.get('hedge_percentile'),
+            'hedge_model': ai_settings.get('hedge_model'),
+            'rate_limits': ai_settings.get('rate_limits'),
+            'base_url': ai_settings.get('base_url'),
+            'stage': ai_settings.get('stage'),
+            'classify_settings': ai_settings.get('classify_route')
+        }
+        if 'enable_hedging' in ai_settings:
+            options['enable_hedging'] = ai_settings['enable_hedging']
+        options.update(overrides)
+        return cls(provider=ai_settings.get('provider'), api_key=ai_settings.get('api_key'), **options)
+    
     def _get_default_model(self):
         """Get default model based on provider"""
         if self.provider == 'openai':
@@ -80,19 +165,26 @@ class JobAnalysisAgent:
     def setup_ai_client(self):
         """Setup AI client based on provider"""
         try:
-            if self.provider == 'openai' and OPENAI_AVAILABLE:
-                from openai import OpenAI
-                self.ai_client = OpenAI(api_key=self.api_key)
-            elif self.provider == 'groq' and GROQ_AVAILABLE:
-                self.ai_client = Groq(api_key=self.api_key)
-            else:
+            self.ai_client = create_ai_client(self.provider, self.api_key, self.base_url)
+            if not self.ai_client:
                 print(f"Warning: {self.provider} not available or not supported.")
         except Exception as e:
             print(f"Error setting up AI client: {str(e)}")
             self.ai_client = None
     
-    def test_connection(self) -> dict:
-        """Test the AI connection and return status"""
+    def test_connection(self, use_cache: bool = True) -> dict:
+        """
+        Test the AI connection and return status
+        
+        Args:
+            use_cache: Answer from the background prober's latest probe of this
+                provider, key and model when it is recent, instead of a live call
+        """
+        if use_cache:
+            cached = get_provider_prober().get_cached_result(self.provider, self.api_key, self.model)
+            if cached is not None:
+                return cached
+        
         if not self.ai_client:
             # Try to setup the client if we have the api_key
             if self.api_key:
@@ -104,32 +196,27 @@ class JobAnalysisAgent:
                     'error': f'{self.provider} client not initialized'
                 }
         
-        print('Modellllllll: ', self.model)
         try:
-            if self.provider == 'openai':
-                # Test with a simple completion using the configured model
-                response = self.ai_client.chat.completions.create(
-                    model=self.model,
-                    messages=[{"role": "user", "content": "Hello"}],
-                    max_tokens=5
-                )
-                return {
-                    'success': True,
-                    'model': self.model,
-                    'response': response.choices[0].message.content.strip()
-                }
-            elif self.provider == 'groq':
+            if self.provider in ['openai', 'groq']:
                 # Test with a simple completion using the configured model
-                response = self.ai_client.chat.completions.create(
+                response = chat_completion(
+                    self.ai_client,
+                    self.provider,
+                    rate_limits=self.rate_limits,
+                    stage=CONNECTION_TEST,
                     model=self.model,
                     messages=[{"role": "user", "content": "Hello"}],
-                    max_tokens=5
+                    max_tokens=self.max_tokens if self.stage == CONNECTION_TEST else 5
                 )
                 return {
                     'success': True,
                     'model': self.model,
                     'response': response.choices[0].message.content.strip()
                 }
+            return {
+                'success': False,
+                'error': f'Unsupported AI provider: {self.provider}'
+            }
                 
         except Exception as e:
             return {
@@ -200,82 +287,523 @@ class JobAnalysisAgent:
         )
     
     def _ai_analysis(self, job: JobData, profile: UserProfile) -> dict:
-        """AI-powered job analysis using configured provider"""
+        """AI-powered job analysis using configured provider, failing over to other stored providers"""
+        try:
+            if self.enable_hedging:
+                return self._hedged_analysis(job, profile)
+            return self._provider_analysis(job, profile)
+        except Exception as e:
+            if not self._should_fail_over(e):
+                return self._rule_based_analysis(job, profile)
+        
+        result = self._failover_analysis(job, profile)
+        if result is not None:
+            return result
+        return self._rule_based_analysis(job, profile)
+    
+    def _should_fail_over(self, error: Exception) -> bool:
+        """Record why the primary analysis failed; False when the deadline leaves no time to fail over"""
+        if isinstance(error, DeadlineExceeded):
+            print(f"⏱️ Request deadline reached before AI analysis: {str(error)}")
+            get_ai_metrics().increment('fallbacks', f"{self.provider}/{self.model}", 'deadline')
+            return False
+        print(f"AI analysis failed: {str(error)}")
+        self._record_fallback(error)
+        return True
+    
+    def _hedged_analysis(self, job: JobData, profile: UserProfile) -> dict:
+        """
+        Run the analysis with a hedge against slow primary completions
+        
+        If the primary call hasn't returned within the configured percentile of
+        its observed latency, a second request goes to the hedge model or the
+        healthiest alternate provider. The first valid result wins; the loser is
+        cancelled if it hasn't started, otherwise its result is discarded (its
+        call is still bounded by the request deadline, and the pair counts
+        against the in-flight hedge cap until it returns).
+        
+        Raises:
+            Exception: The primary's error if no call produced a valid result
+        """
+        metrics = get_ai_metrics()
+        key = f"{self.provider}/{self.model}"
+        budget, delay = self._hedge_delay(key)
+        if delay is None:
+            return self._provider_analysis(job, profile)
+        
+        primary = submit_with_context(self._provider_analysis, job, profile, False)
+        try:
+            return primary.result(timeout=delay)
+        except FuturesTimeoutError:
+            pass
+        
+        hedge_agent = self._start_hedge(budget, key)
+        if hedge_agent is None:
+            return primary.result()
+        
+        self._log_hedge(key, delay, hedge_agent)
+        hedge = submit_with_context(hedge_agent._provider_analysis, job, profile, False)
+        budget.release_when_done((primary, hedge))
+        
+        pending = {primary, hedge}
+        first_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if future is primary or first_error is None:
+                        first_error = e
+                    continue
+                
+                for loser in pending:
+                    if not loser.cancel():
+                        metrics.increment('hedging', key, 'losers_abandoned')
+                return self._hedge_result(result, key, hedge_agent if future is hedge else None)
+        
+        # Neither call produced a valid analysis
+        raise first_error
+    
+    def _hedge_delay(self, key: str) -> tuple:
+        """
+        Count a hedgeable request and get how long to wait on the primary before hedging
+        
+        Returns:
+            Tuple of (hedge budget, delay in seconds or None while latency stats are warming up)
+        """
+        budget = get_hedge_budget()
+        budget.record_request()
+        delay = get_hedge_delay(self.provider, self.model, self.hedge_percentile)
+        if delay is None:
+            get_ai_metrics().increment('hedging', key, 'warming_up')
+        return budget, delay
+    
+    def _log_hedge(self, key: str, delay: float, hedge_agent: 'JobAnalysisAgent'):
+        """Log that a slow primary call is being hedged"""
+        print(f"🪁 {key} slower than p{self.hedge_percentile:g} ({delay:.2f}s), hedging with "
+              f"{hedge_agent.provider}/{hedge_agent.model}")
+    
+    def _hedge_result(self, result: dict, key: str, hedge_agent: Optional['JobAnalysisAgent']) -> dict:
+        """Record which call won a hedged analysis (hedge_agent is None when the primary won)"""
+        if hedge_agent is not None:
+            get_ai_metrics().increment('hedging', key, 'hedge_wins')
+            result['provider'] = hedge_agent.provider
+        else:
+            get_ai_metrics().increment('hedging', key, 'primary_wins')
+        return result
+    
+    def _start_hedge(self, budget: HedgeBudget, key: str) -> Optional['JobAnalysisAgent']:
+        """
+        Decide whether a slow primary call may be hedged
+        
+        No hedge is sent while other provider calls are queued for a scheduler
+        slot (the extra call would only take capacity from them), when there
+        is no alternate, or when the hedge budget or in-flight cap is used up.
+        
+        Returns:
+            The agent to send the hedge to, or None to keep waiting on the primary
+        """
+        metrics = get_ai_metrics()
+        if get_provider_scheduler().has_waiting():
+            metrics.increment('hedging', key, 'scheduler_busy')
+            return None
+        hedge_agent = self._get_hedge_agent()
+        if hedge_agent is None:
+            metrics.increment('hedging', key, 'no_alternate')
+            return None
+        if not budget.try_spend():
+            metrics.increment('hedging', key, 'budget_exhausted')
+            return None
+        metrics.increment('hedging', key, 'hedges_fired')
+        return hedge_agent
+    
+    def _get_hedge_agent(self) -> Optional['JobAnalysisAgent']:
+        """Get the agent for the hedged request: hedge model first, then the healthiest other provider"""
+        if self.hedge_model and self.hedge_model != self.model:
+            return type(self)(
+                provider=self.provider,
+                api_key=self.api_key,
+                model=self.hedge_model,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                enable_optimizations=self.enable_optimizations,
+                structured_output=self.structured_output,
+                job_token_budget=self.job_token_budget,
+                rate_limits=self.rate_limits,
+                base_url=self.base_url,
+                enable_failover=False
+            )
+        
+        try:
+            from services.ai_settings import get_ai_settings_service
+            for config in get_ai_settings_service().get_failover_provider_configs(exclude=self.provider, stage=self.stage):
+                agent = type(self).from_settings(config, enable_failover=False)
+                if agent.ai_client:
+                    return agent
+        except Exception as e:
+            print(f"Could not load hedge provider: {str(e)}")
+        return None
+    
+    def _failover_analysis(self, job: JobData, profile: UserProfile) -> Optional[dict]:
+        """
+        Retry the analysis with the next healthy provider stored in AI settings
+        
+        Returns:
+            Analysis result, or None if no other provider succeeded
+        """
+        for agent in self._get_failover_agents():
+            try:
+                print(f"🔀 Failing over from {self.provider} to {agent.provider}")
+                return self._failover_result(agent._provider_analysis(job, profile), agent)
+            except Exception as e:
+                if not self._should_try_next_failover(e, agent):
+                    return None
+        
+        return None
+    
+    def _failover_result(self, result: dict, agent: 'JobAnalysisAgent') -> dict:
+        """Record a successful failover and tag the result with the provider that produced it"""
+        get_ai_metrics().increment('failover', f"{self.provider}->{agent.provider}", 'successes')
+        result['provider'] = agent.provider
+        return result
+    
+    def _should_try_next_failover(self, error: Exception, agent: 'JobAnalysisAgent') -> bool:
+        """Record why a failover provider failed; False when the deadline leaves no time for another"""
+        if isinstance(error, DeadlineExceeded):
+            get_ai_metrics().increment('fallbacks', f"{agent.provider}/{agent.model}", 'deadline')
+            return False
+        print(f"Failover to {agent.provider} failed: {str(error)}")
+        agent._record_fallback(error)
+        return True
+    
+    def _get_failover_agents(self) -> list:
+        """Get agents for the other stored providers, healthiest first (empty if failover is off)"""
+        if not self.enable_failover:
+            return []
+        
+        try:
+            from services.ai_settings import get_ai_settings_service
+            failover_configs = get_ai_settings_service().get_failover_provider_configs(exclude=self.provider, stage=self.stage)
+        except Exception as e:
+            print(f"Could not load failover providers: {str(e)}")
+            return []
+        
+        agents = [type(self).from_settings(config, enable_failover=False) for config in failover_configs]
+        return [agent for agent in agents if agent.ai_client]
+    
+    def _record_fallback(self, error: Exception):
+        """Count why a provider call did not produce an analysis"""
+        key = f"{self.provider}/{self.model}"
+        if isinstance(error, CircuitOpenError):
+            get_ai_metrics().increment('fallbacks', key, 'circuit_open')
+        elif isinstance(error, RateLimitExceeded):
+            get_ai_metrics().increment('fallbacks', key, 'rate_limited')
+        elif 'timed out' in str(error).lower() or 'timeout' in type(error).__name__.lower():
+            get_ai_metrics().increment('fallbacks', key, 'timeout')
+        else:
+            get_ai_metrics().increment('fallbacks', key, 'error')
+    
+    def _provider_analysis(self, job: JobData, profile: UserProfile, parse_fallback: bool = True) -> dict:
+        """
+        Run the analysis against this agent's provider
+        
+        Unparseable responses fall back to rule-based analysis here (or raise
+        ValueError when parse_fallback is False); provider errors are raised
+        so the caller can fail over
+        """
+        job_content, prompt_stats = self._prepare_job_content(job)
+        
+        # Two-stage routing: a cheaper model classifies first, and only relevant
+        # jobs go on to the email generation model
+        classify_agent = self._get_classify_agent()
+        if classify_agent:
+            classification = classify_agent._classify(job_content, profile)
+            result = self._classified_result(classification, classify_agent, job, profile, prompt_stats)
+            if result is not None:
+                return result
+        
+        # Static instructions and the profile block form a memoized prefix
+        # (too short for provider-side prompt caching, see prompt_builder)
+        messages = build_analysis_messages(job_content, profile)
+        
+        # Call AI API, using the provider's structured output mode when available
+        output_mode = self._get_structured_output_mode()
         try:
-            # Prepare job content for analysis
+            ai_response = self._create_completion(messages, output_mode)
+        except Exception as e:
+            output_mode = self._disable_structured_output(e, output_mode)
+            ai_response = self._create_completion(messages, output_mode)
+        
+        return self._finish_analysis(ai_response, output_mode, job, profile, prompt_stats, parse_fallback)
+    
+    def _prepare_job_content(self, job: JobData) -> tuple:
+        """
+        Prepare job content for analysis, compacted to the model's token budget
+        
+        Returns:
+            Tuple of (job content, prompt stats or None)
+        """
+        prompt_stats = None
+        if self.enable_optimizations:
+            prompt_content = build_job_prompt_content(job, self.model, self.max_tokens, self.job_token_budget)
+            job_content = prompt_content.text
+            prompt_stats = prompt_content.to_dict()
+            self._record_prompt_stats(prompt_stats)
+        else:
             job_content = self._extract_job_content(job)
+        
+        if self.provider not in ['openai', 'groq']:
+            raise ValueError(f"Unsupported AI provider: {self.provider}")
+        return job_content, prompt_stats
+    
+    def _classified_result(self, classification: Optional[dict], classify_agent: 'JobAnalysisAgent',
+                           job: JobData, profile: UserProfile, prompt_stats: Optional[dict]) -> Optional[dict]:
+        """Get the final result for a job the classifier ruled out, or None if it goes on to full analysis"""
+        if not classification or classification['status'] == 'RELEVANT':
+            return None
+        result = self._validate_and_enhance_result(classification, job, profile)
+        result['classified_by'] = f"{classify_agent.provider}/{classify_agent.model}"
+        if prompt_stats:
+            result['prompt_stats'] = prompt_stats
+        return result
+    
+    def _disable_structured_output(self, error: Exception, output_mode: str) -> str:
+        """
+        Remember that this model rejected a response_format mode and switch to prompt-only JSON
+        
+        Raises:
+            Exception: The original error if it isn't a response_format rejection
+        """
+        if output_mode == 'prompt' or not self._is_response_format_error(error):
+            raise error
+        print(f"⚠️ {self.provider}/{self.model} rejected {output_mode} mode, retrying with prompt-only JSON: {str(error)}")
+        _STRUCTURED_OUTPUT_UNSUPPORTED.add((self.provider, self.model))
+        return 'prompt'
+    
+    def _finish_analysis(self, ai_response: str, output_mode: str, job: JobData, profile: UserProfile,
+                         prompt_stats: Optional[dict], parse_fallback: bool = True) -> dict:
+        """Parse and validate the provider's analysis, falling back to rule-based analysis if it is unusable"""
+        metrics = get_ai_metrics()
+        
+        # Try to extract JSON from response
+        try:
+            print(f"🤖 AI Response from {self.provider} ({output_mode} mode):")
+            print(f"Raw response: {ai_response[:500]}...")  # Show first 500 chars for debugging
             
-            # Create prompt for AI analysis
-            prompt = self._create_analysis_prompt(job_content, profile)
-            
-            # Call AI API based on provider
-            if self.provider == 'openai':
-                response = self.ai_client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are a smart AI agent that helps automate job applications. You MUST respond with valid JSON only, no additional text or explanations. Follow the exact JSON format specified in the user prompt."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    max_tokens=self.max_tokens,
-                    temperature=self.temperature
-                )
-                ai_response = response.choices[0].message.content.strip()
-                
-            elif self.provider == 'groq':
-                response = self.ai_client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are a smart AI agent that helps automate job applications. You MUST respond with valid JSON only, no additional text or explanations. Follow the exact JSON format specified in the user prompt."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    max_tokens=self.max_tokens,
-                    temperature=self.temperature
-                )
-                ai_response = response.choices[0].message.content.strip()
+            # Try multiple JSON extraction methods
+            json_result = self._extract_json_from_response(ai_response)
             
+            if json_result:
+                print("✅ Successfully extracted JSON from AI response")
+                metrics.record_parse_outcome(self.provider, self.model, output_mode, True)
+                result = self._validate_and_enhance_result(json_result, job, profile)
+                if prompt_stats:
+                    if self.last_usage:
+                        prompt_stats['cached_tokens'] = self.last_usage['cached_tokens']
+                    result['prompt_stats'] = prompt_stats
+                return result
             else:
-                raise ValueError(f"Unsupported AI provider: {self.provider}")
-            
-            # Try to extract JSON from response
-            try:
-                print(f"🤖 AI Response from {self.provider}:")
-                print(f"Raw response: {ai_response[:500]}...")  # Show first 500 chars for debugging
-                
-                # Try multiple JSON extraction methods
-                json_result = self._extract_json_from_response(ai_response)
-                
-                if json_result:
-                    print("✅ Successfully extracted JSON from AI response")
-                    return self._validate_and_enhance_result(json_result, job, profile)
-                else:
-                    raise ValueError("No valid JSON found in AI response")
-                    
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON parsing error: {str(e)}")
-                print(f"🔄 AI response that failed to parse: {ai_response}")
-                print("🔄 Falling back to rule-based analysis")
-                return self._rule_based_analysis(job, profile)
-            except Exception as e:
-                print(f"❌ Error extracting JSON: {str(e)}")
-                print("🔄 Falling back to rule-based analysis")
-                return self._rule_based_analysis(job, profile)
+                raise ValueError("No valid JSON found in AI response")
                 
+        except json.JSONDecodeError as e:
+            metrics.record_parse_outcome(self.provider, self.model, output_mode, False)
+            if not parse_fallback:
+                raise ValueError(f"Unparseable AI response: {str(e)}")
+            print(f"❌ JSON parsing error: {str(e)}")
+            print(f"🔄 AI response that failed to parse: {ai_response}")
+            print("🔄 Falling back to rule-based analysis")
+            return self._rule_based_analysis(job, profile)
         except Exception as e:
-            print(f"AI analysis failed: {str(e)}")
+            metrics.record_parse_outcome(self.provider, self.model, output_mode, False)
+            if not parse_fallback:
+                raise ValueError(f"Unparseable AI response: {str(e)}")
+            print(f"❌ Error extracting JSON: {str(e)}")
+            print("🔄 Falling back to rule-based analysis")
             return self._rule_based_analysis(job, profile)
     
+    def _get_classify_agent(self) -> Optional['JobAnalysisAgent']:
+        """Get the agent for the classification stage, if a different classify model is routed"""
+        if not self.classify_settings:
+            return None
+        if (self.classify_settings.get('provider'), self.classify_settings.get('model')) == (self.provider, self.model):
+            return None
+        agent = type(self).from_settings(
+            self.classify_settings,
+            stage=CLASSIFY,
+            enable_failover=False,
+            enable_hedging=False
+        )
+        agent.classify_settings = None
+        return agent if agent.ai_client else None
+    
+    def _classify(self, job_content: str, profile: UserProfile) -> Optional[dict]:
+        """
+        Classify a job's relevance without generating an email
+        
+        Returns:
+            Dictionary with status, reason and contact, or None if the
+            classification failed (the caller then runs the full analysis)
+        """
+        messages = build_classification_messages(job_content, profile)
+        output_mode = self._get_structured_output_mode()
+        try:
+            try:
+                response = self._create_completion(messages, output_mode, CLASSIFICATION_RESULT_SCHEMA, 'job_classification')
+            except Exception as e:
+                output_mode = self._disable_structured_output(e, output_mode)
+                response = self._create_completion(messages, output_mode, CLASSIFICATION_RESULT_SCHEMA, 'job_classification')
+            classification = self._extract_json_from_response(response)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Classification with {self.provider}/{self.model} failed, running full analysis: {str(e)}")
+            self._record_fallback(e)
+            return None
+        return self._classification_outcome(classification, output_mode)
+    
+    def _classification_outcome(self, classification: Optional[dict], output_mode: str) -> Optional[dict]:
+        """Record and normalize a parsed classification (None if it is unusable)"""
+        success = bool(classification) and classification.get('status') in ['RELEVANT', 'NOT RELEVANT']
+        get_ai_metrics().record_parse_outcome(self.provider, self.model, output_mode, success)
+        if not success:
+            return None
+        return {
+            'status': classification['status'],
+            'reason': classification.get('reason', ''),
+            'contact': classification.get('contact'),
+            'email_subject': '',
+            'email_body': '',
+            'attachment_required': False
+        }
+    
+    def _create_completion(self, messages: list, output_mode: str = 'prompt',
+                           schema: dict = None, schema_name: str = 'job_analysis') -> str:
+        """
+        Run a chat completion and return the response text
+        
+        Args:
+            messages: Chat messages to send
+            output_mode: 'json_schema', 'json_object' or 'prompt'
+            schema: JSON schema for json_schema mode (defaults to the analysis schema)
+            schema_name: Name sent with the JSON schema
+            
+        Returns:
+            Stripped response content
+        """
+        response = chat_completion(
+            self.ai_client,
+            self.provider,
+            rate_limits=self.rate_limits,
+            stage=self.stage,
+            **self._completion_kwargs(messages, output_mode, schema, schema_name)
+        )
+        return self._completion_text(response)
+    
+    def _completion_kwargs(self, messages: list, output_mode: str, schema: dict = None,
+                           schema_name: str = 'job_analysis') -> dict:
+        """Build chat.completions.create() arguments for an output mode"""
+        request_kwargs = {
+            'model': self.model,
+            'messages': messages,
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature
+        }
+        
+        if output_mode == 'json_schema':
+            request_kwargs['response_format'] = {
+                'type': 'json_schema',
+                'json_schema': {
+                    'name': schema_name,
+                    'strict': True,
+                    'schema': schema or ANALYSIS_RESULT_SCHEMA
+                }
+            }
+        elif output_mode == 'json_object':
+            request_kwargs['response_format'] = {'type': 'json_object'}
+        return request_kwargs
+    
+    def _completion_text(self, response) -> str:
+        """Record a completion's token usage and return its stripped text"""
+        self.last_usage = self._record_usage(getattr(response, 'usage', None))
+        return (response.choices[0].message.content or '').strip()
+    
+    def _record_usage(self, usage) -> Optional[dict]:
+        """Record token usage, including any provider prompt-cache hits, from a completion response"""
+        if usage is None:
+            return None
+        
+        details = getattr(usage, 'prompt_tokens_details', None)
+        if isinstance(details, dict):
+            cached_tokens = details.get('cached_tokens') or 0
+        else:
+            cached_tokens = getattr(details, 'cached_tokens', 0) or 0
+        
+        usage_stats = {
+            'prompt_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+            'completion_tokens': getattr(usage, 'completion_tokens', 0) or 0,
+            'cached_tokens': cached_tokens
+        }
+        
+        metrics = get_ai_metrics()
+        key = f"{self.provider}/{self.model}"
+        metrics.increment('token_usage', key, 'requests')
+        for field, value in usage_stats.items():
+            metrics.increment('token_usage', key, field, value)
+        if cached_tokens:
+            metrics.increment('token_usage', key, 'cache_hit_requests')
+        return usage_stats
+    
+    def _record_prompt_stats(self, prompt_stats: dict):
+        """Record per-request job content token savings"""
+        metrics = get_ai_metrics()
+        key = f"{self.provider}/{self.model}"
+        metrics.increment('prompt_tokens', key, 'requests')
+        metrics.increment('prompt_tokens', key, 'original_tokens', prompt_stats['original_tokens'])
+        metrics.increment('prompt_tokens', key, 'prompt_tokens', prompt_stats['prompt_tokens'])
+        metrics.increment('prompt_tokens', key, 'saved_tokens', prompt_stats['saved_tokens'])
+        if prompt_stats['truncated']:
+            metrics.increment('prompt_tokens', key, 'truncated')
+        metrics.observe('prompt_tokens', key, 'saved_per_request', prompt_stats['saved_tokens'])
+        print(f"✂️ Job content: {prompt_stats['original_tokens']} -> {prompt_stats['prompt_tokens']} tokens "
+              f"(saved {prompt_stats['saved_tokens']}, budget {prompt_stats['budget_tokens']})")
+    
+    def _get_structured_output_mode(self) -> str:
+        """
+        Determine which structured output mode the configured model supports
+        
+        Returns:
+            'json_schema' for strict schema output, 'json_object' for JSON mode,
+            or 'prompt' when only prompt instructions can be used
+        """
+        if not self._structured_output_enabled():
+            return 'prompt'
+        if (self.provider, self.model) in _STRUCTURED_OUTPUT_UNSUPPORTED:
+            return 'prompt'
+        
+        model = (self.model or '').lower()
+        capabilities = STRUCTURED_OUTPUT_MODELS.get(self.provider, {})
+        
+        if any(model.startswith(prefix) for prefix in capabilities.get('json_schema', ())):
+            return 'json_schema'
+        if any(model.startswith(prefix) for prefix in capabilities.get('json_object', ())):
+            return 'json_object'
+        return 'prompt'
+    
+    def _structured_output_enabled(self) -> bool:
+        """Check the structured_output setting ('auto' by default; false/"off"/"0" and the like disable it)"""
+        value = self.structured_output
+        if value is None or (isinstance(value, str) and value.strip().lower() in ('', 'auto')):
+            return True
+        return parse_bool(value)
+    
+    def _is_response_format_error(self, error: Exception) -> bool:
+        """Check if a provider rejected the request (400) because of an unsupported response_format"""
+        if getattr(error, 'status_code', None) != 400:
+            return False
+        message = str(error).lower()
+        return 'response_format' in message or 'json_schema' in message or 'json mode' in message
+    
     def _rule_based_analysis(self, job: JobData, profile: UserProfile) -> dict:
         """Rule-based job analysis as fallback"""
         
@@ -292,7 +820,8 @@ class JobAnalysisAgent:
                 "contact": None,
                 "email_subject": "",
                 "email_body": "",
-                "attachment_required": False
+                "attachment_required": False,
+                "fallback": True
             }
         
         # Extract contact information
@@ -307,7 +836,8 @@ class JobAnalysisAgent:
             "contact": contact_email,
             "email_subject": email_data['subject'],
             "email_body": email_data['body'],
-            "attachment_required": True
+            "attachment_required": True,
+            "fallback": True
         }
     
     def _extract_job_content(self, job: JobData) -> str:
@@ -433,52 +963,6 @@ Best regards,
             'body': body
         }
     
-    def _create_analysis_prompt(self, job_content: str, profile: UserProfile) -> str:
-        """Create prompt for AI analysis"""
-        
-        return f"""
-You are a smart and structured AI agent that helps automate job applications for a developer named {profile.name}.
-
-{profile.name} is a {profile.domain} professional with {profile.experience} year of industry experience. Your task is to analyze the following job post content and help automate the application workflow.
-
-USER PROFILE:
-- Name: {profile.name}
-- Experience: {profile.experience} year
-- Domain: {profile.domain}
-- Skills: {', '.join(profile.skills)}
-- Preferred Roles: {', '.join(profile.preferred_roles)}
-- Preferred Work Type: {', '.join(profile.preferred_work_type)}
-- Excluded Roles: {', '.join(profile.excluded_roles)}
-- Preferred Company Types: {', '.join(profile.preferred_company_types)}
-
-JOB POST CONTENT:
-{job_content}
-
-INSTRUCTIONS:
-1. Analyze if this job is relevant to the user's profile
-2. Extract contact information if available
-3. Generate a personalized application email if relevant
-4. Return ONLY a valid JSON response in the exact format below (no additional text):
-
-```json
-{{
-  "status": "RELEVANT" or "NOT RELEVANT",
-  "reason": "1-2 line explanation of your decision",
-  "contact": "email@company.com or null",
-  "email_subject": "Email subject line",
-  "email_body": "Professional email body with personalized content",
-  "attachment_required": true
-}}
-```
-
-IMPORTANT: 
-- Return ONLY the JSON, no other text
-- Use double quotes for all strings
-- If no contact email found, use null (not "null")
-- Keep email content professional and concise
-- Don't include newlines in JSON string values, use \\n instead
-"""
-    
     def _validate_and_enhance_result(self, result: dict, job: JobData, profile: UserProfile) -> dict:
         """Validate and enhance AI-generated result"""
         
@@ -590,6 +1074,216 @@ IMPORTANT:
         
         return None
 
+class AsyncJobAnalysisAgent(JobAnalysisAgent):
+    """
+    Job analysis agent whose provider calls run on an async client
+    
+    Prompt building, routing, parsing and fallbacks are shared with
+    JobAnalysisAgent; only the waits on the provider are awaited, so one event
+    loop can keep many analyses in flight. Create it inside a running loop.
+    """
+    
+    def setup_ai_client(self):
+        """Setup the async AI client for the running event loop"""
+        try:
+            self.ai_client = create_async_ai_client(self.provider, self.api_key, self.base_url)
+            if not self.ai_client:
+                print(f"Warning: {self.provider} not available or not supported.")
+        except Exception as e:
+            print(f"Error setting up async AI client: {str(e)}")
+            self.ai_client = None
+    
+    async def analyze_job_async(self, job_data: dict, user_profile: dict) -> dict:
+        """
+        Main method to analyze a job post
+        
+        Args:
+            job_data: Dictionary containing job post information
+            user_profile: Dictionary containing user profile information
+            
+        Returns:
+            Dictionary containing analysis results
+        """
+        try:
+            job = self._parse_job_data(job_data)
+            profile = self._parse_user_profile(user_profile)
+            
+            if self.ai_client:
+                return await self._ai_analysis_async(job, profile)
+            else:
+                return self._rule_based_analysis(job, profile)
+                
+        except Exception as e:
+            print(f"Error in job analysis: {str(e)}")
+            return self._error_response(str(e))
+    
+    async def _ai_analysis_async(self, job: JobData, profile: UserProfile) -> dict:
+        """AI-powered job analysis using configured provider, failing over to other stored providers"""
+        try:
+            if self.enable_hedging:
+                return await self._hedged_analysis_async(job, profile)
+            return await self._provider_analysis_async(job, profile)
+        except Exception as e:
+            if not self._should_fail_over(e):
+                return self._rule_based_analysis(job, profile)
+        
+        result = await self._failover_analysis_async(job, profile)
+        if result is not None:
+            return result
+        return self._rule_based_analysis(job, profile)
+    
+    async def _hedged_analysis_async(self, job: JobData, profile: UserProfile) -> dict:
+        """
+        Run the analysis with a hedge against slow primary completions
+        
+        Same policy as _hedged_analysis(), but the losing call is cancelled
+        outright, releasing its scheduler slot and connection.
+        
+        Raises:
+            Exception: The primary's error if no call produced a valid result
+        """
+        key = f"{self.provider}/{self.model}"
+        budget, delay = self._hedge_delay(key)
+        if delay is None:
+            return await self._provider_analysis_async(job, profile)
+        
+        primary = asyncio.ensure_future(self._provider_analysis_async(job, profile, False))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+            
+            hedge_agent = self._start_hedge(budget, key)
+            if hedge_agent is None:
+                return await primary
+            
+            self._log_hedge(key, delay, hedge_agent)
+            hedge = asyncio.ensure_future(hedge_agent._provider_analysis_async(job, profile, False))
+            budget.release_when_done((primary, hedge))
+            pending.add(hedge)
+            
+            first_error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        if task is primary or first_error is None:
+                            first_error = e
+                        continue
+                    
+                    return self._hedge_result(result, key, hedge_agent if task is hedge else None)
+            
+            # Neither call produced a valid analysis
+            raise first_error
+        finally:
+            # Cancel the loser, or both calls if this request was cancelled
+            for task in pending:
+                task.cancel()
+    
+    async def _failover_analysis_async(self, job: JobData, profile: UserProfile) -> Optional[dict]:
+        """
+        Retry the analysis with the next healthy provider stored in AI settings
+        
+        Returns:
+            Analysis result, or None if no other provider succeeded
+        """
+        for agent in self._get_failover_agents():
+            try:
+                print(f"🔀 Failing over from {self.provider} to {agent.provider}")
+                return self._failover_result(await agent._provider_analysis_async(job, profile), agent)
+            except Exception as e:
+                if not self._should_try_next_failover(e, agent):
+                    return None
+        
+        return None
+    
+    async def _provider_analysis_async(self, job: JobData, profile: UserProfile, parse_fallback: bool = True) -> dict:
+        """Run the analysis against this agent's provider (see _provider_analysis())"""
+        job_content, prompt_stats = self._prepare_job_content(job)
+        
+        classify_agent = self._get_classify_agent()
+        if classify_agent:
+            classification = await classify_agent._classify_async(job_content, profile)
+            result = self._classified_result(classification, classify_agent, job, profile, prompt_stats)
+            if result is not None:
+                return result
+        
+        messages = build_analysis_messages(job_content, profile)
+        
+        output_mode = self._get_structured_output_mode()
+        try:
+            ai_response = await self._create_completion_async(messages, output_mode)
+        except Exception as e:
+            output_mode = self._disable_structured_output(e, output_mode)
+            ai_response = await self._create_completion_async(messages, output_mode)
+        
+        return self._finish_analysis(ai_response, output_mode, job, profile, prompt_stats, parse_fallback)
+    
+    async def _classify_async(self, job_content: str, profile: UserProfile) -> Optional[dict]:
+        """Classify a job's relevance without generating an email (see _classify())"""
+        messages = build_classification_messages(job_content, profile)
+        output_mode = self._get_structured_output_mode()
+        try:
+            try:
+                response = await self._create_completion_async(messages, output_mode, CLASSIFICATION_RESULT_SCHEMA, 'job_classification')
+            except Exception as e:
+                output_mode = self._disable_structured_output(e, output_mode)
+                response = await self._create_completion_async(messages, output_mode, CLASSIFICATION_RESULT_SCHEMA, 'job_classification')
+            classification = self._extract_json_from_response(response)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Classification with {self.provider}/{self.model} failed, running full analysis: {str(e)}")
+            self._record_fallback(e)
+            return None
+        return self._classification_outcome(classification, output_mode)
+    
+    async def _create_completion_async(self, messages: list, output_mode: str = 'prompt',
+                                       schema: dict = None, schema_name: str = 'job_analysis') -> str:
+        """Run a chat completion on the async client and return the response text"""
+        response = await async_chat_completion(
+            self.ai_client,
+            self.provider,
+            rate_limits=self.rate_limits,
+            stage=self.stage,
+            **self._completion_kwargs(messages, output_mode, schema, schema_name)
+        )
+        return self._completion_text(response)
+
+def get_analysis_cache_key(job_data: dict, user_profile: dict, ai_settings: dict = None) -> str:
+    """
+    Build the cache key identifying an analysis request
+    
+    Two requests with the same key produce the same analysis: same job
+    content, same profile and same provider/model settings
+    
+    Args:
+        job_data: Dictionary containing job post information
+        user_profile: Dictionary containing user profile information
+        ai_settings: Dictionary containing AI configuration
+        
+    Returns:
+        Hex digest key
+    """
+    ai_settings = ai_settings or {}
+    key_data = {
+        'job': {field: job_data.get(field) for field in ANALYSIS_CACHE_JOB_FIELDS},
+        'profile': user_profile,
+        'provider': ai_settings.get('provider'),
+        'model': ai_settings.get('model'),
+        'temperature': ai_settings.get('temperature'),
+        'max_tokens': ai_settings.get('max_tokens'),
+        'classify_model': (ai_settings.get('classify_route') or {}).get('model')
+    }
+    encoded = json.dumps(key_data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+# Job fields that affect the analysis result (timestamps and scrape metadata don't)
+ANALYSIS_CACHE_JOB_FIELDS = ['type', 'title', 'company', 'location', 'description', 'content', 'contactInfo', 'url']
+
 # Convenience function for external use
 def analyze_job_post(job_data: dict, user_profile: dict, ai_settings: dict = None) -> dict:
     """
@@ -604,21 +1298,50 @@ def analyze_job_post(job_data: dict, user_profile: dict, ai_settings: dict = Non
         Dictionary containing analysis results
     """
     if ai_settings:
-        agent = JobAnalysisAgent(
-            provider=ai_settings.get('provider'),
-            api_key=ai_settings.get('api_key'),
-            model=ai_settings.get('model'),
-            temperature=ai_settings.get('temperature', 0.7),
-            max_tokens=ai_settings.get('max_tokens', 1500),
-            enable_optimizations=ai_settings.get('enable_optimizations', True)
-        )
+        agent = JobAnalysisAgent.from_settings(ai_settings)
     else:
         # Fallback to environment variables or default settings
         agent = JobAnalysisAgent()
     
     # Get the basic analysis
     result = agent.analyze_job(job_data, user_profile)
+    return add_resume_skills(result, job_data, user_profile)
+
+
+async def analyze_job_post_async(job_data: dict, user_profile: dict, ai_settings: dict = None) -> dict:
+    """
+    Analyze a job post without holding a thread while waiting on the provider
+    
+    Args:
+        job_data: Dictionary containing job post information
+        user_profile: Dictionary containing user profile information
+        ai_settings: Dictionary containing AI configuration (provider, api_key, etc.)
+        
+    Returns:
+        Dictionary containing analysis results
+    """
+    if ai_settings:
+        agent = AsyncJobAnalysisAgent.from_settings(ai_settings)
+    else:
+        agent = AsyncJobAnalysisAgent()
     
+    result = await agent.analyze_job_async(job_data, user_profile)
+    # Resume parsing reads files from disk; keep it off the event loop
+    return await asyncio.to_thread(add_resume_skills, result, job_data, user_profile)
+
+
+def add_resume_skills(result: dict, job_data: dict, user_profile: dict) -> dict:
+    """
+    Add resume skills matching to an analysis result
+    
+    Args:
+        result: Analysis result to update
+        job_data: Dictionary containing job post information
+        user_profile: Dictionary containing user profile information (resumeUrl)
+        
+    Returns:
+        The updated analysis result
+    """
     # Add resume skills analysis if resume exists
     resume_url = user_profile.get('resumeUrl', '')
     if resume_url and os.path.exists(resume_url):
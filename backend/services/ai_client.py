@@ -0,0 +1,415 @@
+"""
+AI client helpers shared by the job analysis agent and the pre-filter
+Creates provider clients and runs chat completions within the request deadline,
+from threads (WSGI) or asyncio tasks (ASGI)
+"""
+
+import asyncio
+import hashlib
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from utils.env_manager import getenv_int, getenv_float
+from utils.deadline import get_call_timeout, get_deadline
+from services.circuit_breaker import get_circuit_breaker, CircuitOpenError
+from services.ai_metrics import get_ai_metrics
+from services.rate_limiter import get_rate_limiter
+from services.prompt_builder import estimate_tokens
+from services.scheduler import get_provider_scheduler, get_priority
+from services.model_routing import record_stage_call, CONNECTION_TEST
+
+try:
+    import openai
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+
+try:
+    from groq import Groq, AsyncGroq
+    GROQ_AVAILABLE = True
+except ImportError:
+    GROQ_AVAILABLE = False
+
+
+# Clients are thread-safe and hold a connection pool, so one per provider and key is shared
+MAX_REGISTERED_CLIENTS = 16
+_client_registry = {}
+_client_registry_lock = threading.Lock()
+# Async clients are bound to the event loop they were created on: (loop, client) by key
+_async_client_registry = {}
+# An httpx pool scans all of its connections for every queued request, so heavy
+# concurrency is spread round-robin over several smaller pools per provider and key
+_async_shard_counter = itertools.count()
+
+# Running average of completion tokens by provider/model, charged to the rate limiter up front
+COMPLETION_AVERAGE_WEIGHT = 0.2
+_completion_averages = {}
+_completion_averages_lock = threading.Lock()
+
+
+def create_ai_client(provider: str, api_key: str, base_url: Optional[str] = None):
+    """
+    Get the shared chat completions client for a provider and API key
+
+    Args:
+        provider: AI provider name ('openai' or 'groq')
+        api_key: Provider API key
+        base_url: Alternative API endpoint (e.g. a local OpenAI-compatible server)
+
+    Returns:
+        Client instance, or None if the provider library is not available
+    """
+    key = (provider, hashlib.sha256((api_key or '').encode()).hexdigest(), base_url)
+    with _client_registry_lock:
+        client = _client_registry.get(key)
+        if client is None:
+            client = _new_client(provider, api_key, base_url)
+            if client is not None:
+                if len(_client_registry) >= MAX_REGISTERED_CLIENTS:
+                    # Drop the oldest client (e.g. keys that were only tested once)
+                    _client_registry.pop(next(iter(_client_registry)))
+                _client_registry[key] = client
+        return client
+
+
+def _new_client(provider: str, api_key: str, base_url: Optional[str] = None):
+    """Create a new client for a provider"""
+    options = {'api_key': api_key}
+    if base_url:
+        options['base_url'] = base_url
+    if provider == 'openai' and OPENAI_AVAILABLE:
+        return openai.OpenAI(**options)
+    elif provider == 'groq' and GROQ_AVAILABLE:
+        return Groq(**options)
+    return None
+
+
+def create_async_ai_client(provider: str, api_key: str, base_url: Optional[str] = None):
+    """
+    Get the shared async chat completions client for a provider and API key
+    on the running event loop
+
+    Args:
+        provider: AI provider name ('openai' or 'groq')
+        api_key: Provider API key
+        base_url: Alternative API endpoint (e.g. a local OpenAI-compatible server)
+
+    Returns:
+        AsyncOpenAI / AsyncGroq instance, or None if the provider library is not available
+    """
+    loop = asyncio.get_running_loop()
+    shards = max(1, getenv_int('ASYNC_AI_CLIENT_SHARDS', 16))
+    shard = next(_async_shard_counter) % shards
+    key = (id(loop), provider, hashlib.sha256((api_key or '').encode()).hexdigest(), base_url, shard)
+    with _client_registry_lock:
+        entry = _async_client_registry.get(key)
+        if entry is not None and entry[0] is loop:
+            return entry[1]
+        client = _new_async_client(provider, api_key, base_url, shards)
+        if client is not None:
+            if key not in _async_client_registry and len(_async_client_registry) >= MAX_REGISTERED_CLIENTS * shards:
+                _async_client_registry.pop(next(iter(_async_client_registry)))
+            _async_client_registry[key] = (loop, client)
+        return client
+
+
+def _new_async_client(provider: str, api_key: str, base_url: Optional[str] = None, shards: int = 1):
+    """Create a new async client holding its share of the async connection limits"""
+    options = {'api_key': api_key}
+    if base_url:
+        options['base_url'] = base_url
+    import httpx
+    limits = httpx.Limits(
+        max_connections=max(1, getenv_int('ASYNC_AI_MAX_CONNECTIONS', 1000) // shards),
+        max_keepalive_connections=max(1, getenv_int('ASYNC_AI_MAX_KEEPALIVE', 100) // shards)
+    )
+    if provider == 'openai' and OPENAI_AVAILABLE:
+        return openai.AsyncOpenAI(http_client=openai.DefaultAsyncHttpxClient(limits=limits), **options)
+    elif provider == 'groq' and GROQ_AVAILABLE:
+        from groq import DefaultAsyncHttpxClient
+        return AsyncGroq(http_client=DefaultAsyncHttpxClient(limits=limits), **options)
+    return None
+
+
+def chat_completion(client, provider: str = None, rate_limits: Optional[Dict[str, Any]] = None,
+                    stage: str = None, **request_kwargs) -> Any:
+    """
+    Run a chat completion bounded by the current request deadline
+
+    The remaining request budget (minus a reserve for fallback work) is passed
+    to the provider as the call timeout. Under a deadline, client-side retries
+    are disabled so a slow provider can't push the request past it. When a
+    provider name is given, the call goes through that provider's circuit
+    breaker and fails fast while the circuit is open, then waits for budget
+    from the shared per-provider, per-key rate limiter. Only then does it
+    queue for a slot from the provider call scheduler (under the priority
+    class of the current request), so a provider that is rate limited or
+    failing never holds slots that calls to healthy providers could use.
+
+    Args:
+        client: Client created by create_ai_client()
+        provider: Provider name used for circuit breaking and rate limiting
+        rate_limits: Optional requests_per_minute / tokens_per_minute overrides
+        stage: Pipeline stage the call belongs to, for per-stage cost and latency
+        **request_kwargs: Arguments for chat.completions.create()
+
+    Returns:
+        Provider completion response
+
+    Raises:
+        DeadlineExceeded: If the request deadline leaves no time for the call
+        CircuitOpenError: If the provider's circuit is open
+        RateLimitExceeded: If rate budget isn't available in time
+    """
+    default_timeout = getenv_float('AI_REQUEST_TIMEOUT', 20.0)
+    get_call_timeout(default_timeout)
+
+    scheduler = get_provider_scheduler()
+    priority_class = get_priority()
+    breaker = _check_circuit(provider)
+    api_key, estimated_tokens = _rate_limit_request(client, provider, request_kwargs)
+    charged = False
+    try:
+        if provider:
+            get_rate_limiter().acquire(provider, api_key, estimated_tokens, rate_limits)
+            charged = True
+        scheduler.acquire(priority_class)
+    except BaseException:
+        _abandon_call(breaker, provider, api_key, estimated_tokens if charged else 0, rate_limits)
+        raise
+
+    try:
+        response, total_tokens = _run_completion(client, provider, stage, breaker, default_timeout, request_kwargs)
+    finally:
+        scheduler.release(priority_class)
+    # Return unused token budget (or charge the overrun) once actual usage is known
+    if provider and isinstance(total_tokens, int):
+        get_rate_limiter().adjust_tokens(provider, api_key, estimated_tokens - total_tokens, rate_limits)
+    return response
+
+
+def _run_completion(client, provider: Optional[str], stage: Optional[str], breaker, default_timeout: float,
+                    request_kwargs: Dict[str, Any]) -> tuple:
+    """
+    Time one provider call and record its outcome (caller holds a scheduler slot)
+
+    Returns:
+        Tuple of (response, total tokens or None)
+    """
+    start_time = time.monotonic()
+    try:
+        options = _call_options(default_timeout)
+        response = client.with_options(**options).chat.completions.create(**request_kwargs)
+    except Exception as e:
+        _record_call_failure(breaker, e, start_time)
+        raise
+
+    return response, _record_call_success(provider, stage, breaker, request_kwargs, response, start_time)
+
+
+async def async_chat_completion(client, provider: str = None, rate_limits: Optional[Dict[str, Any]] = None,
+                                stage: str = None, **request_kwargs) -> Any:
+    """
+    Run a chat completion on an async client, bounded by the current request deadline
+
+    Applies the same circuit breaker, rate limit and scheduler slot, in the
+    same order, as chat_completion(), but queuing and waiting on the provider
+    don't hold a thread, so one process can keep many calls in flight.
+
+    Args:
+        client: Client created by create_async_ai_client()
+        provider: Provider name used for circuit breaking and rate limiting
+        rate_limits: Optional requests_per_minute / tokens_per_minute overrides
+        stage: Pipeline stage the call belongs to, for per-stage cost and latency
+        **request_kwargs: Arguments for chat.completions.create()
+
+    Returns:
+        Provider completion response
+    """
+    default_timeout = getenv_float('AI_REQUEST_TIMEOUT', 20.0)
+    get_call_timeout(default_timeout)
+
+    scheduler = get_provider_scheduler()
+    priority_class = get_priority()
+    breaker = _check_circuit(provider)
+    api_key, estimated_tokens = _rate_limit_request(client, provider, request_kwargs)
+    charged = False
+    try:
+        if provider:
+            await get_rate_limiter().acquire_async(provider, api_key, estimated_tokens, rate_limits)
+            charged = True
+        await scheduler.acquire_async(priority_class)
+    except BaseException:
+        _abandon_call(breaker, provider, api_key, estimated_tokens if charged else 0, rate_limits)
+        raise
+
+    try:
+        start_time = time.monotonic()
+        try:
+            options = _call_options(default_timeout)
+            response = await client.with_options(**options).chat.completions.create(**request_kwargs)
+        except asyncio.CancelledError:
+            # Abandoned (e.g. a losing hedge); says nothing about provider health
+            if breaker:
+                breaker.release()
+            raise
+        except Exception as e:
+            _record_call_failure(breaker, e, start_time)
+            raise
+    finally:
+        scheduler.release(priority_class)
+
+    total_tokens = _record_call_success(provider, stage, breaker, request_kwargs, response, start_time)
+    if provider and isinstance(total_tokens, int):
+        await asyncio.to_thread(get_rate_limiter().adjust_tokens, provider, api_key,
+                                estimated_tokens - total_tokens, rate_limits)
+    return response
+
+
+def _check_circuit(provider: Optional[str]):
+    """
+    Check the provider's circuit before a call spends rate budget or a scheduler slot
+
+    Returns:
+        The provider's circuit breaker (None without a provider); its outcome must be recorded
+
+    Raises:
+        CircuitOpenError: If the provider's circuit is open
+    """
+    breaker = get_circuit_breaker(provider) if provider else None
+    if breaker and not breaker.allow_request():
+        raise CircuitOpenError(provider, breaker.retry_after())
+    return breaker
+
+
+def _rate_limit_request(client, provider: Optional[str], request_kwargs: Dict[str, Any]) -> tuple:
+    """
+    Get the rate limit bucket key and token charge for a call
+
+    Returns:
+        Tuple of (API key, estimated tokens); both empty without a provider
+    """
+    if not provider:
+        return '', 0
+    api_key = getattr(client, 'api_key', None) or ''
+    estimated_tokens = estimate_request_tokens(request_kwargs.get('messages', []), expected_completion_tokens(
+        provider, request_kwargs.get('model'), request_kwargs.get('max_tokens')))
+    return api_key, estimated_tokens
+
+
+def _abandon_call(breaker, provider: Optional[str], api_key: str, charged_tokens: int,
+                  rate_limits: Optional[Dict[str, Any]]):
+    """Undo the admission of a call that was never sent (no slot or rate budget in time, or cancelled)"""
+    if breaker:
+        breaker.release()
+    if provider and charged_tokens:
+        try:
+            get_rate_limiter().adjust_tokens(provider, api_key, charged_tokens, rate_limits)
+        except Exception as e:
+            print(f"⚠️ Could not return rate budget for {provider}: {str(e)}")
+
+
+def _call_options(default_timeout: float) -> Dict[str, Any]:
+    """
+    Get the with_options() arguments for a call
+
+    Raises:
+        DeadlineExceeded: If the request deadline leaves no time for the call
+    """
+    # Time spent waiting for rate budget and a slot comes out of the call's timeout
+    timeout = get_call_timeout(default_timeout)
+
+    options = {'timeout': timeout}
+    if get_deadline() is not None:
+        options['max_retries'] = 0
+    return options
+
+
+def _record_call_failure(breaker, error: Exception, start_time: float):
+    if breaker:
+        if is_provider_failure(error):
+            breaker.record_failure(time.monotonic() - start_time)
+        else:
+            breaker.release()
+
+
+def _record_call_success(provider: Optional[str], stage: Optional[str], breaker, request_kwargs: Dict[str, Any],
+                         response: Any, start_time: float) -> Optional[int]:
+    """
+    Record latency and usage of a completed call and return its total tokens
+
+    Connection tests and prober pings (1-token completions) still feed the
+    circuit breaker and their stage stats, but stay out of the latency
+    samples hedging uses and the completion-size average rate limiting
+    charges, which they would pull down.
+    """
+    latency = time.monotonic() - start_time
+    if breaker:
+        breaker.record_success(latency)
+    real_call = stage != CONNECTION_TEST
+    if real_call:
+        get_ai_metrics().observe('provider_latency', f"{provider}/{request_kwargs.get('model')}", 'seconds', latency)
+
+    usage = getattr(response, 'usage', None)
+    if stage:
+        record_stage_call(stage, provider, request_kwargs.get('model'), latency, usage)
+    completion_tokens = getattr(usage, 'completion_tokens', None) if usage is not None else None
+    if provider and real_call and isinstance(completion_tokens, int):
+        record_completion_tokens(provider, request_kwargs.get('model'), completion_tokens)
+    return getattr(usage, 'total_tokens', None) if usage is not None else None
+
+
+def estimate_request_tokens(messages: List[Dict[str, Any]], completion_tokens: Optional[int] = None) -> int:
+    """Estimate the tokens a chat completion will use: prompt plus the expected completion"""
+    prompt_tokens = sum(estimate_tokens(str(message.get('content') or '')) + 4 for message in messages)
+    return prompt_tokens + (completion_tokens or 0)
+
+
+def expected_completion_tokens(provider: Optional[str], model: Optional[str], max_tokens: Optional[int] = None) -> int:
+    """
+    Get the completion tokens to charge against the rate limit before a call
+
+    Charging the full max_tokens would hold back budget most calls never use
+    (an analysis rarely needs its 1500-token cap), so calls are charged the
+    running average completion size of the provider/model in this worker,
+    starting from AI_COMPLETION_TOKEN_ESTIMATE. The difference is settled
+    once the response reports its usage.
+
+    Args:
+        provider: Provider name
+        model: Model name
+        max_tokens: Completion cap of the call, which the estimate never exceeds
+
+    Returns:
+        Expected completion tokens
+    """
+    with _completion_averages_lock:
+        average = _completion_averages.get(f"{provider}/{model}")
+    expected = round(average) if average is not None else getenv_int('AI_COMPLETION_TOKEN_ESTIMATE', 300)
+    return min(expected, max_tokens) if max_tokens else expected
+
+
+def record_completion_tokens(provider: Optional[str], model: Optional[str], completion_tokens: int):
+    """Fold a call's actual completion size into the running average for its provider/model"""
+    key = f"{provider}/{model}"
+    with _completion_averages_lock:
+        average = _completion_averages.get(key)
+        if average is None:
+            _completion_averages[key] = float(completion_tokens)
+        else:
+            _completion_averages[key] = average + COMPLETION_AVERAGE_WEIGHT * (completion_tokens - average)
+
+
+def is_provider_failure(error: Exception) -> bool:
+    """
+    Check whether an error reflects provider health rather than a bad request
+
+    Timeouts, connection errors, rate limits and 5xx responses count against
+    the provider; other 4xx responses (bad request, auth) do not
+    """
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        return True
+    return status_code in (408, 409, 429) or status_code >= 500
@@ -0,0 +1,159 @@
+"""
+AI Metrics service for tracking provider call outcomes
+Keeps in-memory counters and latency samples per worker process
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+
+class AIMetrics:
+    """Thread-safe in-memory metrics registry grouped by section and key"""
+
+    def __init__(self, max_samples: int = 500):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._samples = {}
+        self.max_samples = max_samples
+
+    def increment(self, section: str, key: str, field: str, amount: float = 1):
+        """
+        Increment a counter
+
+        Args:
+            section: Metrics section (e.g. 'structured_output')
+            key: Key inside the section (e.g. 'openai/gpt-4o')
+            field: Counter name
+            amount: Value to add
+        """
+        with self._lock:
+            counters = self._counters.setdefault(section, {}).setdefault(key, {})
+            counters[field] = counters.get(field, 0) + amount
+
+    def observe(self, section: str, key: str, field: str, value: float):
+        """
+        Record a sample (latency, size, ...) in a bounded rolling window
+
+        Args:
+            section: Metrics section
+            key: Key inside the section
+            field: Sample series name
+            value: Observed value
+        """
+        with self._lock:
+            series = self._samples.setdefault(section, {}).setdefault(key, {})
+            if field not in series:
+                series[field] = deque(maxlen=self.max_samples)
+            series[field].append(value)
+
+    def get_counters(self, section: str, key: str) -> Dict[str, float]:
+        """Get a copy of the counters for a section key"""
+        with self._lock:
+            return dict(self._counters.get(section, {}).get(key, {}))
+
+    def get_samples(self, section: str, key: str, field: str) -> list:
+        """Get a copy of the samples recorded for a series"""
+        with self._lock:
+            return list(self._samples.get(section, {}).get(key, {}).get(field, []))
+
+    def snapshot(self, section: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get a snapshot of all metrics
+
+        Args:
+            section: Only return this section if provided
+
+        Returns:
+            Nested dictionary of counters and sample summaries
+        """
+        with self._lock:
+            sections = set(self._counters) | set(self._samples)
+            if section is not None:
+                sections &= {section}
+
+            result = {}
+            for name in sorted(sections):
+                entries = {}
+                for key, counters in self._counters.get(name, {}).items():
+                    entries[key] = dict(counters)
+                for key, series in self._samples.get(name, {}).items():
+                    entry = entries.setdefault(key, {})
+                    for field, values in series.items():
+                        entry[field] = summarize_samples(list(values))
+                result[name] = entries
+            return result
+
+    def reset(self):
+        """Clear all recorded metrics"""
+        with self._lock:
+            self._counters = {}
+            self._samples = {}
+
+    def record_parse_outcome(self, provider: str, model: str, mode: str, success: bool):
+        """
+        Record whether an AI analysis response could be parsed as JSON
+
+        Args:
+            provider: AI provider name
+            model: Model name
+            mode: Output mode used ('json_schema', 'json_object' or 'prompt')
+            success: True if the response was parsed successfully
+        """
+        key = f"{provider}/{model}"
+        self.increment('structured_output', key, 'calls')
+        self.increment('structured_output', key, f'{mode}_calls')
+        if not success:
+            self.increment('structured_output', key, 'parse_failures')
+            self.increment('structured_output', key, f'{mode}_parse_failures')
+
+    def get_parse_failure_stats(self) -> Dict[str, Any]:
+        """Get parse failure counts and rates per provider/model"""
+        stats = {}
+        for key, counters in self.snapshot('structured_output').get('structured_output', {}).items():
+            calls = counters.get('calls', 0)
+            failures = counters.get('parse_failures', 0)
+            stats[key] = {
+                **counters,
+                'parse_failures': failures,
+                'parse_failure_rate': round(failures / calls, 4) if calls else 0.0
+            }
+        return stats
+
+
+def percentile(values: list, pct: float) -> float:
+    """Return the pct (0-100) percentile of values using nearest-rank"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize_samples(values: list) -> Dict[str, float]:
+    """Summarize samples as count/avg/p50/p95/p99/max"""
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'avg': round(sum(values) / len(values), 4),
+        'p50': round(percentile(values, 50), 4),
+        'p95': round(percentile(values, 95), 4),
+        'p99': round(percentile(values, 99), 4),
+        'max': round(max(values), 4)
+    }
+
+
+# Global metrics instance
+_ai_metrics = None
+_ai_metrics_lock = threading.Lock()
+
+def get_ai_metrics() -> AIMetrics:
+    """Get or create the global AI metrics instance"""
+    global _ai_metrics
+    if _ai_metrics is None:
+        with _ai_metrics_lock:
+            if _ai_metrics is None:
+                _ai_metrics = AIMetrics()
+    return _ai_metrics
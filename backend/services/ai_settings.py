@@ -4,18 +4,46 @@ Handles secure storage and retrieval of API keys and settings
 """
 
 import os
+import copy
 import json
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
+from utils.env_manager import getenv
+from services.model_routing import (
+    PIPELINE_STAGES, EMAIL_GENERATION, CLASSIFY, CONNECTION_TEST, STAGE_DEFAULTS,
+    resolve_stage_route, validate_stage_routes
+)
+
+# Next to app.py, wherever the server is started from
+DEFAULT_SETTINGS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ai_settings.json')
+# Older versions resolved this relative to the working directory, so starting
+# the server from inside backend/ stored settings in backend/backend/
+LEGACY_SETTINGS_FILE = os.path.join('backend', 'ai_settings.json')
+
 
 class AISettingsService:
     """Service for managing AI provider settings"""
     
     def __init__(self):
-        self.settings_file = os.path.join('backend', 'ai_settings.json')
+        self.settings_file = getenv('AI_SETTINGS_FILE') or self._default_settings_file()
+        self._cache_lock = threading.Lock()
+        # Serializes load-modify-save updates between request threads
+        self._write_lock = threading.RLock()
+        self._cached_settings = None
+        self._cached_stat = None
         self.ensure_settings_file()
     
+    @staticmethod
+    def _default_settings_file() -> str:
+        """Get the settings file next to app.py, or one an older version left relative to the working directory"""
+        legacy_file = os.path.abspath(LEGACY_SETTINGS_FILE)
+        if not os.path.exists(DEFAULT_SETTINGS_FILE) and legacy_file != DEFAULT_SETTINGS_FILE and os.path.exists(legacy_file):
+            print(f"⚠️ Using AI settings from {legacy_file}; move it to {DEFAULT_SETTINGS_FILE}")
+            return legacy_file
+        return DEFAULT_SETTINGS_FILE
+    
     def ensure_settings_file(self):
         """Ensure the settings file and directory exist"""
         try:
@@ -73,24 +101,47 @@ class AISettingsService:
             
             settings['last_updated'] = datetime.now().isoformat()
             
-            with open(self.settings_file, 'w') as f:
-                json.dump(settings, f, indent=2)
+            # Write a temporary file and rename it over the settings file, so
+            # concurrent readers never see a partly written file
+            tmp_path = f"{self.settings_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with self._write_lock:
+                with open(tmp_path, 'w') as f:
+                    json.dump(settings, f, indent=2)
+                os.replace(tmp_path, self.settings_file)
+            with self._cache_lock:
+                self._cached_settings = None
             return True
         except Exception as e:
             print(f"Error saving AI settings: {str(e)}")
             return False
     
     def load_settings(self) -> Dict[str, Any]:
-        """Load AI settings from file"""
+        """
+        Load AI settings from file
+        
+        The parsed file is cached until its mtime or size changes (so edits by
+        other workers are picked up); callers get their own copy
+        """
         try:
             if not os.path.exists(self.settings_file):
                 return {}
+            
+            stat = os.stat(self.settings_file)
+            file_stat = (stat.st_mtime_ns, stat.st_size)
+            with self._cache_lock:
+                if self._cached_settings is not None and self._cached_stat == file_stat:
+                    return copy.deepcopy(self._cached_settings)
                 
             with open(self.settings_file, 'r') as f:
                 content = f.read().strip()
                 if not content:
                     return {}
-                return json.loads(content)
+                settings = json.loads(content)
+            
+            with self._cache_lock:
+                self._cached_settings = settings
+                self._cached_stat = file_stat
+            return copy.deepcopy(settings)
                 
         except json.JSONDecodeError as e:
             print(f"Error parsing AI settings JSON: {str(e)}")
@@ -113,56 +164,57 @@ class AISettingsService:
         Returns:
             Dictionary with success status and error message if any
         """
-        try:
-            # Import crypto functions here to avoid circular imports
-            from utils.crypto import encrypt_api_key, validate_api_key_format
-            
-            # Validate API key format
-            if not validate_api_key_format(provider, api_key):
+        with self._write_lock:
+            try:
+                # Import crypto functions here to avoid circular imports
+                from utils.crypto import encrypt_api_key, validate_api_key_format
+                
+                # Validate API key format
+                if not validate_api_key_format(provider, api_key):
+                    return {
+                        'success': False,
+                        'error': f'Invalid API key format for {provider}'
+                    }
+                
+                # Load existing settings
+                settings = self.load_settings()
+                
+                # Encrypt the API key
+                encrypted_key = encrypt_api_key(api_key)
+                
+                # Store provider settings
+                provider_settings = {
+                    'encrypted_api_key': encrypted_key,
+                    'last_updated': datetime.now().isoformat()
+                }
+                
+                # Add additional settings if provided
+                if additional_settings:
+                    provider_settings.update(additional_settings)
+                
+                # Update settings
+                settings[provider] = provider_settings
+                settings['active_provider'] = provider
+                
+                # Save to file
+                if self.save_settings(settings):
+                    return {'success': True}
+                else:
+                    return {
+                        'success': False,
+                        'error': 'Failed to save settings to file'
+                    }
+                    
+            except ImportError as e:
                 return {
                     'success': False,
-                    'error': f'Invalid API key format for {provider}'
+                    'error': f'Error importing crypto module: {str(e)}'
                 }
-            
-            # Load existing settings
-            settings = self.load_settings()
-            
-            # Encrypt the API key
-            encrypted_key = encrypt_api_key(api_key)
-            
-            # Store provider settings
-            provider_settings = {
-                'encrypted_api_key': encrypted_key,
-                'last_updated': datetime.now().isoformat()
-            }
-            
-            # Add additional settings if provided
-            if additional_settings:
-                provider_settings.update(additional_settings)
-            
-            # Update settings
-            settings[provider] = provider_settings
-            settings['active_provider'] = provider
-            
-            # Save to file
-            if self.save_settings(settings):
-                return {'success': True}
-            else:
+            except Exception as e:
                 return {
                     'success': False,
-                    'error': 'Failed to save settings to file'
+                    'error': f'Error storing API key: {str(e)}'
                 }
-                
-        except ImportError as e:
-            return {
-                'success': False,
-                'error': f'Error importing crypto module: {str(e)}'
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'error': f'Error storing API key: {str(e)}'
-            }
     
     def get_api_key(self, provider: str) -> Optional[str]:
         """
@@ -245,29 +297,190 @@ class AISettingsService:
             if not active_provider:
                 return {}
             
-            provider_settings = settings.get(active_provider, {})
-            if not provider_settings:
-                return {}
-                
-            api_key = self.get_api_key(active_provider)
-            if not api_key:
+            return self._build_provider_config(settings, active_provider)
+            
+        except Exception as e:
+            print(f"Error getting active provider config: {str(e)}")
+            return {}
+    
+    def get_stage_config(self, stage: str) -> Dict[str, Any]:
+        """
+        Get the provider configuration routed to a pipeline stage
+        
+        The stage's stored route picks the provider (default: the active one),
+        model and max_tokens; unset fields fall back to the stage defaults and
+        then to the provider's own settings
+        
+        Args:
+            stage: Pipeline stage name
+            
+        Returns:
+            Provider configuration for the stage, or {} if none is configured
+        """
+        try:
+            settings = self.load_settings()
+            if not settings:
                 return {}
             
-            config = {
-                'provider': active_provider,
-                'api_key': api_key
+            route = settings.get('stage_routes', {}).get(stage, {})
+            active_provider = settings.get('active_provider')
+            provider = route.get('provider') or active_provider
+            config = self._build_provider_config(settings, provider) if provider else {}
+            if not config and provider != active_provider and active_provider:
+                # Routed provider has no stored key; use the active provider with stage defaults
+                config = self._build_provider_config(settings, active_provider)
+                route = {}
+            
+            return resolve_stage_route(stage, config, route)
+            
+        except Exception as e:
+            print(f"Error getting {stage} stage config: {str(e)}")
+            return {}
+    
+    def get_analysis_config(self) -> Dict[str, Any]:
+        """
+        Get the configuration for full job analysis
+        
+        Returns the email generation route; when the classify route uses a
+        different model, it is attached as 'classify_route' so the agent
+        classifies first and only generates emails for relevant jobs
+        """
+        config = self.get_stage_config(EMAIL_GENERATION)
+        if not config:
+            return {}
+        
+        classify_config = self.get_stage_config(CLASSIFY)
+        if classify_config and (classify_config.get('provider'), classify_config.get('model')) != (config.get('provider'), config.get('model')):
+            config['classify_route'] = classify_config
+        return config
+    
+    def get_stage_routes(self) -> Dict[str, Any]:
+        """
+        Get the effective provider/model/max_tokens for every pipeline stage
+        
+        Returns:
+            Dictionary keyed by stage with the stored route and what it resolves to
+        """
+        settings = self.load_settings()
+        stored_routes = settings.get('stage_routes', {})
+        routes = {}
+        for stage in PIPELINE_STAGES:
+            config = self.get_stage_config(stage)
+            routes[stage] = {
+                'route': stored_routes.get(stage, {}),
+                'provider': config.get('provider'),
+                'model': config.get('model'),
+                'max_tokens': config.get('max_tokens'),
+                'default_max_tokens': STAGE_DEFAULTS[stage]['max_tokens']
             }
+        return routes
+    
+    def save_stage_routes(self, routes: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Store routing rules for pipeline stages
+        
+        Args:
+            routes: Dictionary keyed by stage with provider/model/max_tokens;
+                an empty route resets the stage to its defaults
             
-            # Add other settings
-            for key, value in provider_settings.items():
-                if key not in ['encrypted_api_key', 'last_updated']:
-                    config[key] = value
+        Returns:
+            Dictionary with success status
+        """
+        with self._write_lock:
+            try:
+                error = validate_stage_routes(routes)
+                if error:
+                    return {'success': False, 'error': error}
+                
+                settings = self.load_settings()
+                stage_routes = settings.get('stage_routes', {})
+                for stage, route in routes.items():
+                    route = {key: value for key, value in route.items() if value not in (None, '')}
+                    if route:
+                        stage_routes[stage] = route
+                    else:
+                        stage_routes.pop(stage, None)
+                settings['stage_routes'] = stage_routes
+                
+                if self.save_settings(settings):
+                    return {'success': True, 'message': 'Stage routes saved successfully'}
+                return {'success': False, 'error': 'Failed to save stage routes'}
+                
+            except Exception as e:
+                return {
+                    'success': False,
+                    'error': f'Error saving stage routes: {str(e)}'
+                }
+    
+    def get_provider_configs(self, stage: str = None) -> List[Dict[str, Any]]:
+        """
+        Get configurations for every stored provider
+        
+        Args:
+            stage: Pipeline stage whose model/max_tokens routing to apply
             
-            return config
+        Returns:
+            List of provider configurations including decrypted API keys
+        """
+        try:
+            settings = self.load_settings()
+            route = settings.get('stage_routes', {}).get(stage, {}) if stage else {}
+            configs = []
+            for provider, provider_settings in settings.items():
+                if not isinstance(provider_settings, dict) or 'encrypted_api_key' not in provider_settings:
+                    continue
+                config = self._build_provider_config(settings, provider)
+                if config and stage:
+                    # A routed model only applies to the provider it was routed to
+                    provider_route = route if (route.get('provider') or settings.get('active_provider')) == provider else {}
+                    config = resolve_stage_route(stage, config, provider_route)
+                if config:
+                    configs.append(config)
+            return configs
             
         except Exception as e:
-            print(f"Error getting active provider config: {str(e)}")
+            print(f"Error getting provider configs: {str(e)}")
+            return []
+    
+    def get_failover_provider_configs(self, exclude: str = None, stage: str = None) -> List[Dict[str, Any]]:
+        """
+        Get configurations for the other stored providers, healthiest first
+        
+        Providers whose circuit is currently open are left out
+        
+        Args:
+            exclude: Provider to leave out (usually the one that just failed)
+            stage: Pipeline stage whose model/max_tokens routing to apply
+            
+        Returns:
+            List of provider configurations including decrypted API keys
+        """
+        from services.circuit_breaker import rank_provider_configs
+        
+        configs = [config for config in self.get_provider_configs(stage) if config.get('provider') != exclude]
+        return rank_provider_configs(configs)
+    
+    def _build_provider_config(self, settings: Dict[str, Any], provider: str) -> Dict[str, Any]:
+        """Build a provider configuration with its decrypted API key"""
+        provider_settings = settings.get(provider, {})
+        if not provider_settings:
             return {}
+            
+        api_key = self.get_api_key(provider)
+        if not api_key:
+            return {}
+        
+        config = {
+            'provider': provider,
+            'api_key': api_key
+        }
+        
+        # Add other settings
+        for key, value in provider_settings.items():
+            if key not in ['encrypted_api_key', 'last_updated']:
+                config[key] = value
+        
+        return config
     
     def clear_provider_settings(self, provider: str = None) -> Dict[str, Any]:
         """
@@ -279,36 +492,37 @@ class AISettingsService:
         Returns:
             Dictionary with success status
         """
-        try:
-            settings = self.load_settings()
-            
-            if provider:
-                # Clear specific provider
-                if provider in settings:
-                    del settings[provider]
+        with self._write_lock:
+            try:
+                settings = self.load_settings()
+                
+                if provider:
+                    # Clear specific provider
+                    if provider in settings:
+                        del settings[provider]
+                        
+                    # If this was the active provider, clear that too
+                    if settings.get('active_provider') == provider:
+                        settings.pop('active_provider', None)
+                else:
+                    # Clear all settings
+                    settings = {}
+                
+                if self.save_settings(settings):
+                    return {'success': True}
+                else:
+                    return {
+                        'success': False,
+                        'error': 'Failed to save settings'
+                    }
                     
-                # If this was the active provider, clear that too
-                if settings.get('active_provider') == provider:
-                    settings.pop('active_provider', None)
-            else:
-                # Clear all settings
-                settings = {}
-            
-            if self.save_settings(settings):
-                return {'success': True}
-            else:
+            except Exception as e:
                 return {
                     'success': False,
-                    'error': 'Failed to save settings'
+                    'error': f'Error clearing settings: {str(e)}'
                 }
-                
-        except Exception as e:
-            return {
-                'success': False,
-                'error': f'Error clearing settings: {str(e)}'
-            }
     
-    def test_provider_connection(self, provider: str, api_key: str, model: str = None) -> Dict[str, Any]:
+    def test_provider_connection(self, provider: str, api_key: str, model: str = None, use_cache: bool = True) -> Dict[str, Any]:
         """
         Test connection to AI provider
         
@@ -316,6 +530,7 @@ class AISettingsService:
             provider: Provider name
             api_key: API key to test
             model: Model to test (optional)
+            use_cache: Use a recent background probe result when available
             
         Returns:
             Dictionary with test results
@@ -323,11 +538,18 @@ class AISettingsService:
         try:
             from services.ai_agent import JobAnalysisAgent
             
+            # Without an explicit model, test with the connection_test route's fast model
+            stored_route = self.load_settings().get('stage_routes', {}).get(CONNECTION_TEST, {})
+            if stored_route.get('provider') not in (None, provider):
+                stored_route = {}
+            route = resolve_stage_route(CONNECTION_TEST, {'provider': provider}, stored_route)
+            
             # Create agent with test credentials
-            agent = JobAnalysisAgent(provider=provider, api_key=api_key, model=model)
+            agent = JobAnalysisAgent(provider=provider, api_key=api_key, model=model or route.get('model'),
+                                     max_tokens=route.get('max_tokens'), stage=CONNECTION_TEST)
             
             # Test connection
-            result = agent.test_connection()
+            result = agent.test_connection(use_cache=use_cache)
             return result
             
         except ImportError as e:
@@ -354,7 +576,7 @@ class AISettingsService:
             debug_info = {
                 'settings_file_exists': os.path.exists(self.settings_file),
                 'settings_file_path': self.settings_file,
-                'total_providers': len([k for k in settings.keys() if k not in ['active_provider', 'last_updated']]),
+                'total_providers': len([k for k in settings.keys() if k not in ['active_provider', 'last_updated', 'stage_routes']]),
                 'active_provider': settings.get('active_provider'),
                 'providers': []
             }
@@ -388,10 +610,13 @@ class AISettingsService:
 
 # Global service instance
 _ai_settings_service = None
+_ai_settings_service_lock = threading.Lock()
 
 def get_ai_settings_service() -> AISettingsService:
     """Get or create the global AI settings service instance"""
     global _ai_settings_service
     if _ai_settings_service is None:
-        _ai_settings_service = AISettingsService()
+        with _ai_settings_service_lock:
+            if _ai_settings_service is None:
+                _ai_settings_service = AISettingsService()
     return _ai_settings_service
@@ -0,0 +1,157 @@
+"""
+Batch job analysis
+Runs analyze_job_post over many jobs with bounded concurrency, isolating
+failures to the job that caused them
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Iterator, List
+
+from utils.env_manager import getenv_int, getenv_float
+from utils.deadline import deadline_scope, remaining_time, get_request_timeout
+from services.ai_agent import analyze_job_post
+from services.ai_metrics import get_ai_metrics
+
+
+def run_batch_analysis(jobs: List[Dict[str, Any]], user_profile: Dict[str, Any], ai_settings: Dict[str, Any],
+                       max_concurrency: int = None) -> Iterator[Dict[str, Any]]:
+    """
+    Analyze jobs concurrently, yielding each job's outcome as it finishes
+
+    Settings are resolved once by the caller and shared by every job. At most
+    max_concurrency analyses from this batch run at once; each one carries the
+    caller's context (request deadline, priority class) and gets its own
+    deadline window of ANALYZE_BATCH_JOB_TIMEOUT seconds from when it starts,
+    within the request deadline.
+
+    Args:
+        jobs: Job data dictionaries
+        user_profile: Profile shared by all jobs
+        ai_settings: Resolved analysis configuration
+        max_concurrency: Analyses in flight at once for this batch
+
+    Yields:
+        Dictionaries with the job's index and either its result or an error;
+        results from the rule-based fallback are flagged with 'fallback'
+    """
+    limit = max(1, min(max_concurrency or getenv_int('ANALYZE_BATCH_CONCURRENCY', 4), len(jobs) or 1))
+    executor = get_batch_executor()
+    metrics = get_ai_metrics()
+
+    pending = {}
+    next_index = 0
+    while next_index < len(jobs) or pending:
+        while next_index < len(jobs) and len(pending) < limit:
+            context = contextvars.copy_context()
+            future = executor.submit(context.run, _analyze_one, jobs[next_index], user_profile, ai_settings)
+            pending[future] = next_index
+            next_index += 1
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            outcome = future.result()
+            outcome['index'] = index
+            metrics.increment('batch_analysis', 'jobs', _outcome_kind(outcome))
+            yield outcome
+
+
+def get_batch_job_limit(max_concurrency: int = None) -> int:
+    """
+    Get the most jobs one batch request can analyze before its deadline
+
+    Every job gets a full ANALYZE_BATCH_JOB_TIMEOUT window, so a batch fits in
+    the request deadline only as many waves of max_concurrency jobs as there
+    are windows in it; ANALYZE_BATCH_MAX_JOBS caps it regardless.
+
+    Args:
+        max_concurrency: Analyses in flight at once for the batch
+
+    Returns:
+        Maximum number of jobs
+    """
+    concurrency = max(1, max_concurrency or getenv_int('ANALYZE_BATCH_CONCURRENCY', 4))
+    budget = remaining_time()
+    if budget is None:
+        budget = get_request_timeout()
+    waves = max(1, int(budget // get_job_timeout()))
+    return min(getenv_int('ANALYZE_BATCH_MAX_JOBS', 50), waves * concurrency)
+
+
+def get_job_timeout() -> float:
+    """Get the deadline window each job in a batch gets"""
+    return getenv_float('ANALYZE_BATCH_JOB_TIMEOUT', 8.0)
+
+
+def analyze_jobs_ordered(jobs: List[Dict[str, Any]], user_profile: Dict[str, Any], ai_settings: Dict[str, Any],
+                         max_concurrency: int = None) -> Dict[str, Any]:
+    """
+    Analyze jobs concurrently and return their outcomes in input order
+
+    Returns:
+        Dictionary with per-job results and batch counts
+    """
+    start_time = time.monotonic()
+    results = [None] * len(jobs)
+    for outcome in run_batch_analysis(jobs, user_profile, ai_settings, max_concurrency):
+        results[outcome['index']] = outcome
+
+    summary = summarize_batch(results, time.monotonic() - start_time)
+    summary['results'] = results
+    return summary
+
+
+def summarize_batch(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """Count AI analyses, rule-based fallbacks and failures for a finished batch"""
+    kinds = [_outcome_kind(outcome) if outcome else 'failed' for outcome in results]
+    return {
+        'success': True,
+        'count': len(results),
+        'succeeded': kinds.count('succeeded'),
+        'fallback': kinds.count('fallback'),
+        'failed': kinds.count('failed'),
+        'elapsed': round(elapsed, 3)
+    }
+
+
+def _outcome_kind(outcome: Dict[str, Any]) -> str:
+    if not outcome['success']:
+        return 'failed'
+    return 'fallback' if outcome.get('fallback') else 'succeeded'
+
+
+def _analyze_one(job_data: Dict[str, Any], user_profile: Dict[str, Any], ai_settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Analyze one job in its own deadline window, turning any exception into an error outcome"""
+    try:
+        if not isinstance(job_data, dict) or not job_data:
+            return {'success': False, 'error': 'Job data is required'}
+        with deadline_scope(get_job_timeout()):
+            result = analyze_job_post(job_data, user_profile, ai_settings)
+        if result.get('status') == 'ERROR':
+            return {'success': False, 'error': result.get('reason')}
+        outcome = {'success': True, 'result': result}
+        if result.get('fallback'):
+            outcome['fallback'] = True
+        return outcome
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
+
+# Global batch executor shared by all batch requests in this worker
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+def get_batch_executor() -> ThreadPoolExecutor:
+    """Get or create the thread pool used for batch analysis"""
+    global _batch_executor
+    if _batch_executor is None:
+        with _batch_executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(
+                    max_workers=getenv_int('ANALYZE_BATCH_MAX_WORKERS', 8),
+                    thread_name_prefix='analyze-batch'
+                )
+    return _batch_executor
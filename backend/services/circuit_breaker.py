@@ -0,0 +1,232 @@
+"""
+Circuit breakers for AI providers
+Tracks rolling error rate and latency per provider so degraded providers
+fail fast instead of making every request wait for an error
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+from utils.env_manager import getenv_int, getenv_float
+
+
+class CircuitOpenError(Exception):
+    """Raised when a provider call is rejected because its circuit is open"""
+
+    def __init__(self, provider: str, retry_after: float = 0.0):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(f"Circuit open for {provider}, retry in {retry_after:.1f}s")
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker with a rolling time window
+
+    closed: calls pass through and outcomes are recorded
+    open: calls are rejected until open_seconds have passed
+    half_open: a limited number of probe calls decide whether to close again
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, window_seconds: float = None, min_calls: int = None,
+                 error_rate_threshold: float = None, slow_call_seconds: float = None,
+                 slow_rate_threshold: float = None, open_seconds: float = None,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.window_seconds = window_seconds or getenv_float('CIRCUIT_WINDOW_SECONDS', 60.0)
+        self.min_calls = min_calls or getenv_int('CIRCUIT_MIN_CALLS', 5)
+        self.error_rate_threshold = error_rate_threshold or getenv_float('CIRCUIT_ERROR_THRESHOLD', 0.5)
+        self.slow_call_seconds = slow_call_seconds or getenv_float('CIRCUIT_SLOW_CALL_SECONDS', 10.0)
+        self.slow_rate_threshold = slow_rate_threshold or getenv_float('CIRCUIT_SLOW_THRESHOLD', 0.8)
+        self.open_seconds = open_seconds or getenv_float('CIRCUIT_OPEN_SECONDS', 30.0)
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._calls = deque()  # (timestamp, success, latency)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._times_opened = 0
+        self._rejected = 0
+
+    def allow_request(self) -> bool:
+        """
+        Check whether a call may be made now
+
+        Returns:
+            True if the call may proceed; callers must then record its outcome
+        """
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self._rejected += 1
+                    return False
+                self._state = self.HALF_OPEN
+                self._half_open_in_flight = 0
+
+            if self._state == self.HALF_OPEN:
+                if self._half_open_in_flight >= self.half_open_max_calls:
+                    self._rejected += 1
+                    return False
+                self._half_open_in_flight += 1
+
+            return True
+
+    def retry_after(self) -> float:
+        """Seconds until an open circuit allows a probe"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def record_success(self, latency: float = 0.0):
+        """Record a successful call"""
+        self._record(True, latency)
+
+    def record_failure(self, latency: float = 0.0):
+        """Record a failed call"""
+        self._record(False, latency)
+
+    def release(self):
+        """Release a permit without recording an outcome (e.g. the call was never made)"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_in_flight > 0:
+                self._half_open_in_flight -= 1
+
+    def _record(self, success: bool, latency: float):
+        now = time.monotonic()
+        slow = latency >= self.slow_call_seconds
+        with self._lock:
+            self._calls.append((now, success, latency))
+            self._prune(now)
+
+            if self._state == self.HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                if success and not slow:
+                    self._state = self.CLOSED
+                    self._calls.clear()
+                else:
+                    self._trip(now)
+                return
+
+            if self._state == self.CLOSED and len(self._calls) >= self.min_calls:
+                error_rate, slow_rate = self._rates()
+                if error_rate >= self.error_rate_threshold or slow_rate >= self.slow_rate_threshold:
+                    self._trip(now)
+
+    def _trip(self, now: float):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._half_open_in_flight = 0
+        self._times_opened += 1
+        print(f"🔌 Circuit opened for {self.name} for {self.open_seconds:.0f}s")
+
+    def _prune(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def _rates(self):
+        total = len(self._calls)
+        if not total:
+            return 0.0, 0.0
+        failures = sum(1 for _, success, _ in self._calls if not success)
+        slow = sum(1 for _, _, latency in self._calls if latency >= self.slow_call_seconds)
+        return failures / total, slow / total
+
+    def get_state(self) -> str:
+        """Get the current state, moving open circuits to half_open when due"""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return self.HALF_OPEN
+            return self._state
+
+    def health_score(self) -> float:
+        """
+        Score provider health between 0 (unusable) and 1 (healthy)
+
+        Combines the rolling success rate with a penalty for average latency
+        relative to the slow-call threshold
+        """
+        state = self.get_state()
+        if state == self.OPEN:
+            return 0.0
+        with self._lock:
+            self._prune(time.monotonic())
+            if not self._calls:
+                return 0.5 if state == self.HALF_OPEN else 1.0
+            error_rate, _ = self._rates()
+            avg_latency = sum(latency for _, _, latency in self._calls) / len(self._calls)
+        latency_penalty = min(1.0, avg_latency / self.slow_call_seconds) * 0.5
+        score = (1.0 - error_rate) * (1.0 - latency_penalty)
+        return round(score * (0.5 if state == self.HALF_OPEN else 1.0), 4)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get breaker state and rolling window statistics"""
+        state = self.get_state()
+        with self._lock:
+            self._prune(time.monotonic())
+            error_rate, slow_rate = self._rates()
+            latencies = [latency for _, _, latency in self._calls]
+            stats = {
+                'state': state,
+                'window_calls': len(self._calls),
+                'error_rate': round(error_rate, 4),
+                'slow_rate': round(slow_rate, 4),
+                'avg_latency': round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+                'times_opened': self._times_opened,
+                'rejected': self._rejected
+            }
+        stats['health_score'] = self.health_score()
+        return stats
+
+
+# Global breaker registry, shared by the agent and the pre-filter in this process
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """Get or create the circuit breaker for a provider"""
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(provider)
+            _circuit_breakers[provider] = breaker
+        return breaker
+
+
+def get_circuit_stats() -> Dict[str, Any]:
+    """Get stats for every provider breaker"""
+    with _circuit_breakers_lock:
+        breakers = dict(_circuit_breakers)
+    return {name: breaker.stats() for name, breaker in breakers.items()}
+
+
+def rank_provider_configs(configs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Order provider configs by circuit health, dropping providers whose circuit
+    is open or that the background prober currently can't reach
+
+    Args:
+        configs: Provider configs with a 'provider' key
+
+    Returns:
+        Healthy configs, healthiest first
+    """
+    from services.provider_prober import get_provider_prober
+    prober = get_provider_prober()
+
+    scored = []
+    for index, config in enumerate(configs):
+        breaker = get_circuit_breaker(config.get('provider'))
+        if breaker.get_state() == CircuitBreaker.OPEN:
+            continue
+        if prober.is_available(config.get('provider')) is False:
+            continue
+        scored.append((-breaker.health_score(), index, config))
+    return [config for _, _, config in sorted(scored, key=lambda item: (item[0], item[1]))]
@@ -0,0 +1,536 @@
+"""
+Outbound email queue
+Durable SQLite outbox drained by background sender threads, with
+exponential-backoff retries for transient SMTP failures
+"""
+
+import hashlib
+import json
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional
+
+from utils.env_manager import getenv, getenv_int, getenv_float
+from utils.deadline import DeadlineExceeded
+from services.email_service import get_email_service
+
+QUEUED = 'queued'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+STATUS_FIELDS = ['id', 'batch_id', 'idempotency_key', 'to_email', 'subject', 'status', 'attempts',
+                 'last_error', 'created_at', 'updated_at', 'next_attempt_at', 'sent_at']
+
+# Columns added after the first outbox schema, migrated in place
+ADDED_COLUMNS = {'batch_id': 'TEXT', 'domain': 'TEXT', 'idempotency_key': 'TEXT'}
+
+GLOBAL_PACING_KEY = '*'
+
+# Next to app.py, wherever the server is started from
+DEFAULT_OUTBOX_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'email_outbox.sqlite3')
+
+
+def derive_idempotency_key(to_email: str, subject: str, body: str) -> str:
+    """Derive a send's idempotency key from its recipient, subject and body hash"""
+    body_hash = hashlib.sha256(body.encode('utf-8')).hexdigest()
+    encoded = json.dumps([to_email.strip().lower(), subject, body_hash], ensure_ascii=False)
+    return 'derived:' + hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def resolve_idempotency_key(message: Dict[str, Any], request_key: Optional[str] = None,
+                            index: Optional[int] = None) -> str:
+    """
+    Get a send's idempotency key: the client's key if given, otherwise one
+    derived from the recipient, subject and body
+
+    Args:
+        message: Message fields (email, subject, body, optional idempotency_key)
+        request_key: The request's Idempotency-Key header, if any
+        index: Position of the message in a bulk request
+
+    Returns:
+        The request key and/or the message's idempotency_key field; in a bulk
+        request the request key is scoped by the message's key or index
+    """
+    key = message.get('idempotency_key')
+    if request_key:
+        if key:
+            return f"{request_key}:{key}"
+        return request_key if index is None else f"{request_key}:{index}"
+    if key:
+        return str(key)
+    return derive_idempotency_key(message['email'], message['subject'], message['body'])
+
+
+def get_recipient_domain(to_email: str) -> str:
+    """Get the lower-cased domain of an email address"""
+    return to_email.rsplit('@', 1)[-1].strip().lower()
+
+
+def parse_domain_intervals(spec: Optional[str]) -> Dict[str, float]:
+    """Parse 'gmail.com=5,outlook.com=3' into per-domain send intervals"""
+    intervals = {}
+    for part in (spec or '').split(','):
+        domain, _, seconds = part.partition('=')
+        if domain.strip() and seconds.strip():
+            try:
+                intervals[domain.strip().lower()] = float(seconds)
+            except ValueError:
+                print(f"Ignoring invalid email domain interval: {part}")
+    return intervals
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Check whether a send failure is worth retrying
+
+    SMTP 4xx replies, dropped connections, timeouts and socket errors are
+    transient; 5xx replies (bad recipient, rejected content, failed login) and
+    anything else are permanent.
+    """
+    if isinstance(error, FileNotFoundError):
+        # A missing attachment won't reappear by retrying
+        return False
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return bool(codes) and all(400 <= code < 500 for code in codes)
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, (DeadlineExceeded, TimeoutError, ConnectionError, OSError))
+
+
+class EmailOutbox:
+    """
+    Email queue stored in a local SQLite database
+
+    Requests enqueue a message and return at once; sender threads in each
+    worker process claim due messages inside BEGIN IMMEDIATE transactions, so
+    several gunicorn workers can drain the same outbox without sending a
+    message twice. A claim left behind by a worker that died is released
+    after claim_timeout. Sender threads start lazily in each process, like
+    the provider prober.
+
+    Sends are paced in the same transaction: at most one message per
+    domain_interval to each recipient domain (per-domain overrides in
+    domain_intervals) and at most global_rate messages per second overall,
+    across all workers.
+
+    Messages with an idempotency key are stored once: a repeat with the same
+    key within idempotency_window returns the original message instead of
+    queuing another, unless the original failed permanently. Inline sends
+    (queue disabled) reserve their key the same way before the SMTP call.
+    """
+
+    def __init__(self, db_path: str = None, senders: int = None, max_attempts: int = None,
+                 retry_base: float = None, retry_max: float = None, poll_interval: float = None,
+                 claim_timeout: float = None, domain_interval: float = None,
+                 domain_intervals: Optional[Dict[str, float]] = None, global_rate: float = None,
+                 idempotency_window: float = None):
+        self.db_path = db_path or getenv('EMAIL_OUTBOX_DB') or DEFAULT_OUTBOX_DB
+        self.senders = max(1, senders or getenv_int('EMAIL_OUTBOX_SENDERS', 2))
+        self.max_attempts = max(1, max_attempts or getenv_int('EMAIL_MAX_ATTEMPTS', 5))
+        self.retry_base = retry_base or getenv_float('EMAIL_RETRY_BASE_SECONDS', 5.0)
+        self.retry_max = retry_max or getenv_float('EMAIL_RETRY_MAX_SECONDS', 600.0)
+        self.poll_interval = poll_interval or getenv_float('EMAIL_OUTBOX_POLL_SECONDS', 1.0)
+        self.claim_timeout = claim_timeout or getenv_float('EMAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS', 300.0)
+        self.domain_interval = domain_interval if domain_interval is not None else getenv_float('EMAIL_DOMAIN_INTERVAL_SECONDS', 1.0)
+        self.domain_intervals = domain_intervals if domain_intervals is not None else parse_domain_intervals(getenv('EMAIL_DOMAIN_INTERVALS'))
+        self.global_rate = global_rate if global_rate is not None else getenv_float('EMAIL_GLOBAL_RATE', 0.0)
+        self.idempotency_window = idempotency_window or getenv_float('EMAIL_IDEMPOTENCY_WINDOW_SECONDS', 86400.0)
+
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._start_lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's database connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS outbox ('
+                        'id TEXT PRIMARY KEY, to_email TEXT NOT NULL, subject TEXT NOT NULL, '
+                        'body TEXT NOT NULL, attachment_path TEXT, status TEXT NOT NULL, '
+                        'attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, '
+                        'claimed_at REAL, last_error TEXT, created_at REAL NOT NULL, '
+                        'updated_at REAL NOT NULL, sent_at REAL, batch_id TEXT, domain TEXT, idempotency_key TEXT)'
+                    )
+                    existing = {row['name'] for row in conn.execute('PRAGMA table_info(outbox)')}
+                    for column, column_type in ADDED_COLUMNS.items():
+                        if column not in existing:
+                            conn.execute(f'ALTER TABLE outbox ADD COLUMN {column} {column_type}')
+                    conn.execute('CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)')
+                    conn.execute('CREATE INDEX IF NOT EXISTS outbox_batch ON outbox (batch_id)')
+                    conn.execute('CREATE INDEX IF NOT EXISTS outbox_idempotency ON outbox (idempotency_key, created_at)')
+                    conn.execute('CREATE TABLE IF NOT EXISTS pacing (key TEXT PRIMARY KEY, next_at REAL NOT NULL)')
+                    self._initialized = True
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, to_email: str, subject: str, body: str, attachment_path: Optional[str] = None,
+                idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Store a message for delivery and wake a sender
+
+        Returns:
+            The message's status record ('duplicate' is True if an earlier
+            message with the same idempotency key was returned instead)
+        """
+        message = {'email': to_email, 'subject': subject, 'body': body, 'resume_path': attachment_path,
+                   'idempotency_key': idempotency_key}
+        return self.enqueue_many([message])[0]
+
+    def _find_duplicate(self, conn: sqlite3.Connection, idempotency_key: Optional[str], now: float) -> Optional[Dict[str, Any]]:
+        if not idempotency_key:
+            return None
+        # An inline send (no claim) still 'sending' after claim_timeout died mid-request and no longer holds its key
+        row = conn.execute(
+            f"SELECT {', '.join(STATUS_FIELDS)} FROM outbox WHERE idempotency_key = ? AND created_at >= ? "
+            f"AND status != ? AND NOT (status = ? AND claimed_at IS NULL AND updated_at < ?) "
+            f"ORDER BY created_at DESC LIMIT 1",
+            (idempotency_key, now - self.idempotency_window, FAILED, SENDING, now - self.claim_timeout)
+        ).fetchone()
+        return dict(row, duplicate=True) if row else None
+
+    def _insert_message(self, conn: sqlite3.Connection, message: Dict[str, Any], status: str, now: float,
+                        batch_id: Optional[str] = None) -> Dict[str, Any]:
+        """Insert a message row (caller holds the write transaction) and return its status record"""
+        message_id = uuid.uuid4().hex
+        key = message.get('idempotency_key')
+        attempts = 1 if status == SENDING else 0
+        conn.execute(
+            'INSERT INTO outbox (id, to_email, subject, body, attachment_path, status, attempts, '
+            'next_attempt_at, created_at, updated_at, batch_id, domain, idempotency_key) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (message_id, message['email'], message['subject'], message['body'], message.get('resume_path'),
+             status, attempts, now, now, now, batch_id, get_recipient_domain(message['email']), key)
+        )
+        return {
+            'id': message_id, 'batch_id': batch_id, 'idempotency_key': key, 'to_email': message['email'],
+            'subject': message['subject'], 'status': status, 'attempts': attempts, 'last_error': None,
+            'created_at': now, 'updated_at': now, 'next_attempt_at': now, 'sent_at': None,
+            'duplicate': False
+        }
+
+    def reserve_inline(self, to_email: str, subject: str, body: str, attachment_path: Optional[str] = None,
+                       idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Reserve an idempotency key for a message sent inline (queue disabled)
+
+        The message is stored as 'sending' in the same write transaction as
+        the duplicate check, so of two concurrent identical requests only one
+        gets to send. Finish it with finish_inline() once the SMTP call returns.
+
+        Returns:
+            The reserved message's status record, or the earlier message's
+            record with 'duplicate' set (the caller must not send then)
+        """
+        message = {'email': to_email, 'subject': subject, 'body': body, 'resume_path': attachment_path,
+                   'idempotency_key': idempotency_key}
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            record = self._find_duplicate(conn, idempotency_key, now)
+            if record is None:
+                # No claimed_at: the background senders never pick up or release an inline send
+                record = self._insert_message(conn, message, SENDING, now)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return record
+
+    def finish_inline(self, message_id: str, error: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Record the outcome of an inline send reserved with reserve_inline()
+
+        A failed send frees its idempotency key, so the message can be sent again.
+
+        Returns:
+            The stored status record
+        """
+        now = time.time()
+        self._connect().execute(
+            'UPDATE outbox SET status = ?, last_error = ?, sent_at = ?, updated_at = ? WHERE id = ?',
+            (FAILED if error else SENT, error, None if error else now, now, message_id)
+        )
+        return self.get_status(message_id)
+
+    def enqueue_many(self, messages: List[Dict[str, Any]], batch_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Store several messages in one transaction and wake the senders
+
+        Args:
+            messages: Dictionaries with email, subject, body and optional
+                resume_path and idempotency_key
+            batch_id: Batch the messages belong to
+
+        Returns:
+            Status records in message order; a message whose idempotency key
+            matches an earlier live message gets that message's record with
+            'duplicate' set instead of being queued again
+        """
+        now = time.time()
+        records = []
+        conn = self._connect()
+        # The duplicate check and insert share one write transaction, so
+        # concurrent identical requests in different workers queue one message
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for message in messages:
+                duplicate = self._find_duplicate(conn, message.get('idempotency_key'), now)
+                if duplicate is not None:
+                    records.append(duplicate)
+                    continue
+                records.append(self._insert_message(conn, message, QUEUED, now, batch_id))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if any(not record['duplicate'] for record in records):
+            self.ensure_started()
+            self._wake.set()
+        return records
+
+    def get_status(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Get a message's delivery state, or None if the id is unknown"""
+        row = self._connect().execute(
+            f"SELECT {', '.join(STATUS_FIELDS)} FROM outbox WHERE id = ?", (message_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Claim the next due message for this sender, if any"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            # Release claims held by senders that died mid-delivery
+            conn.execute(
+                'UPDATE outbox SET status = ?, claimed_at = NULL, updated_at = ? '
+                'WHERE status = ? AND claimed_at < ?',
+                (QUEUED, now, SENDING, now - self.claim_timeout)
+            )
+            row = None
+            if self._pacing_next_at(conn, GLOBAL_PACING_KEY) <= now:
+                # Earliest due message whose recipient domain isn't cooling down
+                row = conn.execute(
+                    'SELECT outbox.* FROM outbox LEFT JOIN pacing ON pacing.key = outbox.domain '
+                    'WHERE outbox.status = ? AND outbox.next_attempt_at <= ? '
+                    'AND (pacing.next_at IS NULL OR pacing.next_at <= ?) '
+                    'ORDER BY outbox.next_attempt_at LIMIT 1',
+                    (QUEUED, now, now)
+                ).fetchone()
+            if row is not None:
+                conn.execute(
+                    'UPDATE outbox SET status = ?, claimed_at = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?',
+                    (SENDING, now, now, row['id'])
+                )
+                domain = row['domain'] or get_recipient_domain(row['to_email'])
+                interval = self.domain_intervals.get(domain, self.domain_interval)
+                if interval > 0:
+                    self._set_pacing(conn, domain, now + interval)
+                if self.global_rate > 0:
+                    self._set_pacing(conn, GLOBAL_PACING_KEY, max(now, self._pacing_next_at(conn, GLOBAL_PACING_KEY)) + 1.0 / self.global_rate)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        message = dict(row)
+        message['attempts'] += 1
+        return message
+
+    @staticmethod
+    def _pacing_next_at(conn: sqlite3.Connection, key: str) -> float:
+        row = conn.execute('SELECT next_at FROM pacing WHERE key = ?', (key,)).fetchone()
+        return row['next_at'] if row else 0.0
+
+    @staticmethod
+    def _set_pacing(conn: sqlite3.Connection, key: str, next_at: float):
+        conn.execute(
+            'INSERT INTO pacing (key, next_at) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET next_at = excluded.next_at',
+            (key, next_at)
+        )
+
+    def next_due_in(self) -> Optional[float]:
+        """Seconds until a queued message may become claimable, or None if nothing is queued"""
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            'SELECT MIN(MAX(outbox.next_attempt_at, COALESCE(pacing.next_at, 0))) FROM outbox '
+            'LEFT JOIN pacing ON pacing.key = outbox.domain WHERE outbox.status = ?',
+            (QUEUED,)
+        ).fetchone()
+        if row[0] is None:
+            return None
+        due_at = max(row[0], self._pacing_next_at(conn, GLOBAL_PACING_KEY))
+        return max(0.0, due_at - now)
+
+    def get_batch_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get delivery state of every message in a batch
+
+        Returns:
+            Dictionary with per-message records, counts by status and the send
+            rate so far, or None if the batch is unknown
+        """
+        rows = self._connect().execute(
+            f"SELECT {', '.join(STATUS_FIELDS)} FROM outbox WHERE batch_id = ? ORDER BY rowid", (batch_id,)
+        ).fetchall()
+        if not rows:
+            return None
+
+        messages = [dict(row) for row in rows]
+        counts = {}
+        for message in messages:
+            counts[message['status']] = counts.get(message['status'], 0) + 1
+        sent_times = [message['sent_at'] for message in messages if message['sent_at']]
+        created_at = min(message['created_at'] for message in messages)
+        elapsed = (max(sent_times) - created_at) if sent_times else time.time() - created_at
+        return {
+            'batch_id': batch_id,
+            'count': len(messages),
+            'counts': counts,
+            'complete': all(message['status'] in (SENT, FAILED) for message in messages),
+            'elapsed_seconds': round(elapsed, 3),
+            'messages_per_second': round(len(sent_times) / elapsed, 3) if sent_times and elapsed > 0 else 0.0,
+            'messages': messages
+        }
+
+    def deliver(self, message: Dict[str, Any]):
+        """Send one claimed message and record the outcome"""
+        conn = self._connect()
+        try:
+            attachment_path = message['attachment_path']
+            if attachment_path and not os.path.exists(attachment_path):
+                raise FileNotFoundError(f"Attachment not found: {attachment_path}")
+            email_service = get_email_service()
+            text = email_service.render_message(message['to_email'], message['subject'], message['body'], attachment_path)
+            email_service.deliver(message['to_email'], text)
+        except Exception as e:
+            now = time.time()
+            error = f"Failed to send email: {str(e)}"
+            if is_transient_error(e) and message['attempts'] < self.max_attempts:
+                delay = min(self.retry_max, self.retry_base * 2 ** (message['attempts'] - 1))
+                delay *= random.uniform(0.5, 1.0)
+                conn.execute(
+                    'UPDATE outbox SET status = ?, claimed_at = NULL, next_attempt_at = ?, last_error = ?, '
+                    'updated_at = ? WHERE id = ?',
+                    (QUEUED, now + delay, error, now, message['id'])
+                )
+                print(f"📨 Email {message['id'][:8]} to {message['to_email']} failed "
+                      f"(attempt {message['attempts']}), retrying in {delay:.1f}s: {str(e)}")
+            else:
+                conn.execute(
+                    'UPDATE outbox SET status = ?, claimed_at = NULL, last_error = ?, updated_at = ? WHERE id = ?',
+                    (FAILED, error, now, message['id'])
+                )
+                print(f"❌ Email {message['id'][:8]} to {message['to_email']} failed permanently: {str(e)}")
+            return
+
+        now = time.time()
+        conn.execute(
+            'UPDATE outbox SET status = ?, claimed_at = NULL, last_error = NULL, sent_at = ?, updated_at = ? WHERE id = ?',
+            (SENT, now, now, message['id'])
+        )
+
+    def ensure_started(self):
+        """Start the sender threads in this process if they aren't running"""
+        if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+                return
+            # Threads inherited across fork are not running in this process
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'email-sender-{index}', daemon=True)
+                for index in range(self.senders)
+            ]
+            for thread in self._threads:
+                thread.start()
+            print(f"📮 Email outbox senders started ({self.senders} threads, pid {self._pid})")
+
+    def stop(self):
+        """Stop the sender threads"""
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        stop = self._stop
+        while not stop.is_set():
+            self._wake.clear()
+            try:
+                message = self.claim_next()
+            except Exception as e:
+                print(f"Email outbox claim failed: {str(e)}")
+                message = None
+            if message is None:
+                try:
+                    due_in = self.next_due_in()
+                except Exception:
+                    due_in = None
+                wait = self.poll_interval if due_in is None else min(self.poll_interval, max(0.01, due_in))
+                self._wake.wait(wait)
+                continue
+            try:
+                self.deliver(message)
+            except Exception as e:
+                print(f"Email outbox delivery bookkeeping failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Count messages by status and report the oldest due message"""
+        conn = self._connect()
+        counts = {status: count for status, count in conn.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status')}
+        oldest = conn.execute(
+            'SELECT MIN(next_attempt_at) FROM outbox WHERE status = ?', (QUEUED,)
+        ).fetchone()[0]
+        return {
+            'db_path': self.db_path,
+            'counts': counts,
+            'oldest_queued_age_seconds': round(max(0.0, time.time() - oldest), 3) if oldest else None,
+            'senders': self.senders,
+            'running': self._pid == os.getpid() and any(thread.is_alive() for thread in self._threads)
+        }
+
+
+# Global outbox instance
+_email_outbox = None
+_email_outbox_lock = threading.Lock()
+
+def get_email_outbox() -> EmailOutbox:
+    """Get or create the global email outbox"""
+    global _email_outbox
+    if _email_outbox is None:
+        with _email_outbox_lock:
+            if _email_outbox is None:
+                _email_outbox = EmailOutbox()
+    return _email_outbox
@@ -0,0 +1,458 @@
+"""
+Email service
+Sends application emails over a pool of authenticated, kept-alive SMTP
+connections
+"""
+
+import asyncio
+import os
+import smtplib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.mime.base import MIMEBase
+from email import encoders
+from typing import Dict, Any, Optional
+
+from utils.env_manager import getenv, getenv_int, getenv_bool, getenv_float
+from utils.deadline import get_call_timeout, DeadlineExceeded
+
+try:
+    import aiosmtplib
+    AIOSMTPLIB_AVAILABLE = True
+except ImportError:
+    AIOSMTPLIB_AVAILABLE = False
+
+CREDENTIALS_ERROR = 'Email credentials not configured. Please set EMAIL_ADDRESS and EMAIL_PASSWORD in .env file'
+
+
+class SMTPConnectionPool:
+    """
+    Bounded pool of logged-in SMTP connections
+
+    Connections are checked out for one send and returned afterwards.
+    Connections idle longer than idle_timeout are closed; ones idle longer than
+    check_after get a NOOP before reuse and are replaced if it fails. A pool
+    inherited across fork (gunicorn preload) is discarded, since its sockets
+    belong to the parent.
+    """
+
+    def __init__(self, host: str, port: int, username: Optional[str], password: Optional[str],
+                 use_tls: bool = True, max_size: int = None, idle_timeout: float = None,
+                 check_after: float = None, timeout: float = None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_size = max(1, max_size or getenv_int('SMTP_POOL_SIZE', 4))
+        self.idle_timeout = idle_timeout or getenv_float('SMTP_POOL_IDLE_SECONDS', 60.0)
+        self.check_after = check_after if check_after is not None else getenv_float('SMTP_POOL_CHECK_AFTER_SECONDS', 5.0)
+        self.timeout = timeout or getenv_float('SMTP_TIMEOUT_SECONDS', 30.0)
+
+        self._condition = threading.Condition()
+        self._idle = []  # (connection, last used) pairs, most recent last
+        self._in_use = 0
+        self._pid = os.getpid()
+        self._stats = {'created': 0, 'reused': 0, 'health_checks': 0, 'reconnects': 0,
+                       'expired': 0, 'discarded': 0, 'waits': 0}
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                connection.starttls()
+            if self.username and self.password:
+                connection.login(self.username, self.password)
+        except Exception:
+            self._close_quietly(connection)
+            raise
+        return connection
+
+    @staticmethod
+    def _close_quietly(connection: smtplib.SMTP):
+        try:
+            connection.quit()
+        except Exception:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_alive(connection: smtplib.SMTP) -> bool:
+        try:
+            return connection.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _check_fork(self):
+        # Called with the condition held
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle = []
+            self._in_use = 0
+
+    def acquire(self) -> smtplib.SMTP:
+        """
+        Check out a live connection, opening one if the pool has room
+
+        Raises:
+            DeadlineExceeded: If no connection frees up before the request deadline
+        """
+        wait_timeout = get_call_timeout(self.timeout)
+        wait_until = time.monotonic() + wait_timeout
+        while True:
+            candidate = None
+            with self._condition:
+                self._check_fork()
+                now = time.monotonic()
+                expired = []
+                while self._idle and now - self._idle[0][1] > self.idle_timeout:
+                    expired.append(self._idle.pop(0)[0])
+                self._stats['expired'] += len(expired)
+
+                if self._idle:
+                    candidate, last_used = self._idle.pop()
+                    self._in_use += 1
+                elif self._in_use < self.max_size:
+                    self._in_use += 1
+                else:
+                    remaining = wait_until - now
+                    if remaining <= 0:
+                        raise DeadlineExceeded('Timed out waiting for an SMTP connection')
+                    self._stats['waits'] += 1
+                    self._condition.wait(remaining)
+                    continue
+
+            for connection in expired:
+                self._close_quietly(connection)
+
+            if candidate is not None:
+                if time.monotonic() - last_used < self.check_after:
+                    self._count('reused')
+                    return candidate
+                self._count('health_checks')
+                if self._is_alive(candidate):
+                    self._count('reused')
+                    return candidate
+                self._count('reconnects')
+                self._close_quietly(candidate)
+
+            try:
+                connection = self._connect()
+            except Exception:
+                self._release_slot()
+                raise
+            self._count('created')
+            return connection
+
+    def release(self, connection: smtplib.SMTP, discard: bool = False):
+        """Return a connection to the pool, or close it if it is broken"""
+        with self._condition:
+            if self._pid != os.getpid():
+                # Checked out before a fork: the session belongs to the parent,
+                # so drop the socket without sending QUIT
+                connection.close()
+                return
+            self._in_use = max(0, self._in_use - 1)
+            if not discard:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+        if discard:
+            self._count('discarded')
+            self._close_quietly(connection)
+
+    def _release_slot(self):
+        with self._condition:
+            self._in_use = max(0, self._in_use - 1)
+            self._condition.notify()
+
+    def _count(self, field: str):
+        with self._condition:
+            self._stats[field] += 1
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of a with block"""
+        connection = self.acquire()
+        try:
+            yield connection
+        except smtplib.SMTPServerDisconnected:
+            self.release(connection, discard=True)
+            raise
+        except smtplib.SMTPException:
+            # The server refused this message; the session can carry the next
+            # one after a reset
+            try:
+                reusable = connection.rset()[0] == 250
+            except Exception:
+                reusable = False
+            self.release(connection, discard=not reusable)
+            raise
+        except BaseException:
+            # Socket errors and timeouts leave the session in an unknown state
+            self.release(connection, discard=True)
+            raise
+        else:
+            self.release(connection)
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close_quietly(connection)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pool counters for this process"""
+        with self._condition:
+            self._check_fork()
+            stats = dict(self._stats)
+            stats.update({
+                'max_size': self.max_size,
+                'idle': len(self._idle),
+                'in_use': self._in_use
+            })
+        return stats
+
+
+class AttachmentCache:
+    """
+    Bounded, thread-safe LRU of serialized attachment MIME parts
+
+    Keyed on the file's path, modification time and size, so replacing the
+    resume invalidates its entry. Holds at most max_entries parts and
+    max_bytes of encoded text.
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None):
+        self.max_entries = max_entries or getenv_int('EMAIL_ATTACHMENT_CACHE_SIZE', 8)
+        self.max_bytes = max_bytes or getenv_int('EMAIL_ATTACHMENT_CACHE_MB', 32) * 1024 * 1024
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, attachment_path: str) -> str:
+        """
+        Get the serialized MIME part for a file, encoding it on a miss
+
+        Returns:
+            The part's headers and base64 body as text
+        """
+        stat = os.stat(attachment_path)
+        key = (os.path.realpath(attachment_path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            part_text = self._entries.get(key)
+            if part_text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return part_text
+            self.misses += 1
+
+        part_text = build_attachment_part(attachment_path).as_string()
+        with self._lock:
+            if key not in self._entries and len(part_text) <= self.max_bytes:
+                self._entries[key] = part_text
+                self._bytes += len(part_text)
+                while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= len(evicted)
+        return part_text
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+def build_attachment_part(attachment_path: str) -> MIMEBase:
+    """Read and base64-encode a file as an attachment part"""
+    with open(attachment_path, "rb") as attachment:
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(attachment.read())
+
+    encoders.encode_base64(part)
+    part.add_header(
+        'Content-Disposition',
+        f'attachment; filename= {os.path.basename(attachment_path)}'
+    )
+    return part
+
+
+class EmailService:
+    """Service for sending emails"""
+
+    def __init__(self):
+        self.smtp_server = getenv('SMTP_SERVER', 'smtp.gmail.com')
+        self.smtp_port = getenv_int('SMTP_PORT', 587)
+        self.use_tls = getenv_bool('SMTP_USE_TLS', True)
+        self.email = getenv('EMAIL_ADDRESS')
+        self.password = getenv('EMAIL_PASSWORD')
+        self.pool = SMTPConnectionPool(self.smtp_server, self.smtp_port, self.email, self.password, self.use_tls)
+        self.attachment_cache = AttachmentCache()
+
+    def is_configured(self) -> bool:
+        """Check whether sender credentials are set"""
+        return bool(self.email and self.password)
+
+    def build_message(self, to_email: str, subject: str, body: str, attachment_path: Optional[str] = None) -> MIMEMultipart:
+        """Build the MIME message with an optional attachment"""
+        msg = MIMEMultipart()
+        msg['From'] = self.email
+        msg['To'] = to_email
+        msg['Subject'] = subject
+
+        # Add body to email
+        msg.attach(MIMEText(body, 'plain'))
+
+        # Add attachment if provided
+        if attachment_path and os.path.exists(attachment_path):
+            msg.attach(build_attachment_part(attachment_path))
+        return msg
+
+    def render_message(self, to_email: str, subject: str, body: str, attachment_path: Optional[str] = None) -> str:
+        """
+        Serialize a message, splicing in the cached attachment part
+
+        Only the headers and body are generated per message; the attachment's
+        encoded part comes from the attachment cache and is inserted before
+        the closing MIME boundary, so a resume is read and encoded once.
+
+        Returns:
+            The message text, equivalent to build_message(...).as_string()
+        """
+        if not attachment_path or not os.path.exists(attachment_path):
+            return self.build_message(to_email, subject, body).as_string()
+
+        part_text = self.attachment_cache.get(attachment_path)
+        boundary = f"==============={uuid.uuid4().hex}=="
+        msg = MIMEMultipart(boundary=boundary)
+        msg['From'] = self.email
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+
+        text = msg.as_string()
+        closing = text.rindex(f"--{boundary}--")
+        return f"{text[:closing]}--{boundary}\n{part_text}\n{text[closing:]}"
+
+    def deliver(self, to_email: str, text: str):
+        """
+        Send a serialized message over a pooled connection
+
+        A pooled connection the server has dropped since its last use fails on
+        the envelope commands (MAIL FROM / RCPT TO), before any of the message
+        is handed over; only then is the send retried, once, on a fresh
+        connection. A disconnect once DATA has started is raised as is, since
+        the server may already have accepted the message.
+        """
+        for attempt in range(2):
+            sending_data = False
+            try:
+                with self.pool.connection() as server:
+                    self._send_envelope(server, to_email)
+                    sending_data = True
+                    code, response = server.data(text)
+                    if code != 250:
+                        raise smtplib.SMTPDataError(code, response)
+                return
+            except smtplib.SMTPServerDisconnected:
+                if attempt or sending_data:
+                    raise
+
+    def _send_envelope(self, server: smtplib.SMTP, to_email: str):
+        """Send MAIL FROM and RCPT TO (the part of SMTP.sendmail() before DATA)"""
+        server.ehlo_or_helo_if_needed()
+        code, response = server.mail(self.email)
+        if code != 250:
+            raise smtplib.SMTPSenderRefused(code, response, self.email)
+        code, response = server.rcpt(to_email)
+        if code not in (250, 251):
+            raise smtplib.SMTPRecipientsRefused({to_email: (code, response)})
+
+    def send_email(self, to_email: str, subject: str, body: str, attachment_path: Optional[str] = None) -> Dict[str, Any]:
+        """Send email with optional attachment"""
+
+        if not self.is_configured():
+            return {
+                'success': False,
+                'error': CREDENTIALS_ERROR
+            }
+
+        try:
+            self.deliver(to_email, self.render_message(to_email, subject, body, attachment_path))
+
+            return {
+                'success': True,
+                'message': f'Email sent successfully to {to_email}'
+            }
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Failed to send email: {str(e)}'
+            }
+
+    async def send_email_async(self, to_email: str, subject: str, body: str,
+                               attachment_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Send email with optional attachment without blocking the event loop
+
+        Rendering runs in a worker thread since it may read and encode the
+        attachment. With aiosmtplib installed the SMTP exchange is async (one
+        connection per send); otherwise the pooled send runs in a worker thread.
+        """
+
+        if not self.is_configured():
+            return {
+                'success': False,
+                'error': CREDENTIALS_ERROR
+            }
+
+        try:
+            text = await asyncio.to_thread(self.render_message, to_email, subject, body, attachment_path)
+            if AIOSMTPLIB_AVAILABLE:
+                await aiosmtplib.send(
+                    text,
+                    sender=self.email,
+                    recipients=[to_email],
+                    hostname=self.smtp_server,
+                    port=self.smtp_port,
+                    username=self.email,
+                    password=self.password,
+                    start_tls=self.use_tls,
+                    timeout=get_call_timeout(self.pool.timeout)
+                )
+            else:
+                await asyncio.to_thread(self.deliver, to_email, text)
+
+            return {
+                'success': True,
+                'message': f'Email sent successfully to {to_email}'
+            }
+
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Failed to send email: {str(e)}'
+            }
+
+
+# Global email service instance
+_email_service = None
+_email_service_lock = threading.Lock()
+
+def get_email_service() -> EmailService:
+    """Get or create the global email service"""
+    global _email_service
+    if _email_service is None:
+        with _email_service_lock:
+            if _email_service is None:
+                _email_service = EmailService()
+    return _email_service
@@ -0,0 +1,128 @@
+"""
+Request hedging helpers for AI analysis
+Runs hedged provider calls on a shared thread pool and caps how many extra
+calls hedging may add, and how many may be running at once
+"""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Iterable, Optional, Union
+
+from utils.env_manager import getenv_int, getenv_float
+from services.ai_metrics import get_ai_metrics, percentile
+
+
+class HedgeBudget:
+    """
+    Token bucket that limits hedged calls to a fraction of all requests
+
+    Every eligible request adds `ratio` tokens (up to `burst`); every hedge
+    spends one, so over time at most `ratio` of requests fire a second call.
+    A hedged pair's losing call keeps running (and holding its scheduler slot
+    and rate budget) until it returns, so at most `max_in_flight` hedged pairs
+    may be unfinished in this process at once.
+    """
+
+    def __init__(self, ratio: float = None, burst: float = None, max_in_flight: int = None):
+        self.ratio = ratio if ratio is not None else getenv_float('AI_HEDGE_BUDGET_RATIO', 0.1)
+        self.burst = burst if burst is not None else getenv_float('AI_HEDGE_BUDGET_BURST', 5.0)
+        self.max_in_flight = max_in_flight if max_in_flight is not None else getenv_int('AI_HEDGE_MAX_IN_FLIGHT', 2)
+        self._tokens = self.burst
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        """Earn budget for one eligible request"""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """
+        Spend budget for one hedge
+
+        Returns:
+            False if the budget is exhausted or too many hedged pairs are still
+            running; otherwise True, and the caller must release_when_done()
+        """
+        with self._lock:
+            if self._tokens >= 1.0 and self._in_flight < self.max_in_flight:
+                self._tokens -= 1.0
+                self._in_flight += 1
+                return True
+            return False
+
+    def release_when_done(self, calls: Iterable[Union[Future, asyncio.Future]]):
+        """Free a hedge's in-flight slot once both calls of the hedged pair have finished"""
+        calls = list(calls)
+        remaining = [len(calls)]
+
+        def on_done(_call):
+            with self._lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    self._in_flight -= 1
+
+        for call in calls:
+            call.add_done_callback(on_done)
+
+    def in_flight(self) -> int:
+        """Get the number of hedged pairs still running"""
+        with self._lock:
+            return self._in_flight
+
+
+def get_hedge_delay(provider: str, model: str, pct: float, min_samples: int = None) -> Optional[float]:
+    """
+    Get how long to wait for the primary call before hedging
+
+    Args:
+        provider: Primary provider name
+        model: Primary model name
+        pct: Latency percentile (0-100) of the primary's observed latency
+        min_samples: Minimum latency samples needed before hedging
+
+    Returns:
+        Delay in seconds, or None if there isn't enough latency history yet
+    """
+    if min_samples is None:
+        min_samples = getenv_int('AI_HEDGE_MIN_SAMPLES', 20)
+    samples = get_ai_metrics().get_samples('provider_latency', f"{provider}/{model}", 'seconds')
+    if len(samples) < min_samples:
+        return None
+    return percentile(samples, pct)
+
+
+def submit_with_context(func: Callable, *args, **kwargs) -> Future:
+    """Run func on the hedging pool, carrying over the caller's context (deadline)"""
+    context = contextvars.copy_context()
+    return get_hedge_executor().submit(context.run, func, *args, **kwargs)
+
+
+# Global hedging state
+_hedge_budget = None
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+
+def get_hedge_budget() -> HedgeBudget:
+    """Get or create the global hedge budget"""
+    global _hedge_budget
+    if _hedge_budget is None:
+        with _hedge_lock:
+            if _hedge_budget is None:
+                _hedge_budget = HedgeBudget()
+    return _hedge_budget
+
+
+def get_hedge_executor() -> ThreadPoolExecutor:
+    """Get or create the thread pool used for hedged calls"""
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(
+                    max_workers=getenv_int('AI_HEDGE_MAX_WORKERS', 8),
+                    thread_name_prefix='ai-hedge'
+                )
+    return _hedge_executor
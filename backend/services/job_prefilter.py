@@ -0,0 +1,367 @@
+"""
+Job pre-filtering
+Quickly screens scraped jobs for relevance before full analysis, in small AI
+batches with keyword matching as the fallback
+"""
+
+import asyncio
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+from utils.deadline import DeadlineExceeded
+from services.ai_client import create_ai_client, chat_completion, create_async_ai_client, async_chat_completion
+from services.ai_settings import get_ai_settings_service
+from services.model_routing import PRE_FILTER
+
+# Jobs assessed per provider call
+PREFILTER_BATCH_SIZE = 5
+
+PREFILTER_SYSTEM_PROMPT = "You are a job relevance analyzer. Respond concisely with only the requested format."
+
+# Technical keywords that indicate relevant jobs
+TECH_KEYWORDS = ['developer', 'engineer', 'programmer', 'software', 'python', 'javascript', 'api', 'backend', 'frontend', 'ml', 'ai', 'data']
+
+# Scores reported for kept jobs (0-1): AI labels map directly, keyword points
+# scale against KEYWORD_MAX_POINTS and count as RELEVANT from KEYWORD_RELEVANT_POINTS
+# (two skill matches, or one plus three technical keywords)
+LABEL_SCORES = {'RELEVANT': 1.0, 'MAYBE': 0.5}
+KEYWORD_RELEVANT_POINTS = 6
+KEYWORD_MAX_POINTS = 10
+
+# 'full' echoes kept jobs back; 'ids' returns only their index, id, score and label
+PREFILTER_RESPONSE_MODES = ('full', 'ids')
+
+
+class _ProviderCandidates:
+    """Providers to try in order: the active one, then healthy failover providers (loaded on first failure)"""
+
+    def __init__(self, ai_settings: Dict[str, Any], client_factory: Callable):
+        self.ai_settings = ai_settings
+        self.client_factory = client_factory
+        self.candidates = [ai_settings]
+        self.failover_loaded = False
+        self.clients = {}
+
+    def iter_clients(self) -> Iterator[Tuple[Dict[str, Any], str, Any]]:
+        """Yield (config, provider, client) for each usable provider, loading failover providers when the list runs out"""
+        index = 0
+        while index < len(self.candidates):
+            config = self.candidates[index]
+            index += 1
+            provider = config.get('provider')
+            if provider not in self.clients:
+                self.clients[provider] = self.client_factory(provider, config.get('api_key'), config.get('base_url'))
+            client = self.clients[provider]
+            if client:
+                yield config, provider, client
+
+            if index == len(self.candidates) and not self.failover_loaded:
+                self.failover_loaded = True
+                self.candidates.extend(get_ai_settings_service().get_failover_provider_configs(
+                    exclude=self.ai_settings.get('provider'), stage=PRE_FILTER))
+
+
+def ai_pre_filter_decisions(jobs: List[Dict[str, Any]], user_profile: Dict[str, Any],
+                            ai_settings: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Use AI to intelligently pre-filter jobs with a lightweight approach
+
+    Args:
+        jobs: Job data dictionaries
+        user_profile: Profile the jobs are screened against
+        ai_settings: Provider configuration routed to the pre-filter stage
+
+    Returns:
+        A decision ({'index', 'score', 'label'}) for each job judged relevant
+        (or possibly relevant), in input order
+    """
+    providers = _ProviderCandidates(ai_settings, create_ai_client)
+    decisions = []
+    for i in range(0, len(jobs), PREFILTER_BATCH_SIZE):
+        decisions.extend(_filter_batch(jobs[i:i + PREFILTER_BATCH_SIZE], user_profile, providers, i))
+    return decisions
+
+
+async def ai_pre_filter_decisions_async(jobs: List[Dict[str, Any]], user_profile: Dict[str, Any],
+                                        ai_settings: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Pre-filter jobs like ai_pre_filter_decisions(), with all batches in flight at once
+
+    Batches still queue for provider call slots in the scheduler like any
+    other pre-filter call.
+
+    Returns:
+        Decisions for the jobs judged relevant (or possibly relevant), in input order
+    """
+    providers = _ProviderCandidates(ai_settings, create_async_ai_client)
+    results = await asyncio.gather(*(
+        _filter_batch_async(jobs[i:i + PREFILTER_BATCH_SIZE], user_profile, providers, i)
+        for i in range(0, len(jobs), PREFILTER_BATCH_SIZE)
+    ))
+    return [decision for kept in results for decision in kept]
+
+
+def _filter_batch(batch: List[Dict[str, Any]], user_profile: Dict[str, Any],
+                  providers: _ProviderCandidates, offset: int) -> List[Dict[str, Any]]:
+    """Pre-filter one batch starting at jobs[offset], falling back to keyword matching if no provider answers"""
+    try:
+        batch_prompt = build_batch_prompt(batch, user_profile)
+
+        # Bounded by the request deadline and failing fast past providers whose circuit is open
+        ai_response = None
+        for config, provider, client in providers.iter_clients():
+            try:
+                response = chat_completion(
+                    client,
+                    provider,
+                    rate_limits=config.get('rate_limits'),
+                    stage=PRE_FILTER,
+                    **_prefilter_request(config, batch_prompt)
+                )
+                ai_response = response.choices[0].message.content.strip()
+                break
+            except DeadlineExceeded:
+                raise
+            except Exception as provider_error:
+                print(f"⚠️ AI pre-filter call to {provider} failed: {provider_error}")
+
+        if ai_response is None:
+            return keyword_filter_batch(batch, user_profile, offset)
+        return parse_batch_response(ai_response, batch, offset)
+
+    except Exception as e:
+        print(f"⚠️ AI batch analysis failed: {e}, falling back to keyword matching for batch")
+        return keyword_filter_batch(batch, user_profile, offset)
+
+
+async def _filter_batch_async(batch: List[Dict[str, Any]], user_profile: Dict[str, Any],
+                              providers: _ProviderCandidates, offset: int) -> List[Dict[str, Any]]:
+    """Pre-filter one batch on async clients (see _filter_batch())"""
+    try:
+        batch_prompt = build_batch_prompt(batch, user_profile)
+
+        ai_response = None
+        for config, provider, client in providers.iter_clients():
+            try:
+                response = await async_chat_completion(
+                    client,
+                    provider,
+                    rate_limits=config.get('rate_limits'),
+                    stage=PRE_FILTER,
+                    **_prefilter_request(config, batch_prompt)
+                )
+                ai_response = response.choices[0].message.content.strip()
+                break
+            except DeadlineExceeded:
+                raise
+            except Exception as provider_error:
+                print(f"⚠️ AI pre-filter call to {provider} failed: {provider_error}")
+
+        if ai_response is None:
+            return keyword_filter_batch(batch, user_profile, offset)
+        return parse_batch_response(ai_response, batch, offset)
+
+    except Exception as e:
+        print(f"⚠️ AI batch analysis failed: {e}, falling back to keyword matching for batch")
+        return keyword_filter_batch(batch, user_profile, offset)
+
+
+def build_batch_prompt(batch: List[Dict[str, Any]], user_profile: Dict[str, Any]) -> str:
+    """Create a concise prompt assessing the relevance of several jobs at once"""
+    user_skills = ', '.join(user_profile.get('skills', []))
+    user_domain = user_profile.get('domain', 'Software Development')
+    excluded_roles = ', '.join(user_profile.get('excludedRoles', []))
+
+    batch_prompt = f"""
+            User Profile:
+            - Skills: {user_skills}
+            - Domain: {user_domain}
+            - Excluded roles: {excluded_roles}
+
+            Analyze the following {len(batch)} jobs for relevance. For each job, respond with only "RELEVANT", "MAYBE", or "NOT_RELEVANT".
+
+            """
+
+    for idx, job in enumerate(batch):
+        job_summary = f"""
+                Job {idx + 1}:
+                Title: {job.get('title', 'Unknown')}
+                Company: {job.get('company', 'Unknown')}
+                Description: {(job.get('description', '') + ' ' + job.get('content', ''))[:300]}
+                """
+        batch_prompt += job_summary + "\n"
+
+    batch_prompt += "\nRespond with exactly one line per job: Job1: RELEVANT/MAYBE/NOT_RELEVANT, Job2: RELEVANT/MAYBE/NOT_RELEVANT, etc."
+    return batch_prompt
+
+
+def _prefilter_request(config: Dict[str, Any], batch_prompt: str) -> Dict[str, Any]:
+    """Build chat.completions.create() arguments for a pre-filter batch"""
+    provider = config.get('provider')
+    return {
+        'model': config.get('model') or ('llama-3.1-8b-instant' if provider == 'groq' else 'gpt-4o-mini'),
+        'messages': [
+            {"role": "system", "content": PREFILTER_SYSTEM_PROMPT},
+            {"role": "user", "content": batch_prompt}
+        ],
+        'max_tokens': config.get('max_tokens') or 200,
+        'temperature': 0.3
+    }
+
+
+def parse_batch_response(ai_response: str, batch: List[Dict[str, Any]], offset: int = 0) -> List[Dict[str, Any]]:
+    """Decide the jobs whose response line is RELEVANT or MAYBE (missing lines keep the job as MAYBE to be safe)"""
+    kept = []
+    response_lines = ai_response.split('\n')
+    for idx, job in enumerate(batch):
+        if idx < len(response_lines):
+            line = response_lines[idx].upper()
+            # NOT_RELEVANT contains RELEVANT, so it has to be ruled out first
+            if 'NOT_RELEVANT' in line or 'NOT RELEVANT' in line:
+                continue
+            if 'MAYBE' in line:
+                kept.append(_decision(offset + idx, LABEL_SCORES['MAYBE'], 'MAYBE'))
+            elif 'RELEVANT' in line:
+                kept.append(_decision(offset + idx, LABEL_SCORES['RELEVANT'], 'RELEVANT'))
+        else:
+            # If response is incomplete, include job to be safe
+            kept.append(_decision(offset + idx, LABEL_SCORES['MAYBE'], 'MAYBE'))
+    return kept
+
+
+def keyword_filter_batch(batch: List[Dict[str, Any]], user_profile: Dict[str, Any],
+                         offset: int = 0) -> List[Dict[str, Any]]:
+    """Fallback to keyword filtering for a batch the AI couldn't assess"""
+    user_skills_lower, excluded_roles, _ = _profile_terms(user_profile)
+    kept = []
+    for idx, job in enumerate(batch):
+        points = _keyword_points(job, user_skills_lower, excluded_roles)
+        if points is not None and points > 2:
+            kept.append(_keyword_decision(offset + idx, points))
+    return kept
+
+
+def keyword_pre_filter_decisions(jobs: List[Dict[str, Any]], user_profile: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Use keyword-based filtering as fallback, with the profile's domain counting too"""
+    user_skills_lower, excluded_roles, user_domain = _profile_terms(user_profile)
+    decisions = []
+    for idx, job in enumerate(jobs):
+        points = _keyword_points(job, user_skills_lower, excluded_roles, user_domain)
+        # Include job if score is positive and no excluded roles found
+        if points is not None and points > 2:
+            decisions.append(_keyword_decision(idx, points))
+    return decisions
+
+
+def _profile_terms(user_profile: Dict[str, Any]) -> Tuple[List[str], List[str], str]:
+    """Lowercased skills, excluded roles and domain to match job text against"""
+    user_skills = user_profile.get('skills', [])
+    excluded_roles = [role.lower() for role in user_profile.get('excludedRoles', [])]
+
+    # Convert skills to lowercase for matching
+    if isinstance(user_skills, list):
+        user_skills_lower = [skill.lower() for skill in user_skills]
+    else:
+        user_skills_lower = []
+
+    return user_skills_lower, excluded_roles, (user_profile.get('domain') or '').lower()
+
+
+def _keyword_points(job: Dict[str, Any], user_skills_lower: List[str], excluded_roles: List[str],
+                    user_domain: str = '') -> Optional[int]:
+    """Keyword relevance points for a job, or None if it mentions an excluded role"""
+    job_content = f"{job.get('title', '')} {job.get('company', '')} {job.get('description', '')} {job.get('content', '')}".lower()
+
+    # Check for excluded roles
+    for excluded in excluded_roles:
+        if excluded and excluded in job_content:
+            return None
+
+    # Basic relevance scoring
+    score = 0
+
+    # Technical keywords that indicate relevant jobs
+    for keyword in TECH_KEYWORDS:
+        if keyword in job_content:
+            score += 1
+
+    # User skills matching (higher weight)
+    for skill in user_skills_lower:
+        if skill and skill in job_content:
+            score += 3
+
+    # Domain matching
+    if user_domain and user_domain in job_content:
+        score += 2
+
+    return score
+
+
+def _decision(index: int, score: float, label: str) -> Dict[str, Any]:
+    return {'index': index, 'score': score, 'label': label}
+
+
+def _keyword_decision(index: int, points: int) -> Dict[str, Any]:
+    """Scale keyword points to a 0-1 score; strong matches are RELEVANT, the rest MAYBE"""
+    label = 'RELEVANT' if points >= KEYWORD_RELEVANT_POINTS else 'MAYBE'
+    return _decision(index, round(min(points, KEYWORD_MAX_POINTS) / KEYWORD_MAX_POINTS, 2), label)
+
+
+def parse_response_options(data: Dict[str, Any]) -> Tuple[str, Optional[List[str]], Optional[str]]:
+    """
+    Read the response shape a pre-filter request asks for
+
+    Args:
+        data: Request body; 'response_mode' is 'full' (default) or 'ids', and
+            'fields' optionally lists the job fields to return in full mode
+
+    Returns:
+        (response_mode, fields, error message or None)
+    """
+    response_mode = data.get('response_mode') or 'full'
+    if response_mode not in PREFILTER_RESPONSE_MODES:
+        return response_mode, None, f"response_mode must be one of: {', '.join(PREFILTER_RESPONSE_MODES)}"
+
+    fields = data.get('fields')
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(field, str) for field in fields)):
+        return response_mode, None, 'fields must be a list of job field names'
+    return response_mode, fields, None
+
+
+def build_prefilter_response(jobs: List[Dict[str, Any]], decisions: List[Dict[str, Any]], method: str,
+                             response_mode: str = 'full', fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Build the /api/pre-filter-jobs response body
+
+    Args:
+        jobs: Jobs from the request
+        decisions: Decisions for the kept jobs, in input order
+        method: 'ai' or 'keyword'
+        response_mode: 'full' echoes the kept jobs in filteredJobs; 'ids' returns
+            only results with each kept job's index, id (if it has one), score and label
+        fields: Job fields to keep in full mode (all when None)
+
+    Returns:
+        Response dictionary
+    """
+    response = {'success': True}
+    if response_mode == 'ids':
+        results = []
+        for decision in decisions:
+            result = dict(decision)
+            job_id = jobs[decision['index']].get('id')
+            if job_id is not None:
+                result['id'] = job_id
+            results.append(result)
+        response['results'] = results
+    else:
+        kept = [jobs[decision['index']] for decision in decisions]
+        if fields is not None:
+            kept = [{field: job[field] for field in fields if field in job} for job in kept]
+        response['filteredJobs'] = kept
+
+    response.update({
+        'originalCount': len(jobs),
+        'filteredCount': len(decisions),
+        'method': method
+    })
+    return response
@@ -0,0 +1,180 @@
+"""
+Per-stage model routing
+Maps each pipeline stage to a provider/model/max_tokens and reports cost and
+latency per stage
+"""
+
+from typing import Dict, Any, Optional
+
+from services.ai_metrics import get_ai_metrics
+
+PRE_FILTER = 'pre_filter'
+CLASSIFY = 'classify'
+EMAIL_GENERATION = 'email_generation'
+CONNECTION_TEST = 'connection_test'
+
+PIPELINE_STAGES = [PRE_FILTER, CLASSIFY, EMAIL_GENERATION, CONNECTION_TEST]
+
+# Default route per stage: the fastest model that handles the stage well.
+# A model of None keeps the provider's configured model; a max_tokens of None
+# keeps the configured max_tokens. Classification defaults to the configured
+# model, so analysis stays a single call unless a classify model is routed.
+STAGE_DEFAULTS = {
+    PRE_FILTER: {
+        'models': {'openai': 'gpt-4o-mini', 'groq': 'llama-3.1-8b-instant'},
+        'max_tokens': 200
+    },
+    CLASSIFY: {
+        'models': {},
+        'max_tokens': 300
+    },
+    EMAIL_GENERATION: {
+        'models': {},
+        'max_tokens': None
+    },
+    CONNECTION_TEST: {
+        'models': {'openai': 'gpt-4o-mini', 'groq': 'llama-3.1-8b-instant'},
+        'max_tokens': 5
+    }
+}
+
+# Approximate list prices in USD per million tokens (input, output), matched by model prefix
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4.1-nano': (0.10, 0.40),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1': (2.00, 8.00),
+    'gpt-4-turbo': (10.00, 30.00),
+    'gpt-4': (30.00, 60.00),
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'llama-3.1-8b-instant': (0.05, 0.08),
+    'llama-3.3-70b-versatile': (0.59, 0.79),
+    'llama3-8b-8192': (0.05, 0.08),
+    'llama3-70b-8192': (0.59, 0.79),
+    'mixtral-8x7b-32768': (0.24, 0.24),
+    'gemma2-9b-it': (0.20, 0.20)
+}
+
+ROUTE_FIELDS = ['provider', 'model', 'max_tokens']
+
+
+def resolve_stage_route(stage: str, provider_config: Dict[str, Any], route: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Apply a stage's route to a provider configuration
+
+    Args:
+        stage: Pipeline stage name
+        provider_config: Provider configuration (provider, api_key, model, ...)
+        route: Stored route for the stage (model / max_tokens overrides)
+
+    Returns:
+        Copy of the configuration with the stage's model and max_tokens
+    """
+    if not provider_config:
+        return {}
+
+    config = dict(provider_config)
+    defaults = STAGE_DEFAULTS.get(stage, {})
+    route = route or {}
+
+    model = route.get('model') or defaults.get('models', {}).get(config.get('provider'))
+    if model:
+        config['model'] = model
+
+    max_tokens = route.get('max_tokens') or defaults.get('max_tokens')
+    if max_tokens:
+        config['max_tokens'] = int(max_tokens)
+
+    config['stage'] = stage
+    return config
+
+
+def validate_stage_routes(routes: Dict[str, Any]) -> Optional[str]:
+    """
+    Check stage routes submitted by a client
+
+    Returns:
+        Error message, or None if the routes are valid
+    """
+    if not isinstance(routes, dict):
+        return 'Stage routes must be an object'
+    for stage, route in routes.items():
+        if stage not in PIPELINE_STAGES:
+            return f"Unknown pipeline stage: {stage}"
+        if not isinstance(route, dict):
+            return f"Route for {stage} must be an object"
+        unknown = [key for key in route if key not in ROUTE_FIELDS]
+        if unknown:
+            return f"Unknown route fields for {stage}: {', '.join(unknown)}"
+        if route.get('provider') and route['provider'] not in ['openai', 'groq']:
+            return f"Unsupported AI provider for {stage}: {route['provider']}"
+        if route.get('max_tokens') is not None:
+            try:
+                if int(route['max_tokens']) <= 0:
+                    return f"max_tokens for {stage} must be positive"
+            except (TypeError, ValueError):
+                return f"max_tokens for {stage} must be a number"
+    return None
+
+
+def get_model_price(model: Optional[str]) -> Optional[tuple]:
+    """Get (input, output) USD prices per million tokens for a model"""
+    if not model:
+        return None
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(prefix):
+            return MODEL_PRICES[prefix]
+    return None
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """Estimate the USD cost of a call, or None for models without a known price"""
+    price = get_model_price(model)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+def record_stage_call(stage: str, provider: str, model: str, latency: float, usage=None):
+    """
+    Record latency, tokens and estimated cost of a provider call for its stage
+
+    Args:
+        stage: Pipeline stage name
+        provider: Provider name
+        model: Model used
+        latency: Call latency in seconds
+        usage: Completion usage object, if the provider returned one
+    """
+    metrics = get_ai_metrics()
+    key = f"{stage}:{provider}/{model}"
+    metrics.increment('stages', key, 'calls')
+    metrics.observe('stages', key, 'latency_seconds', round(latency, 4))
+
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    metrics.increment('stages', key, 'prompt_tokens', prompt_tokens)
+    metrics.increment('stages', key, 'completion_tokens', completion_tokens)
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    if cost is not None:
+        metrics.increment('stages', key, 'cost_usd', cost)
+
+
+def get_stage_report() -> Dict[str, Any]:
+    """
+    Summarize cost and latency per stage and model
+
+    Returns:
+        Dictionary keyed by 'stage:provider/model' with call counts, tokens,
+        total and per-call cost, and latency percentiles
+    """
+    report = get_ai_metrics().snapshot('stages').get('stages', {})
+    for entry in report.values():
+        calls = entry.get('calls', 0)
+        if 'cost_usd' in entry:
+            entry['cost_usd'] = round(entry['cost_usd'], 6)
+            entry['cost_per_call_usd'] = round(entry['cost_usd'] / calls, 6) if calls else 0.0
+    return report
@@ -0,0 +1,529 @@
+"""
+Prompt Builder for AI job analysis
+Compacts job post text, enforces a per-model token budget and assembles
+prompts as static instructions, then profile, then job
+"""
+
+import hashlib
+import json
+import math
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, is_dataclass
+from typing import Dict, Any, Optional
+
+from utils.env_manager import getenv_int
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Context window sizes by model name prefix (longest prefix wins)
+MODEL_CONTEXT_WINDOWS = {
+    'gpt-4o': 128000,
+    'gpt-4.1': 1047576,
+    'gpt-4-turbo': 128000,
+    'gpt-4': 8192,
+    'gpt-3.5-turbo': 16385,
+    'gpt-5': 400000,
+    'llama3-8b-8192': 8192,
+    'llama3-70b-8192': 8192,
+    'llama-3.1': 131072,
+    'llama-3.3': 131072,
+    'mixtral-8x7b-32768': 32768,
+    'gemma': 8192
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Tokens reserved for instructions and the user profile block
+PROMPT_OVERHEAD_TOKENS = 800
+
+# Lines that LinkedIn adds around posts and job pages
+BOILERPLATE_PATTERNS = [
+    r'^(…|\.\.\.)?\s*see more$',
+    r'^show (more|less)$',
+    r'^(like|comment|repost|send|share|follow|save|apply|easy apply|apply now|promoted)$',
+    r'^\d[\d,.]*\s*(k\s*)?(followers?|reactions?|comments?|reposts?|applicants?)$',
+    r'^activate to view larger image,?.*$',
+    r'^about the job$',
+    r'^(posted|reposted)\s+\d+\s*\w+\s+ago$',
+    r'^\d+\s*(h|d|w|mo|yr)s?\s*(•.*)?$',
+    r'^(visible to anyone on or off linkedin|edited)$',
+]
+_BOILERPLATE_RE = re.compile('|'.join(f'(?:{p})' for p in BOILERPLATE_PATTERNS), re.IGNORECASE)
+_HASHTAG_RE = re.compile(r'(?:hashtag)?#[\w-]+', re.IGNORECASE)
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+_WHITESPACE_RE = re.compile(r'[ \t ]+')
+
+
+# OpenAI only caches prompts of at least this many tokens, and only a prefix
+# that earlier requests sent unchanged. The static prefix below (instructions
+# plus profile block, ~300-600 tokens) is shorter, so cached_tokens stays 0;
+# the prefix cache's stats report the prefix size against this limit.
+PROVIDER_CACHE_MIN_TOKENS = 1024
+
+# Static instructions shared by every analysis request, kept ahead of the
+# per-profile block so only the job content at the end changes
+ANALYSIS_INSTRUCTIONS = """You are a smart and structured AI agent that helps automate job applications for a developer.
+
+You MUST respond with valid JSON only, no additional text or explanations.
+
+Your task is to analyze the job post content provided after the user profile and help automate the application workflow.
+
+INSTRUCTIONS:
+1. Analyze if this job is relevant to the user's profile
+2. Extract contact information if available
+3. Generate a personalized application email if relevant, written on behalf of the user
+4. Return ONLY a valid JSON response in the exact format below (no additional text):
+
+```json
+{
+  "status": "RELEVANT" or "NOT RELEVANT",
+  "reason": "1-2 line explanation of your decision",
+  "contact": "email@company.com or null",
+  "email_subject": "Email subject line",
+  "email_body": "Professional email body with personalized content",
+  "attachment_required": true
+}
+```
+
+IMPORTANT:
+- Return ONLY the JSON, no other text
+- Use double quotes for all strings
+- If no contact email found, use null (not "null")
+- Keep email content professional and concise
+- Don't include newlines in JSON string values, use \\n instead"""
+
+# Static system prompt for the classification stage (no email generation)
+CLASSIFY_INSTRUCTIONS = """You are a job relevance classifier for a developer's job search.
+
+You MUST respond with valid JSON only, no additional text or explanations.
+
+Decide whether the job post content provided after the user profile is relevant to the user's profile, and extract a contact email if one is present. Return ONLY a JSON object in this exact format:
+
+```json
+{
+  "status": "RELEVANT" or "NOT RELEVANT",
+  "reason": "1-2 line explanation of your decision",
+  "contact": "email@company.com or null"
+}
+```"""
+
+
+@dataclass
+class JobPromptContent:
+    """Compacted job content with token accounting"""
+    text: str
+    original_tokens: int
+    final_tokens: int
+    budget_tokens: int
+    truncated: bool = False
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.original_tokens - self.final_tokens)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'original_tokens': self.original_tokens,
+            'prompt_tokens': self.final_tokens,
+            'saved_tokens': self.saved_tokens,
+            'budget_tokens': self.budget_tokens,
+            'truncated': self.truncated
+        }
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in text without calling the provider
+
+    Uses tiktoken's cl100k_base encoding when installed, otherwise a
+    characters-per-token heuristic (~4 chars per token for English text)
+    """
+    if not text:
+        return 0
+    if TIKTOKEN_AVAILABLE:
+        try:
+            return len(_get_encoding().encode(text))
+        except Exception:
+            pass
+    return math.ceil(len(text) / 4)
+
+
+_encoding = None
+
+def _get_encoding():
+    """Get the cached tiktoken encoding"""
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding('cl100k_base')
+    return _encoding
+
+
+def get_context_window(model: Optional[str]) -> int:
+    """Get the context window for a model using the longest matching prefix"""
+    model = (model or '').lower()
+    matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if model.startswith(prefix)]
+    if not matches:
+        return DEFAULT_CONTEXT_WINDOW
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+
+
+def get_job_token_budget(model: Optional[str], max_tokens: int = 1500, budget: Optional[int] = None) -> int:
+    """
+    Get the token budget for the job content part of the prompt
+
+    Args:
+        model: Model name
+        max_tokens: Tokens reserved for the completion
+        budget: Explicit budget override (e.g. from AI settings)
+
+    Returns:
+        Token budget for the job content
+    """
+    cap = budget or getenv_int('PROMPT_JOB_TOKEN_BUDGET', 1200)
+    available = get_context_window(model) - (max_tokens or 0) - PROMPT_OVERHEAD_TOKENS
+    return max(100, min(cap, available))
+
+
+def clean_job_text(text: str) -> str:
+    """
+    Strip LinkedIn boilerplate, hashtag blocks and emoji runs from job text
+
+    Args:
+        text: Raw description or post content
+
+    Returns:
+        Cleaned text with duplicate lines and extra whitespace removed
+    """
+    if not text:
+        return ""
+
+    cleaned_lines = []
+    seen = set()
+    for line in text.splitlines():
+        line = _strip_emoji_runs(line)
+        line = _WHITESPACE_RE.sub(' ', line).strip()
+        if not line or _BOILERPLATE_RE.match(line):
+            continue
+
+        # Drop lines that are only hashtags, and trailing hashtag runs
+        words = line.split()
+        hashtags = [word for word in words if _HASHTAG_RE.fullmatch(word.strip('.,;:!'))]
+        if len(hashtags) == len(words):
+            continue
+        while words and _HASHTAG_RE.fullmatch(words[-1].strip('.,;:!')):
+            words.pop()
+        line = ' '.join(words)
+        # LinkedIn renders inline tags as "hashtag#python"
+        line = re.sub(r'\bhashtag#', '#', line, flags=re.IGNORECASE)
+
+        key = _normalize(line)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        cleaned_lines.append(line)
+
+    return "\n".join(cleaned_lines)
+
+
+def compact_job_fields(title: str = "", company: str = "", location: str = "",
+                       description: str = "", content: str = "") -> Dict[str, str]:
+    """
+    Clean job fields and remove text duplicated between description and content
+
+    Returns:
+        Dictionary with compacted title, company, location, description and content
+    """
+    description = clean_job_text(description)
+    content = clean_job_text(content)
+
+    norm_description = _normalize(description)
+    norm_content = _normalize(content)
+    if norm_description and norm_content:
+        if norm_content in norm_description:
+            content = ""
+        elif norm_description in norm_content:
+            description = ""
+        else:
+            # Keep only content lines that don't already appear in the description
+            description_lines = {_normalize(line) for line in description.splitlines()}
+            content = "\n".join(
+                line for line in content.splitlines()
+                if _normalize(line) not in description_lines and _normalize(line) not in norm_description
+            )
+
+    # Header fields that are repeated as the first line of the body add nothing
+    header_lines = {_normalize(value) for value in (title, company, location) if value}
+    description = _drop_lines(description, header_lines)
+    content = _drop_lines(content, header_lines)
+
+    return {
+        'title': (title or '').strip(),
+        'company': (company or '').strip(),
+        'location': (location or '').strip(),
+        'description': description,
+        'content': content
+    }
+
+
+def format_job_content(fields: Dict[str, str]) -> str:
+    """Format job fields in the same layout used by the analysis prompt"""
+    content_parts = []
+
+    if fields.get('title'):
+        content_parts.append(f"Title: {fields['title']}")
+    if fields.get('company'):
+        content_parts.append(f"Company: {fields['company']}")
+    if fields.get('location'):
+        content_parts.append(f"Location: {fields['location']}")
+    if fields.get('description'):
+        content_parts.append(f"Description: {fields['description']}")
+    if fields.get('content'):
+        content_parts.append(f"Content: {fields['content']}")
+
+    return "\n".join(content_parts)
+
+
+def build_job_prompt_content(job, model: Optional[str] = None, max_tokens: int = 1500,
+                             budget: Optional[int] = None) -> JobPromptContent:
+    """
+    Build compacted, token-budgeted job content for the analysis prompt
+
+    Args:
+        job: Object with title, company, location, description and content attributes
+        model: Model name used to size the budget
+        max_tokens: Completion tokens reserved for the response
+        budget: Explicit job content budget override
+
+    Returns:
+        JobPromptContent with the text and token accounting
+    """
+    raw_fields = {
+        'title': getattr(job, 'title', '') or '',
+        'company': getattr(job, 'company', '') or '',
+        'location': getattr(job, 'location', '') or '',
+        'description': getattr(job, 'description', '') or '',
+        'content': getattr(job, 'content', '') or ''
+    }
+    original_tokens = estimate_tokens(format_job_content(raw_fields))
+    budget_tokens = get_job_token_budget(model, max_tokens, budget)
+
+    fields = compact_job_fields(**raw_fields)
+    text = format_job_content(fields)
+    tokens = estimate_tokens(text)
+    truncated = False
+
+    if tokens > budget_tokens:
+        # Contact emails must survive truncation, so reserve room for them
+        emails = list(dict.fromkeys(_EMAIL_RE.findall(text)))
+        contact_line = f"Contact: {', '.join(emails)}" if emails else ""
+        fields = _truncate_fields(fields, budget_tokens - estimate_tokens(contact_line))
+        text = format_job_content(fields)
+        missing = [email for email in emails if email not in text]
+        if missing:
+            text += f"\nContact: {', '.join(missing)}"
+        tokens = estimate_tokens(text)
+        truncated = True
+
+    return JobPromptContent(
+        text=text,
+        original_tokens=original_tokens,
+        final_tokens=tokens,
+        budget_tokens=budget_tokens,
+        truncated=truncated
+    )
+
+
+def _truncate_fields(fields: Dict[str, str], budget_tokens: int) -> Dict[str, str]:
+    """Shorten description and content so the formatted text fits the budget"""
+    fields = dict(fields)
+    header = {key: fields[key] for key in ('title', 'company', 'location')}
+    remaining = budget_tokens - estimate_tokens(format_job_content(header)) - 4
+
+    # Description gets priority; content gets whatever budget is left
+    for key in ('description', 'content'):
+        text = fields.get(key, '')
+        if not text:
+            continue
+        if remaining <= 0:
+            fields[key] = ''
+            continue
+        if estimate_tokens(text) > remaining:
+            text = _truncate_text(text, remaining)
+        fields[key] = text
+        remaining -= estimate_tokens(text)
+
+    return fields
+
+
+def _truncate_text(text: str, budget_tokens: int) -> str:
+    """Truncate text to roughly budget_tokens, preferring a sentence or line boundary"""
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= budget_tokens:
+            low = mid
+        else:
+            high = mid - 1
+
+    cut = text[:low]
+    boundary = max(cut.rfind('\n'), cut.rfind('. '))
+    if boundary > len(cut) * 0.6:
+        cut = cut[:boundary + 1]
+    return cut.rstrip() + " …"
+
+
+def _strip_emoji_runs(line: str) -> str:
+    """Remove emoji and pictographic symbol runs from a line"""
+    return ''.join(
+        char for char in line
+        if not (unicodedata.category(char) == 'So' or _is_emoji_modifier(char))
+    )
+
+
+def _is_emoji_modifier(char: str) -> bool:
+    """Check for variation selectors, zero-width joiners and skin tone modifiers"""
+    code = ord(char)
+    return 0xFE00 <= code <= 0xFE0F or code == 0x200D or 0x1F3FB <= code <= 0x1F3FF
+
+
+def _normalize(text: str) -> str:
+    """Normalize text for duplicate detection"""
+    return re.sub(r'[\W_]+', ' ', (text or '').lower()).strip()
+
+
+def _drop_lines(text: str, normalized_lines: set) -> str:
+    """Remove lines whose normalized form is in normalized_lines"""
+    if not text or not normalized_lines:
+        return text
+    return "\n".join(line for line in text.splitlines() if _normalize(line) not in normalized_lines)
+
+
+class ProfilePrefixCache:
+    """Bounded, thread-safe memo of the static prompt prefix per user profile"""
+
+    def __init__(self, max_entries: int = 256):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, profile) -> Dict[str, str]:
+        """
+        Get the memoized prompt prefix for a profile
+
+        Args:
+            profile: UserProfile dataclass or profile dictionary
+
+        Returns:
+            Dictionary with 'hash', 'system' and 'profile' prompt blocks and
+            the prefix size in 'tokens'
+        """
+        profile_hash = hash_profile(profile)
+        with self._lock:
+            prefix = self._entries.get(profile_hash)
+            if prefix is not None:
+                self._entries.move_to_end(profile_hash)
+                self.hits += 1
+                return prefix
+            self.misses += 1
+
+        profile_block = build_profile_block(profile)
+        prefix = {
+            'hash': profile_hash,
+            'system': ANALYSIS_INSTRUCTIONS,
+            'profile': profile_block,
+            'tokens': estimate_tokens(ANALYSIS_INSTRUCTIONS) + estimate_tokens(profile_block)
+        }
+        with self._lock:
+            self._entries[profile_hash] = prefix
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return prefix
+
+    def stats(self) -> Dict[str, int]:
+        """Get memo counters, the largest prefix size and how many prefixes reach PROVIDER_CACHE_MIN_TOKENS"""
+        with self._lock:
+            sizes = [prefix['tokens'] for prefix in self._entries.values()]
+            return {
+                'entries': len(sizes),
+                'hits': self.hits,
+                'misses': self.misses,
+                'max_prefix_tokens': max(sizes, default=0),
+                'provider_cache_min_tokens': PROVIDER_CACHE_MIN_TOKENS,
+                'provider_cacheable': sum(1 for size in sizes if size >= PROVIDER_CACHE_MIN_TOKENS)
+            }
+
+
+def hash_profile(profile) -> str:
+    """Stable hash of a user profile, used as the prompt prefix cache key"""
+    data = asdict(profile) if is_dataclass(profile) else dict(profile)
+    encoded = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def build_profile_block(profile) -> str:
+    """Build the per-profile prompt block from a UserProfile"""
+    return f"""USER PROFILE:
+{profile.name} is a {profile.domain} professional with {profile.experience} year of industry experience.
+- Name: {profile.name}
+- Experience: {profile.experience} year
+- Domain: {profile.domain}
+- Skills: {', '.join(profile.skills)}
+- Preferred Roles: {', '.join(profile.preferred_roles)}
+- Preferred Work Type: {', '.join(profile.preferred_work_type)}
+- Excluded Roles: {', '.join(profile.excluded_roles)}
+- Preferred Company Types: {', '.join(profile.preferred_company_types)}"""
+
+
+def build_analysis_messages(job_content: str, profile, prefix_cache: Optional[ProfilePrefixCache] = None) -> list:
+    """
+    Assemble chat messages as static instructions, profile block, then job content
+
+    Args:
+        job_content: Job content text for the end of the prompt
+        profile: UserProfile dataclass
+        prefix_cache: Prefix cache to use, defaults to the global cache
+
+    Returns:
+        List of chat messages
+    """
+    prefix = (prefix_cache or get_profile_prefix_cache()).get(profile)
+    return [
+        {"role": "system", "content": prefix['system']},
+        {"role": "user", "content": f"{prefix['profile']}\n\nJOB POST CONTENT:\n{job_content}"}
+    ]
+
+
+def build_classification_messages(job_content: str, profile, prefix_cache: Optional[ProfilePrefixCache] = None) -> list:
+    """
+    Assemble chat messages for the classification stage
+
+    Uses the same memoized profile block as the analysis prompt, behind the
+    shorter classification instructions
+    """
+    prefix = (prefix_cache or get_profile_prefix_cache()).get(profile)
+    return [
+        {"role": "system", "content": CLASSIFY_INSTRUCTIONS},
+        {"role": "user", "content": f"{prefix['profile']}\n\nJOB POST CONTENT:\n{job_content}"}
+    ]
+
+
+# Global prefix cache instance
+_profile_prefix_cache = None
+_profile_prefix_cache_lock = threading.Lock()
+
+def get_profile_prefix_cache() -> ProfilePrefixCache:
+    """Get or create the global profile prefix cache"""
+    global _profile_prefix_cache
+    if _profile_prefix_cache is None:
+        with _profile_prefix_cache_lock:
+            if _profile_prefix_cache is None:
+                _profile_prefix_cache = ProfilePrefixCache()
+    return _profile_prefix_cache
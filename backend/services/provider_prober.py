@@ -0,0 +1,226 @@
+"""
+Background provider health prober
+Periodically sends a minimal completion to each configured provider/model and
+keeps a rolling latency and availability record in memory
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+from utils.env_manager import getenv_bool, getenv_int, getenv_float
+from utils.deadline import deadline_scope
+from services.ai_client import create_ai_client, chat_completion
+from services.ai_metrics import percentile
+from services.model_routing import CONNECTION_TEST, PRE_FILTER, EMAIL_GENERATION
+from services.scheduler import priority_scope, BACKGROUND
+
+
+class ProviderProber:
+    """
+    Pings every stored provider on a background thread
+
+    Probes go through chat_completion(), so they feed the circuit breakers
+    (and act as the half-open probe once a circuit's open period ends). As
+    connection-test calls they are kept out of the latency samples used for
+    hedging and the completion-size average used for rate limiting; their
+    own latency history is kept here. The thread is started lazily from
+    the first request in each process, so gunicorn workers forked from a
+    preloaded app each run their own prober.
+    """
+
+    def __init__(self, interval: float = None, history: int = None, timeout: float = None):
+        self.interval = interval or getenv_float('PROBER_INTERVAL_SECONDS', 60.0)
+        self.history = history or getenv_int('PROBER_HISTORY', 20)
+        self.timeout = timeout or getenv_float('PROBER_TIMEOUT_SECONDS', 10.0)
+        self.enabled = getenv_bool('PROBER_ENABLED', True)
+
+        self._lock = threading.Lock()
+        self._records = {}  # (provider, key_hash, model) -> deque of probe results
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+    def ensure_started(self):
+        """Start the probe thread in this process if it isn't running"""
+        if not self.enabled:
+            return
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            # A thread object inherited across fork is not running in this process
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='provider-prober', daemon=True)
+            self._thread.start()
+            print(f"🩺 Provider prober started (every {self.interval:.0f}s, pid {self._pid})")
+
+    def stop(self):
+        """Stop the probe thread"""
+        self._stop.set()
+
+    def _run(self):
+        # Spread the first probe so workers don't all fire at once
+        if self._stop.wait(random.uniform(0, min(5.0, self.interval))):
+            return
+        while not self._stop.is_set():
+            try:
+                self.probe_all()
+            except Exception as e:
+                print(f"Provider probe cycle failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def get_probe_targets(self) -> List[Dict[str, Any]]:
+        """Get one config per stored provider and distinct model the app routes to"""
+        from services.ai_settings import get_ai_settings_service
+
+        service = get_ai_settings_service()
+        targets = []
+        seen = set()
+        for stage in (CONNECTION_TEST, PRE_FILTER, EMAIL_GENERATION):
+            for config in service.get_provider_configs(stage):
+                key = (config['provider'], config.get('model'))
+                if config.get('model') and key not in seen:
+                    seen.add(key)
+                    targets.append(config)
+        return targets
+
+    def probe_all(self):
+        """Probe every target once"""
+        clients = {}
+        for target in self.get_probe_targets():
+            if self._stop.is_set():
+                return
+            provider = target['provider']
+            if provider not in clients:
+                clients[provider] = create_ai_client(provider, target['api_key'], target.get('base_url'))
+            if clients[provider]:
+                self.probe(clients[provider], provider, target['api_key'], target['model'])
+
+    def probe(self, client, provider: str, api_key: str, model: str) -> Dict[str, Any]:
+        """
+        Send one minimal completion and record the outcome
+
+        Returns:
+            The recorded probe result
+        """
+        start_time = time.monotonic()
+        try:
+            with priority_scope(BACKGROUND), deadline_scope(self.timeout):
+                chat_completion(
+                    client,
+                    provider,
+                    stage=CONNECTION_TEST,
+                    model=model,
+                    messages=[{"role": "user", "content": "ping"}],
+                    max_tokens=1
+                )
+            result = {'success': True, 'error': None}
+        except Exception as e:
+            result = {'success': False, 'error': str(e)[:200]}
+
+        result['latency'] = round(time.monotonic() - start_time, 4)
+        result['checked_at'] = time.time()
+        key = (provider, hash_api_key(api_key), model)
+        with self._lock:
+            self._records.setdefault(key, deque(maxlen=self.history)).append(result)
+        return result
+
+    def get_cached_result(self, provider: str, api_key: str, model: str, max_age: float = None) -> Optional[Dict[str, Any]]:
+        """
+        Get a connection test result from the latest probe, if it is recent
+
+        Args:
+            provider: Provider name
+            api_key: API key being tested (only probes with this key count)
+            model: Model being tested
+            max_age: Oldest acceptable probe in seconds (default: two intervals)
+
+        Returns:
+            test_connection()-style result, or None without a fresh probe
+        """
+        max_age = max_age or self.interval * 2
+        with self._lock:
+            records = self._records.get((provider, hash_api_key(api_key), model))
+            latest = records[-1] if records else None
+        if latest is None or time.time() - latest['checked_at'] > max_age:
+            return None
+
+        result = {
+            'success': latest['success'],
+            'model': model,
+            'cached': True,
+            'latency': latest['latency'],
+            'checked_at': latest['checked_at']
+        }
+        if not latest['success']:
+            result['error'] = latest['error']
+        return result
+
+    def is_available(self, provider: str) -> Optional[bool]:
+        """
+        Check whether recent probes reached a provider
+
+        Returns:
+            False if every fresh probe of the provider failed, True if any
+            succeeded, None if there are no fresh probes
+        """
+        cutoff = time.time() - self.interval * 2
+        outcomes = []
+        with self._lock:
+            for (record_provider, _, _), records in self._records.items():
+                if record_provider == provider and records and records[-1]['checked_at'] >= cutoff:
+                    outcomes.append(records[-1]['success'])
+        if not outcomes:
+            return None
+        return any(outcomes)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get rolling availability and latency per provider/model"""
+        with self._lock:
+            snapshot = {key: list(records) for key, records in self._records.items()}
+
+        status = {}
+        for (provider, _, model), records in snapshot.items():
+            latencies = [record['latency'] for record in records if record['success']]
+            latest = records[-1]
+            status[f"{provider}/{model}"] = {
+                'probes': len(records),
+                'available': latest['success'],
+                'availability': round(sum(1 for record in records if record['success']) / len(records), 4),
+                'latency_p50': round(percentile(latencies, 50), 4) if latencies else None,
+                'latency_p95': round(percentile(latencies, 95), 4) if latencies else None,
+                'last_checked': latest['checked_at'],
+                'last_error': latest['error']
+            }
+        return {
+            'enabled': self.enabled,
+            'running': self._thread is not None and self._pid == os.getpid() and self._thread.is_alive(),
+            'interval_seconds': self.interval,
+            'providers': status
+        }
+
+
+def hash_api_key(api_key: Optional[str]) -> str:
+    """Short hash identifying an API key without keeping the key itself"""
+    return hashlib.sha256((api_key or '').encode()).hexdigest()[:16]
+
+
+# Global prober instance
+_provider_prober = None
+_provider_prober_lock = threading.Lock()
+
+def get_provider_prober() -> ProviderProber:
+    """Get or create the global provider prober"""
+    global _provider_prober
+    if _provider_prober is None:
+        with _provider_prober_lock:
+            if _provider_prober is None:
+                _provider_prober = ProviderProber()
+    return _provider_prober
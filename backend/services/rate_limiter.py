@@ -0,0 +1,273 @@
+"""
+Shared provider rate limiter
+Token buckets for requests/minute and tokens/minute per provider and API key,
+stored in SQLite so every gunicorn worker draws from the same budget
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from utils.env_manager import getenv, getenv_int, getenv_float
+from utils.deadline import remaining_time
+from services.ai_metrics import get_ai_metrics
+
+# Default limits per provider (requests/minute, tokens/minute)
+DEFAULT_RATE_LIMITS = {
+    'openai': {'requests_per_minute': 500, 'tokens_per_minute': 200000},
+    'groq': {'requests_per_minute': 30, 'tokens_per_minute': 6000}
+}
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call would have to wait longer than allowed for rate budget"""
+
+    def __init__(self, provider: str, wait_seconds: float):
+        self.provider = provider
+        self.wait_seconds = wait_seconds
+        super().__init__(f"Rate limit budget for {provider} exhausted, next slot in {wait_seconds:.1f}s")
+
+
+class ProviderRateLimiter:
+    """
+    Token-bucket rate limiter backed by a local SQLite database
+
+    Each (provider, API key) pair has a request bucket and a token bucket that
+    refill continuously at limit/60 per second up to the per-minute limit.
+    Limits are per API key, as providers enforce them: two keys for the same
+    provider each get the full limit. Calls are charged an estimate up front
+    and settled with adjust_tokens() once the actual usage is known.
+    Buckets are updated inside BEGIN IMMEDIATE transactions, so concurrent
+    workers see a single consistent budget. Callers queue briefly for budget
+    instead of failing.
+    """
+
+    def __init__(self, db_path: str = None, max_wait: float = None):
+        self.db_path = db_path or getenv('RATE_LIMIT_DB') or os.path.join(tempfile.gettempdir(), 'job_assistant_rate_limits.sqlite3')
+        self.max_wait = max_wait if max_wait is not None else getenv_float('RATE_LIMIT_MAX_WAIT_SECONDS', 5.0)
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's database connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS buckets ('
+                        'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+                    )
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, provider: str, api_key: str, tokens: int = 0, limits: Optional[Dict[str, Any]] = None) -> float:
+        """
+        Wait for request and token budget, then consume it
+
+        Args:
+            provider: Provider name
+            api_key: API key the call will use (buckets are per key)
+            tokens: Estimated tokens for the call (prompt + expected completion)
+            limits: Optional requests_per_minute / tokens_per_minute overrides
+
+        Returns:
+            Seconds spent waiting for budget
+
+        Raises:
+            RateLimitExceeded: If budget won't be available within the wait limit or request deadline
+        """
+        limits = get_rate_limits(provider, limits)
+        bucket_key = self._bucket_key(provider, api_key)
+
+        start_time = time.monotonic()
+        queued = False
+        while True:
+            wait = self._try_acquire(bucket_key, limits, tokens)
+            waited = time.monotonic() - start_time
+            if self._settle(provider, wait, waited, queued):
+                return waited
+            queued = True
+            time.sleep(min(wait, 0.25))
+
+    async def acquire_async(self, provider: str, api_key: str, tokens: int = 0,
+                            limits: Optional[Dict[str, Any]] = None) -> float:
+        """
+        Wait for request and token budget from an asyncio task
+
+        Same as acquire(), but the SQLite update runs on a worker thread and
+        the wait for budget doesn't block the event loop
+
+        Returns:
+            Seconds spent waiting for budget
+        """
+        limits = get_rate_limits(provider, limits)
+        bucket_key = self._bucket_key(provider, api_key)
+
+        start_time = time.monotonic()
+        queued = False
+        while True:
+            wait = await asyncio.to_thread(self._try_acquire, bucket_key, limits, tokens)
+            waited = time.monotonic() - start_time
+            if self._settle(provider, wait, waited, queued):
+                return waited
+            queued = True
+            await asyncio.sleep(min(wait, 0.25))
+
+    @staticmethod
+    def _bucket_key(provider: str, api_key: str) -> str:
+        return f"{provider}:{hashlib.sha256((api_key or '').encode()).hexdigest()[:16]}"
+
+    def _settle(self, provider: str, wait: float, waited: float, queued: bool) -> bool:
+        """
+        Decide whether an acquire attempt is done
+
+        Returns:
+            True if budget was taken, False if the caller should wait and retry
+
+        Raises:
+            RateLimitExceeded: If budget won't be available within the wait limit or request deadline
+        """
+        metrics = get_ai_metrics()
+        if wait <= 0:
+            metrics.increment('rate_limiter', provider, 'acquired')
+            if queued:
+                metrics.increment('rate_limiter', provider, 'queued')
+            metrics.observe('rate_limiter', provider, 'wait_seconds', round(waited, 4))
+            return True
+
+        max_wait = self.max_wait
+        remaining = remaining_time()
+        if remaining is not None:
+            max_wait = min(max_wait, remaining - 1.0)
+        if waited + wait > max_wait:
+            metrics.increment('rate_limiter', provider, 'rejected')
+            raise RateLimitExceeded(provider, wait)
+        return False
+
+    def adjust_tokens(self, provider: str, api_key: str, delta: int, limits: Optional[Dict[str, Any]] = None):
+        """
+        Correct the token bucket once actual usage is known
+
+        Args:
+            provider: Provider name
+            api_key: API key used
+            delta: Estimated minus actual tokens (positive returns budget)
+            limits: Optional limit overrides
+        """
+        if not delta:
+            return
+        limits = get_rate_limits(provider, limits)
+        bucket_key = self._bucket_key(provider, api_key)
+        capacity = limits['tokens_per_minute']
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                level = self._refill(conn, f"{bucket_key}:tpm", capacity, now)
+                level = min(capacity, level + delta)
+                conn.execute('UPDATE buckets SET tokens = ?, updated_at = ? WHERE key = ?', (level, now, f"{bucket_key}:tpm"))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            print(f"Warning: rate limiter token adjustment failed: {e}")
+
+    def _try_acquire(self, bucket_key: str, limits: Dict[str, Any], tokens: int) -> float:
+        """
+        Try to take one request and `tokens` tokens
+
+        Returns:
+            0 if acquired, otherwise seconds until enough budget is expected
+        """
+        rpm = limits['requests_per_minute']
+        tpm = limits['tokens_per_minute']
+        # A single call larger than the whole bucket can only ever take a full bucket
+        tokens = min(tokens, tpm)
+
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.Error as e:
+            # Never block provider calls because the shared store is unavailable
+            print(f"Warning: rate limiter unavailable, allowing call: {e}")
+            return 0
+
+        try:
+            now = time.time()
+            requests_level = self._refill(conn, f"{bucket_key}:rpm", rpm, now)
+            tokens_level = self._refill(conn, f"{bucket_key}:tpm", tpm, now)
+
+            if requests_level >= 1 and tokens_level >= tokens:
+                requests_level -= 1
+                tokens_level -= tokens
+                wait = 0.0
+            else:
+                wait = max(
+                    (1 - requests_level) / (rpm / 60.0) if requests_level < 1 else 0.0,
+                    (tokens - tokens_level) / (tpm / 60.0) if tokens_level < tokens else 0.0
+                )
+
+            conn.executemany(
+                'INSERT INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at',
+                [(f"{bucket_key}:rpm", requests_level, now), (f"{bucket_key}:tpm", tokens_level, now)]
+            )
+            conn.execute('COMMIT')
+            return wait
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _refill(self, conn: sqlite3.Connection, key: str, capacity: float, now: float) -> float:
+        """Get a bucket's level after refilling for the time since its last update"""
+        row = conn.execute('SELECT tokens, updated_at FROM buckets WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return float(capacity)
+        level, updated_at = row
+        return min(float(capacity), level + max(0.0, now - updated_at) * capacity / 60.0)
+
+
+def get_rate_limits(provider: str, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Get the requests/minute and tokens/minute limits for a provider
+
+    Environment variables (<PROVIDER>_RPM, <PROVIDER>_TPM) override the
+    defaults, and per-provider AI settings override both
+    """
+    defaults = DEFAULT_RATE_LIMITS.get(provider, {'requests_per_minute': 60, 'tokens_per_minute': 60000})
+    prefix = (provider or 'provider').upper()
+    limits = {
+        'requests_per_minute': getenv_int(f'{prefix}_RPM', defaults['requests_per_minute']),
+        'tokens_per_minute': getenv_int(f'{prefix}_TPM', defaults['tokens_per_minute'])
+    }
+    for key, value in (overrides or {}).items():
+        if key in limits and value:
+            limits[key] = value
+    return limits
+
+
+# Global rate limiter instance
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> ProviderRateLimiter:
+    """Get or create the global provider rate limiter"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = ProviderRateLimiter()
+    return _rate_limiter
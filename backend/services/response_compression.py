@@ -0,0 +1,254 @@
+"""
+Response compression
+Negotiates gzip or brotli for JSON and NDJSON responses above a size threshold
+(streamed responses chunk by chunk) and counts the bytes each endpoint puts on
+the wire
+"""
+
+import gzip
+import threading
+import zlib
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple
+
+from utils.env_manager import getenv_bool, getenv_int
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+COMPRESSION_ENABLED = getenv_bool('COMPRESSION_ENABLED', True)
+# Smaller bodies fit in a packet or two either way; not worth the CPU
+COMPRESSION_MIN_BYTES = getenv_int('COMPRESSION_MIN_BYTES', 1024)
+COMPRESSION_GZIP_LEVEL = getenv_int('COMPRESSION_GZIP_LEVEL', 6)
+COMPRESSION_BROTLI_QUALITY = getenv_int('COMPRESSION_BROTLI_QUALITY', 5)
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson')
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick the content coding for a response from the request's Accept-Encoding
+
+    Args:
+        accept_encoding: Accept-Encoding header value
+
+    Returns:
+        'br' (when brotli is installed) or 'gzip', whichever the client
+        weights highest (br on a tie), or None to send the body as is
+    """
+    if not COMPRESSION_ENABLED or not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        weight = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in (('br',) if BROTLI_AVAILABLE else ()) + ('gzip',):
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    """Compress a complete body with 'br' or 'gzip'"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def encode_body(body: bytes, accept_encoding: Optional[str], endpoint: str) -> Tuple[bytes, Optional[str]]:
+    """
+    Compress a JSON body for the wire if the client accepts it and it is large enough
+
+    Args:
+        body: Serialized response body
+        accept_encoding: Request's Accept-Encoding header value
+        endpoint: Endpoint name the bytes are counted under
+
+    Returns:
+        (body to send, Content-Encoding or None)
+    """
+    encoding = choose_encoding(accept_encoding) if len(body) >= COMPRESSION_MIN_BYTES else None
+    wire = compress_body(body, encoding) if encoding else body
+    get_transfer_stats().record(endpoint, len(body), len(wire), encoding)
+    return wire, encoding
+
+
+class StreamCompressor:
+    """Compresses a body chunk by chunk, flushing each chunk so streamed lines reach the client as they are produced"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            # wbits 31: zlib stream with a gzip header and trailer
+            self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        """Compress a chunk and flush it"""
+        if self.encoding == 'br':
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        """End the stream"""
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def encode_stream(chunks: Iterable, encoding: Optional[str], endpoint: str) -> Iterator[bytes]:
+    """
+    Compress (when encoding is set) and count a streamed body
+
+    Args:
+        chunks: Body iterable of str or bytes chunks; closed when the stream ends
+        encoding: 'br', 'gzip' or None to pass chunks through
+        endpoint: Endpoint name the bytes are counted under
+    """
+    compressor = StreamCompressor(encoding) if encoding else None
+    body_bytes = wire_bytes = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            body_bytes += len(chunk)
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                wire_bytes += len(chunk)
+                yield chunk
+        if compressor:
+            tail = compressor.finish()
+            wire_bytes += len(tail)
+            yield tail
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+        get_transfer_stats().record(endpoint, body_bytes, wire_bytes, encoding)
+
+
+def compress_response(response, accept_encoding: Optional[str], endpoint: str):
+    """
+    Compress a Flask response for the wire where the client accepts it, counting its bytes
+
+    JSON and NDJSON bodies are compressed, streamed ones chunk by chunk; other
+    responses (files, HTML) are only counted.
+
+    Args:
+        response: Flask response from an after_request hook
+        accept_encoding: Request's Accept-Encoding header value
+        endpoint: Endpoint name the bytes are counted under
+
+    Returns:
+        The response
+    """
+    compressible = (response.mimetype in COMPRESSIBLE_MIMETYPES and 'Content-Encoding' not in response.headers
+                    and response.status_code not in (204, 304))
+    if compressible:
+        response.vary.add('Accept-Encoding')
+
+    if response.direct_passthrough:
+        # Files are handed straight to the server; count them without reading
+        get_transfer_stats().record(endpoint, response.content_length or 0, response.content_length or 0, None)
+        return response
+
+    if response.is_streamed:
+        encoding = choose_encoding(accept_encoding) if compressible else None
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+            response.headers.pop('Content-Length', None)
+        response.response = encode_stream(response.response, encoding, endpoint)
+        return response
+
+    if not compressible:
+        body = response.get_data()
+        get_transfer_stats().record(endpoint, len(body), len(body), None)
+        return response
+
+    body, encoding = encode_body(response.get_data(), accept_encoding, endpoint)
+    if encoding:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class TransferStats:
+    """Thread-safe per-endpoint counts of response body bytes before and after compression"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint: str, body_bytes: int, wire_bytes: int, encoding: Optional[str] = None):
+        """
+        Count one response
+
+        Args:
+            endpoint: Endpoint name
+            body_bytes: Body size before compression
+            wire_bytes: Body size as sent
+            encoding: Content coding used, if any
+        """
+        with self._lock:
+            counts = self._endpoints.setdefault(endpoint, {
+                'responses': 0, 'compressed': 0, 'body_bytes': 0, 'wire_bytes': 0, 'encodings': {}
+            })
+            counts['responses'] += 1
+            counts['body_bytes'] += body_bytes
+            counts['wire_bytes'] += wire_bytes
+            if encoding:
+                counts['compressed'] += 1
+                counts['encodings'][encoding] = counts['encodings'].get(encoding, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Get per-endpoint byte counts and the share of body bytes compression saved"""
+        with self._lock:
+            endpoints = {}
+            for endpoint, counts in sorted(self._endpoints.items()):
+                entry = dict(counts, encodings=dict(counts['encodings']))
+                entry['saved_ratio'] = (round(1 - counts['wire_bytes'] / counts['body_bytes'], 3)
+                                        if counts['body_bytes'] else 0.0)
+                endpoints[endpoint] = entry
+            return endpoints
+
+
+# Global transfer stats instance
+_transfer_stats = None
+_transfer_stats_lock = threading.Lock()
+
+
+def get_transfer_stats() -> TransferStats:
+    """Get or create the global transfer stats instance"""
+    global _transfer_stats
+    if _transfer_stats is None:
+        with _transfer_stats_lock:
+            if _transfer_stats is None:
+                _transfer_stats = TransferStats()
+    return _transfer_stats
+
+
+def get_compression_config() -> Dict[str, Any]:
+    """Get the active compression settings"""
+    return {
+        'enabled': COMPRESSION_ENABLED,
+        'min_bytes': COMPRESSION_MIN_BYTES,
+        'gzip_level': COMPRESSION_GZIP_LEVEL,
+        'brotli_quality': COMPRESSION_BROTLI_QUALITY,
+        'brotli_available': BROTLI_AVAILABLE
+    }
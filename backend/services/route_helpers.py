@@ -0,0 +1,140 @@
+"""
+Route helpers
+Request validation and response bodies shared by the Flask routes (app.py)
+and the native ASGI handlers (asgi.py), so both entry points answer the same
+request the same way and differ only in how they wait on I/O
+"""
+
+import os
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+
+from services.job_prefilter import parse_response_options
+
+
+def health_status() -> Dict[str, Any]:
+    """Get the health check response body"""
+    return {
+        'status': 'running',
+        'service': 'LinkedIn Job Assistant API',
+        'version': '1.0.0',
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+def server_error(message: str, error: Exception, debug: bool) -> Dict[str, Any]:
+    """Get a 500 response body (the exception text is only included in debug mode)"""
+    return {
+        'error': message,
+        'details': str(error) if debug else None
+    }
+
+
+def parse_analyze_request(data: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any], Optional[str]]:
+    """
+    Validate an /api/analyze-job request body
+
+    Returns:
+        (job_data, user_profile, error message or None)
+    """
+    if not data:
+        return {}, {}, 'No data provided'
+
+    job_data = data.get('job_data', {})
+    user_profile = data.get('user_profile', {})
+
+    if not job_data:
+        return job_data, user_profile, 'Job data is required'
+    return job_data, user_profile, None
+
+
+def parse_prefilter_request(data: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Validate an /api/pre-filter-jobs request body
+
+    Returns:
+        ({'jobs', 'user_profile', 'response_mode', 'fields'}, error message or None)
+    """
+    if not data:
+        return {}, 'No data provided'
+
+    jobs = data.get('jobs', [])
+    if not jobs:
+        return {}, 'Jobs array is required'
+
+    # 'ids' returns indices, scores and labels instead of echoing the jobs back
+    response_mode, fields, options_error = parse_response_options(data)
+    if options_error:
+        return {}, options_error
+
+    return {
+        'jobs': jobs,
+        'user_profile': data.get('user_profile', {}),
+        'response_mode': response_mode,
+        'fields': fields
+    }, None
+
+
+def parse_send_request(data: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Validate an /api/send-email request body
+
+    Returns:
+        ({'to_email', 'subject', 'body', 'attachment_path'}, error message or None)
+    """
+    if not data:
+        return {}, 'No data provided'
+
+    to_email = data.get('email')
+    subject = data.get('subject')
+    body = data.get('body')
+
+    if not all([to_email, subject, body]):
+        return {}, 'Email, subject, and body are required'
+
+    # Check for resume attachment
+    attachment_path = data.get('resume_path') or None
+    if attachment_path and not os.path.exists(attachment_path):
+        return {}, 'Resume file not found'
+
+    return {
+        'to_email': to_email,
+        'subject': subject,
+        'body': body,
+        'attachment_path': attachment_path
+    }, None
+
+
+def queued_send_response(record: Dict[str, Any], to_email: str) -> Tuple[Dict[str, Any], int]:
+    """
+    Build the response for a send accepted into the outbox
+
+    Returns:
+        (response body, status: 202 for a new message, 200 for a duplicate)
+    """
+    return {
+        'success': True,
+        'message': f"Email to {to_email} {'already ' if record['duplicate'] else ''}queued for delivery",
+        'id': record['id'],
+        'status': record['status'],
+        'duplicate': record['duplicate'],
+        'status_url': f"/api/email-status/{record['id']}"
+    }, 200 if record['duplicate'] else 202
+
+
+def duplicate_send_response(record: Dict[str, Any], to_email: str) -> Dict[str, Any]:
+    """Build the response for an inline send already sent (or being sent) under the same idempotency key"""
+    return {
+        'success': True,
+        'message': f'Email already sent to {to_email}' if record['status'] == 'sent'
+        else f'Email to {to_email} is already being sent',
+        'id': record['id'],
+        'status': record['status'],
+        'duplicate': True
+    }
+
+
+def sent_response(result: Dict[str, Any], record: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the outbox record of an inline send to the email service's result"""
+    result.update({'id': record['id'], 'duplicate': False})
+    return result
@@ -0,0 +1,264 @@
+"""
+Provider call scheduler
+Limits concurrent provider calls per worker and hands free slots out by
+priority class with weighted fair queuing, so interactive analysis isn't
+stuck behind bulk pre-filtering
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, Optional
+
+from utils.env_manager import getenv_int
+from utils.deadline import remaining_time, DeadlineExceeded
+from services.ai_metrics import get_ai_metrics
+
+INTERACTIVE = 'interactive'
+PREFILTER = 'prefilter'
+BACKGROUND = 'background'
+
+# Share of provider capacity each class gets while all of them are waiting
+DEFAULT_CLASS_WEIGHTS = {
+    INTERACTIVE: 8,
+    PREFILTER: 3,
+    BACKGROUND: 1
+}
+
+_current_priority = contextvars.ContextVar('provider_call_priority', default=INTERACTIVE)
+
+
+def get_priority() -> str:
+    """Get the priority class of the current request context"""
+    return _current_priority.get()
+
+
+def set_priority(priority_class: str) -> contextvars.Token:
+    """
+    Set the priority class for provider calls made in the current context
+
+    Returns:
+        Token to pass to reset_priority()
+    """
+    if priority_class not in DEFAULT_CLASS_WEIGHTS:
+        priority_class = BACKGROUND
+    return _current_priority.set(priority_class)
+
+
+def reset_priority(token: contextvars.Token):
+    """Restore the priority class that was active before set_priority()"""
+    _current_priority.reset(token)
+
+
+@contextmanager
+def priority_scope(priority_class: str):
+    """Context manager that applies a priority class to the enclosed block"""
+    token = set_priority(priority_class)
+    try:
+        yield
+    finally:
+        reset_priority(token)
+
+
+class _Waiter:
+    """A queued call waiting for a slot, from a thread or (with a loop) an asyncio task"""
+
+    def __init__(self, priority_class: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority_class = priority_class
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+        self.woken = False
+        self.cancelled = False
+
+    def wake(self):
+        """Hand this waiter its slot (called with the scheduler lock held)"""
+        self.woken = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class ProviderCallScheduler:
+    """
+    Weighted fair queue in front of provider calls
+
+    At most max_concurrency calls run at once. When calls have to queue, each
+    one gets a virtual finish tag of max(virtual clock, class's last tag) +
+    1/weight, and freed slots go to the smallest tag. A busy class therefore
+    gets capacity in proportion to its weight without starving the others.
+    Threads and asyncio tasks (async_slot) queue for the same slots.
+    """
+
+    def __init__(self, max_concurrency: int = None, weights: Optional[Dict[str, int]] = None):
+        self.max_concurrency = max_concurrency or getenv_int('SCHEDULER_MAX_CONCURRENCY', 4)
+        self.weights = dict(DEFAULT_CLASS_WEIGHTS)
+        for priority_class in self.weights:
+            self.weights[priority_class] = getenv_int(f'SCHEDULER_WEIGHT_{priority_class.upper()}', self.weights[priority_class])
+        self.weights.update(weights or {})
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queue = []  # (finish_tag, sequence, waiter)
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._last_tag = {priority_class: 0.0 for priority_class in self.weights}
+        self._depth = {priority_class: 0 for priority_class in self.weights}
+        self._running = {priority_class: 0 for priority_class in self.weights}
+
+    @contextmanager
+    def slot(self, priority_class: str = None):
+        """
+        Hold a provider call slot for the enclosed block
+
+        Args:
+            priority_class: Class to queue under (defaults to the context's class)
+
+        Raises:
+            DeadlineExceeded: If the request deadline passes while queued
+        """
+        priority_class = priority_class or get_priority()
+        self.acquire(priority_class)
+        try:
+            yield
+        finally:
+            self.release(priority_class)
+
+    @asynccontextmanager
+    async def async_slot(self, priority_class: str = None):
+        """Hold a provider call slot for the enclosed async block, queuing without blocking the event loop"""
+        priority_class = priority_class or get_priority()
+        await self.acquire_async(priority_class)
+        try:
+            yield
+        finally:
+            self.release(priority_class)
+
+    def acquire(self, priority_class: str):
+        """Wait for a slot in the given class, bounded by the request deadline"""
+        start_time = time.monotonic()
+        waiter = self._enqueue(priority_class)
+        if waiter is not None and not waiter.event.wait(self._wait_timeout()):
+            self._expire(waiter)
+        self._record_dispatch(priority_class, start_time)
+
+    async def acquire_async(self, priority_class: str):
+        """Wait for a slot from an asyncio task, bounded by the request deadline"""
+        start_time = time.monotonic()
+        waiter = self._enqueue(priority_class, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self._wait_timeout())
+            except asyncio.TimeoutError:
+                self._expire(waiter)
+            except asyncio.CancelledError:
+                # The request went away while queued; give back a slot it was just handed
+                with self._lock:
+                    waiter.cancelled = not waiter.woken
+                    if waiter.cancelled:
+                        self._depth[priority_class] -= 1
+                if not waiter.cancelled:
+                    self.release(priority_class)
+                raise
+        self._record_dispatch(priority_class, start_time)
+
+    def _enqueue(self, priority_class: str, loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[_Waiter]:
+        """Take a free slot, or queue a waiter for the next one"""
+        with self._lock:
+            if self._in_flight < self.max_concurrency and not self._queue:
+                self._in_flight += 1
+                self._running[priority_class] += 1
+                return None
+            waiter = _Waiter(priority_class, loop)
+            tag = max(self._virtual_time, self._last_tag[priority_class]) + 1.0 / self.weights[priority_class]
+            self._last_tag[priority_class] = tag
+            heapq.heappush(self._queue, (tag, next(self._sequence), waiter))
+            self._depth[priority_class] += 1
+            return waiter
+
+    @staticmethod
+    def _wait_timeout() -> Optional[float]:
+        remaining = remaining_time()
+        return None if remaining is None else max(0.0, remaining - 1.0)
+
+    def _expire(self, waiter: _Waiter):
+        """
+        Give up on a queued waiter whose wait timed out
+
+        Raises:
+            DeadlineExceeded: Unless a slot was handed over in the meantime
+        """
+        with self._lock:
+            if not waiter.woken:
+                waiter.cancelled = True
+                self._depth[waiter.priority_class] -= 1
+        if waiter.cancelled:
+            get_ai_metrics().increment('scheduler', waiter.priority_class, 'expired')
+            raise DeadlineExceeded(f"Request deadline passed while queued for a {waiter.priority_class} provider slot")
+
+    def _record_dispatch(self, priority_class: str, start_time: float):
+        metrics = get_ai_metrics()
+        wait = time.monotonic() - start_time
+        metrics.increment('scheduler', priority_class, 'dispatched')
+        metrics.observe('scheduler', priority_class, 'wait_seconds', round(wait, 4))
+
+    def release(self, priority_class: str):
+        """Free a slot and hand it to the next queued call"""
+        with self._lock:
+            self._running[priority_class] -= 1
+            while self._queue:
+                tag, _, waiter = heapq.heappop(self._queue)
+                if waiter.cancelled:
+                    continue
+                self._virtual_time = tag
+                self._depth[waiter.priority_class] -= 1
+                self._running[waiter.priority_class] += 1
+                waiter.wake()
+                return
+            self._in_flight -= 1
+
+    def has_waiting(self) -> bool:
+        """Check whether any call is queued for a slot"""
+        with self._lock:
+            return any(depth > 0 for depth in self._depth.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Get current queue depth and running calls per class"""
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'in_flight': self._in_flight,
+                'classes': {
+                    priority_class: {
+                        'weight': self.weights[priority_class],
+                        'queued': self._depth[priority_class],
+                        'running': self._running[priority_class]
+                    }
+                    for priority_class in self.weights
+                }
+            }
+
+
+# Global scheduler instance
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_provider_scheduler() -> ProviderCallScheduler:
+    """Get or create the global provider call scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = ProviderCallScheduler()
+    return _scheduler
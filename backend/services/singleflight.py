@@ -0,0 +1,319 @@
+"""
+Singleflight coalescing for identical concurrent requests
+The first caller for a key does the work and later callers wait for its result,
+within a worker (threads or event loop tasks) and across gunicorn workers (lock files)
+"""
+
+import asyncio
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from utils.env_manager import getenv, getenv_float
+from utils.deadline import remaining_time
+from services.ai_metrics import get_ai_metrics
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+
+class _Call:
+    """An in-flight call that local followers wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key
+
+    In-process, followers wait on the leader's event. Across processes, the
+    leader holds an exclusive flock on <lock_dir>/<key>.lock while working and
+    writes its JSON result to <key>.json; followers in other workers block on
+    the lock and then read that result. Only a follower that was waiting while
+    the result was written reads it, so this is not a cache: a caller that
+    takes the lock straight away always does the work. Results hold profile
+    data, so the directory is private to this user (0700, files 0600).
+    """
+
+    def __init__(self, name: str, lock_dir: str = None, wait_timeout: float = None):
+        self.name = name
+        base_dir = lock_dir or getenv('SINGLEFLIGHT_DIR') or os.path.join(tempfile.gettempdir(), 'job_assistant_singleflight')
+        self.lock_dir = os.path.join(base_dir, name)
+        self.wait_timeout = wait_timeout if wait_timeout is not None else getenv_float('SINGLEFLIGHT_WAIT_TIMEOUT', 30.0)
+
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self._last_sweep = 0.0
+
+        self.cross_process = FCNTL_AVAILABLE
+        if self.cross_process:
+            try:
+                _make_private_dir(base_dir)
+                _make_private_dir(self.lock_dir)
+            except OSError as e:
+                print(f"Warning: singleflight lock directory unavailable, coalescing within this worker only: {e}")
+                self.cross_process = False
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers with the same key
+
+        Args:
+            key: Coalescing key (e.g. the analysis cache key)
+            fn: Zero-argument function returning a JSON-serializable result
+
+        Returns:
+            Tuple of (result, shared) where shared is True if another caller did the work
+        """
+        metrics = get_ai_metrics()
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            metrics.increment('singleflight', self.name, 'local_followers')
+            if call.event.wait(self._wait_budget()):
+                if call.error is not None:
+                    raise call.error
+                return copy.deepcopy(call.result), True
+            # Leader is taking too long; do the work ourselves
+            metrics.increment('singleflight', self.name, 'follower_timeouts')
+            return fn(), False
+
+        try:
+            if self.cross_process:
+                call.result, shared = self._do_cross_process(key, fn)
+            else:
+                call.result, shared = fn(), False
+            if not shared:
+                metrics.increment('singleflight', self.name, 'leaders')
+            return call.result, shared
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run the coroutine function fn once for all concurrent callers on the event loop
+
+        Followers await the leader's future instead of holding a thread. This
+        coalesces within the process only: an ASGI worker serves all of its
+        requests from one loop, so that is where duplicates meet.
+
+        Args:
+            key: Coalescing key (e.g. the analysis cache key)
+            fn: Zero-argument coroutine function returning the result
+
+        Returns:
+            Tuple of (result, shared) where shared is True if another caller did the work
+        """
+        metrics = get_ai_metrics()
+
+        future = self._async_calls.get(key)
+        if future is not None:
+            metrics.increment('singleflight', self.name, 'local_followers')
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), self._wait_budget())
+                return copy.deepcopy(result), True
+            except asyncio.TimeoutError:
+                # Leader is taking too long; do the work ourselves
+                metrics.increment('singleflight', self.name, 'follower_timeouts')
+                return await fn(), False
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader's request went away before finishing; do the work ourselves
+                return await fn(), False
+
+        future = asyncio.get_running_loop().create_future()
+        self._async_calls[key] = future
+        try:
+            result = await fn()
+            metrics.increment('singleflight', self.name, 'leaders')
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark it retrieved so a leader without followers doesn't log a warning
+            future.exception()
+            raise
+        finally:
+            self._async_calls.pop(key, None)
+
+    def _do_cross_process(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Coalesce with other worker processes through a lock file"""
+        lock_path = os.path.join(self.lock_dir, f"{key}.lock")
+        result_path = os.path.join(self.lock_dir, f"{key}.json")
+
+        waiting_since = time.time()
+        lock_fd, acquired, waited = self._lock_file(lock_path)
+        try:
+            if waited:
+                # Another worker was running this key; use its result
+                result = self._read_result(result_path, waiting_since)
+                if result is not None:
+                    return result, True
+                if not acquired:
+                    get_ai_metrics().increment('singleflight', self.name, 'follower_timeouts')
+
+            result = fn()
+            if acquired:
+                self._write_result(result_path, result)
+            return result, False
+        finally:
+            if acquired:
+                fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+            self._sweep()
+
+    def _lock_file(self, lock_path: str) -> Tuple[int, bool, bool]:
+        """
+        Open the lock file and take its exclusive lock, waiting within the wait budget if another worker holds it
+
+        Returns:
+            Tuple of (file descriptor, acquired, waited)
+        """
+        waited = False
+        give_up_at = None
+        while True:
+            lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (BlockingIOError, OSError):
+                if not waited:
+                    waited = True
+                    give_up_at = time.monotonic() + self._wait_budget()
+                    get_ai_metrics().increment('singleflight', self.name, 'worker_followers')
+                if time.monotonic() >= give_up_at:
+                    return lock_fd, False, waited
+                os.close(lock_fd)
+                time.sleep(0.05)
+                continue
+
+            # The sweep may have removed this file between open() and flock(); lock the current one instead
+            try:
+                if os.fstat(lock_fd).st_ino == os.stat(lock_path).st_ino:
+                    return lock_fd, True, waited
+            except OSError:
+                pass
+            os.close(lock_fd)
+
+    def _wait_budget(self) -> float:
+        """How long a follower may wait, bounded by the request deadline"""
+        remaining = remaining_time()
+        if remaining is None:
+            return self.wait_timeout
+        return max(0.0, min(self.wait_timeout, remaining - 1.0))
+
+    def _read_result(self, result_path: str, written_after: float) -> Optional[Any]:
+        """Read the result another worker wrote while this caller was waiting for it"""
+        try:
+            if os.path.getmtime(result_path) < written_after:
+                return None
+            with open(result_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_result(self, result_path: str, result: Any):
+        """Atomically write the result for followers in other workers"""
+        try:
+            tmp_path = f"{result_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            tmp_fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(tmp_fd, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            os.replace(tmp_path, result_path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Warning: could not share singleflight result: {e}")
+
+    def _sweep(self):
+        """Remove result files no follower can still be waiting for, and idle lock files, at most once a minute"""
+        now = time.time()
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        try:
+            for name in os.listdir(self.lock_dir):
+                path = os.path.join(self.lock_dir, name)
+                try:
+                    age = now - os.path.getmtime(path)
+                    if name.endswith('.json') and age > self.wait_timeout:
+                        os.remove(path)
+                    elif name.endswith('.tmp') and age > 60:
+                        os.remove(path)
+                    elif name.endswith('.lock') and age > 3600:
+                        self._remove_idle_lock(path)
+                except OSError:
+                    continue
+        except OSError:
+            pass
+
+    def _remove_idle_lock(self, path: str):
+        """
+        Delete a lock file only if nobody holds it
+
+        A worker that opened the file just before it was unlinked notices the
+        inode change after locking (see _lock_file()) and retries on a new file.
+        """
+        lock_fd = os.open(path, os.O_RDWR)
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (BlockingIOError, OSError):
+                return
+            os.remove(path)
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        finally:
+            os.close(lock_fd)
+
+
+def _make_private_dir(path: str):
+    """
+    Create a directory only this user can access, or tighten an existing one
+
+    Raises:
+        OSError: If the directory belongs to another user or can't be made private
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if info.st_uid != os.getuid():
+        raise PermissionError(f"{path} is owned by another user")
+    if info.st_mode & 0o077:
+        os.chmod(path, 0o700)
+
+
+# Global singleflight groups
+_singleflight_groups = {}
+_singleflight_lock = threading.Lock()
+
+def get_singleflight(name: str = 'analyze-job') -> SingleFlight:
+    """Get or create the singleflight group with the given name"""
+    with _singleflight_lock:
+        group = _singleflight_groups.get(name)
+        if group is None:
+            group = SingleFlight(name)
+            _singleflight_groups[name] = group
+        return group
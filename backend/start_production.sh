@@ -58,6 +58,8 @@ SMTP_PORT=587
 
 # Gunicorn Configuration (Production)
 GUNICORN_WORKERS=2
+# sync, gthread (GUNICORN_THREADS per worker) or gevent (pip install gevent)
+GUNICORN_WORKER_CLASS=sync
 GUNICORN_ACCESS_LOG=logs/access.log
 GUNICORN_ERROR_LOG=logs/error.log
 GUNICORN_LOG_LEVEL=info
@@ -105,7 +107,7 @@ pip install -r requirements.txt
 echo -e "${GREEN}🌟 Starting Gunicorn server...${NC}"
 echo -e "${YELLOW}Configuration:${NC}"
 echo -e "  - Config file: gunicorn.conf.py"
-echo -e "  - Workers: 2"
+echo -e "  - Workers: GUNICORN_WORKERS x GUNICORN_WORKER_CLASS (from .env)"
 echo -e "  - Port: 5000 (from .env)"
 echo -e "  - Debug: False"
 echo -e "  - Access log: logs/access.log"
@@ -0,0 +1,10 @@
+"""
+Shared pytest setup for the backend unit tests
+Run from the backend directory: python -m pytest tests
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
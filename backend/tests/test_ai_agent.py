@@ -0,0 +1,89 @@
+"""Tests for structured output selection (services/ai_agent.py)"""
+
+import asyncio
+
+import pytest
+
+from services import ai_agent
+from services.ai_agent import JobAnalysisAgent, AsyncJobAnalysisAgent
+
+
+class ProviderError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def make_agent(structured_output):
+    return JobAnalysisAgent(provider='openai', model='gpt-4o-mini', structured_output=structured_output)
+
+
+@pytest.mark.parametrize('setting', [None, 'auto', 'AUTO', '', True, 'true', 'on', '1'])
+def test_structured_output_enabled(setting):
+    assert make_agent(setting)._get_structured_output_mode() == 'json_schema'
+
+
+@pytest.mark.parametrize('setting', [False, 'false', 'False', 'off', ' Off ', '0', 0, 'no'])
+def test_structured_output_disabled(setting):
+    assert make_agent(setting)._get_structured_output_mode() == 'prompt'
+
+
+def test_response_format_error_requires_bad_request():
+    agent = make_agent('auto')
+    assert agent._is_response_format_error(ProviderError("'response_format' is not supported", 400))
+    assert not agent._is_response_format_error(ProviderError('response_format upstream timeout', 503))
+    assert not agent._is_response_format_error(ValueError('response_format'))
+    assert not agent._is_response_format_error(ProviderError('invalid api key', 400))
+
+
+CLASSIFICATION = '{"status": "NOT RELEVANT", "reason": "Frontend role", "contact": null}'
+
+
+def rejecting_completion(calls):
+    def create(messages, output_mode='prompt', schema=None, schema_name='job_analysis'):
+        calls.append(output_mode)
+        if output_mode != 'prompt':
+            raise ProviderError("'response_format' is not supported", 400)
+        return CLASSIFICATION
+    return create
+
+
+def test_classify_falls_back_to_prompt_json(monkeypatch):
+    monkeypatch.setattr(ai_agent, '_STRUCTURED_OUTPUT_UNSUPPORTED', set())
+    agent = make_agent('auto')
+    calls = []
+    monkeypatch.setattr(agent, '_create_completion', rejecting_completion(calls))
+
+    classification = agent._classify('Frontend developer', agent._parse_user_profile({}))
+    assert classification['status'] == 'NOT RELEVANT'
+    assert calls == ['json_schema', 'prompt']
+    assert agent._get_structured_output_mode() == 'prompt'
+
+
+def test_async_classify_falls_back_to_prompt_json(monkeypatch):
+    monkeypatch.setattr(ai_agent, '_STRUCTURED_OUTPUT_UNSUPPORTED', set())
+    calls = []
+
+    async def run():
+        agent = AsyncJobAnalysisAgent(provider='openai', model='gpt-4o-mini', structured_output='auto')
+        create = rejecting_completion(calls)
+
+        async def create_async(*args, **kwargs):
+            return create(*args, **kwargs)
+
+        monkeypatch.setattr(agent, '_create_completion_async', create_async)
+        classification = await agent._classify_async('Frontend developer', agent._parse_user_profile({}))
+        return agent, classification
+
+    agent, classification = asyncio.run(run())
+    assert classification['status'] == 'NOT RELEVANT'
+    assert calls == ['json_schema', 'prompt']
+    assert agent._get_structured_output_mode() == 'prompt'
+
+
+def test_other_provider_errors_are_not_retried():
+    agent = make_agent('auto')
+    error = ProviderError('invalid api key', 401)
+    with pytest.raises(ProviderError):
+        agent._disable_structured_output(error, 'json_schema')
+    assert agent._get_structured_output_mode() == 'json_schema'
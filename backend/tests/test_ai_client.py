@@ -0,0 +1,160 @@
+"""Tests for rate-limit token estimates and call admission (services/ai_client.py)"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from utils.deadline import DeadlineExceeded
+from services import ai_client
+from services.ai_client import (chat_completion, estimate_request_tokens, expected_completion_tokens,
+                                record_completion_tokens)
+from services.ai_metrics import get_ai_metrics
+from services.circuit_breaker import CircuitOpenError
+from services.model_routing import CONNECTION_TEST, EMAIL_GENERATION
+from services.rate_limiter import ProviderRateLimiter
+from services.scheduler import ProviderCallScheduler
+
+
+@pytest.fixture(autouse=True)
+def fresh_averages(monkeypatch):
+    monkeypatch.setattr(ai_client, '_completion_averages', {})
+
+
+def test_estimate_adds_expected_completion_to_prompt():
+    messages = [{'role': 'user', 'content': 'x' * 400}]
+    assert estimate_request_tokens(messages, 250) - estimate_request_tokens(messages) == 250
+
+
+def test_expected_completion_starts_from_default_and_respects_cap():
+    assert expected_completion_tokens('groq', 'llama-3.1-8b-instant', 1500) == 300
+    assert expected_completion_tokens('groq', 'llama-3.1-8b-instant', 200) == 200
+
+
+def test_expected_completion_follows_observed_usage():
+    record_completion_tokens('groq', 'llama-3.1-8b-instant', 400)
+    assert expected_completion_tokens('groq', 'llama-3.1-8b-instant', 1500) == 400
+    record_completion_tokens('groq', 'llama-3.1-8b-instant', 900)
+    assert expected_completion_tokens('groq', 'llama-3.1-8b-instant', 1500) == 500
+    assert expected_completion_tokens('openai', 'gpt-4o-mini', 1500) == 300
+
+
+def test_settling_returns_overcharged_budget(tmp_path):
+    limiter = ProviderRateLimiter(db_path=str(tmp_path / 'limits.sqlite3'), max_wait=0)
+    limits = {'requests_per_minute': 100, 'tokens_per_minute': 6000}
+    limiter.acquire('groq', 'key', 4000, limits)
+    limiter.adjust_tokens('groq', 'key', 4000 - 1200, limits)
+    # 4800 of 6000 tokens are left after settling, so this fits without waiting
+    assert limiter.acquire('groq', 'key', 4500, limits) == pytest.approx(0, abs=0.1)
+
+
+class FakeClient:
+    api_key = 'key'
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.calls = 0
+
+    def with_options(self, **options):
+        return self
+
+    def create(self, **request_kwargs):
+        self.calls += 1
+        return SimpleNamespace(usage=None)
+
+
+class FakeBreaker:
+    def __init__(self, allow):
+        self.allow = allow
+        self.released = 0
+
+    def allow_request(self):
+        return self.allow
+
+    def retry_after(self):
+        return 30.0
+
+    def release(self):
+        self.released += 1
+
+    def record_success(self, latency=0.0):
+        pass
+
+
+class RecordingLimiter:
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.in_flight_during_acquire = []
+        self.adjusted = []
+
+    def acquire(self, provider, api_key, tokens=0, limits=None):
+        self.in_flight_during_acquire.append(self.scheduler.stats()['in_flight'])
+        return 0.0
+
+    def adjust_tokens(self, provider, api_key, delta, limits=None):
+        self.adjusted.append(delta)
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    scheduler = ProviderCallScheduler(max_concurrency=1)
+    limiter = RecordingLimiter(scheduler)
+    monkeypatch.setattr(ai_client, 'get_provider_scheduler', lambda: scheduler)
+    monkeypatch.setattr(ai_client, 'get_rate_limiter', lambda: limiter)
+    return scheduler, limiter
+
+
+def test_rate_budget_is_acquired_before_a_scheduler_slot(admission, monkeypatch):
+    scheduler, limiter = admission
+    monkeypatch.setattr(ai_client, 'get_circuit_breaker', lambda provider: FakeBreaker(True))
+    client = FakeClient()
+    chat_completion(client, 'groq', model='llama-3.1-8b-instant', messages=[{'role': 'user', 'content': 'hi'}])
+    assert client.calls == 1
+    assert limiter.in_flight_during_acquire == [0]
+    assert scheduler.stats()['in_flight'] == 0
+
+
+def test_open_circuit_spends_no_rate_budget_or_slot(admission, monkeypatch):
+    scheduler, limiter = admission
+    monkeypatch.setattr(ai_client, 'get_circuit_breaker', lambda provider: FakeBreaker(False))
+    client = FakeClient()
+    with pytest.raises(CircuitOpenError):
+        chat_completion(client, 'groq', model='llama-3.1-8b-instant', messages=[])
+    assert client.calls == 0
+    assert limiter.in_flight_during_acquire == []
+    assert scheduler.stats()['classes']['interactive']['running'] == 0
+
+
+def test_call_that_gets_no_slot_returns_its_admission(admission, monkeypatch):
+    scheduler, limiter = admission
+    breaker = FakeBreaker(True)
+    monkeypatch.setattr(ai_client, 'get_circuit_breaker', lambda provider: breaker)
+
+    def no_slot(priority_class):
+        raise DeadlineExceeded('no time left')
+
+    monkeypatch.setattr(scheduler, 'acquire', no_slot)
+    with pytest.raises(DeadlineExceeded):
+        chat_completion(FakeClient(), 'groq', model='llama-3.1-8b-instant', max_tokens=100, messages=[])
+    assert breaker.released == 1
+    assert limiter.adjusted == [100]
+
+
+class SuccessBreaker:
+    def __init__(self):
+        self.successes = 0
+
+    def record_success(self, latency=0.0):
+        self.successes += 1
+
+
+@pytest.mark.parametrize('stage, counted', [(CONNECTION_TEST, False), (EMAIL_GENERATION, True)])
+def test_connection_tests_stay_out_of_hedging_and_rate_estimates(stage, counted):
+    model = f'probe-model-{stage}'
+    breaker = SuccessBreaker()
+    response = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=8, completion_tokens=1, total_tokens=9))
+    ai_client._record_call_success('groq', stage, breaker, {'model': model}, response, 0.0)
+
+    assert breaker.successes == 1
+    samples = get_ai_metrics().get_samples('provider_latency', f"groq/{model}", 'seconds')
+    assert len(samples) == (1 if counted else 0)
+    assert expected_completion_tokens('groq', model, 1500) == (1 if counted else 300)
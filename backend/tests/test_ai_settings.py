@@ -0,0 +1,27 @@
+"""Tests for the AI settings file location (services/ai_settings.py)"""
+
+import os
+
+from services import ai_settings
+from services.ai_settings import AISettingsService
+
+
+def test_default_settings_file_ignores_working_directory(tmp_path, monkeypatch):
+    default_file = str(tmp_path / 'backend' / 'ai_settings.json')
+    monkeypatch.setattr(ai_settings, 'DEFAULT_SETTINGS_FILE', default_file)
+    monkeypatch.chdir(tmp_path)
+    assert AISettingsService._default_settings_file() == default_file
+
+
+def test_legacy_settings_file_is_still_used(tmp_path, monkeypatch):
+    default_file = str(tmp_path / 'backend' / 'ai_settings.json')
+    monkeypatch.setattr(ai_settings, 'DEFAULT_SETTINGS_FILE', default_file)
+    # Started from inside backend/, older versions wrote backend/backend/ai_settings.json
+    run_dir = tmp_path / 'backend'
+    (run_dir / 'backend').mkdir(parents=True)
+    (run_dir / 'backend' / 'ai_settings.json').write_text('{}')
+    monkeypatch.chdir(run_dir)
+    assert AISettingsService._default_settings_file() == os.path.join(str(run_dir), 'backend', 'ai_settings.json')
+
+    (run_dir / 'ai_settings.json').write_text('{}')
+    assert AISettingsService._default_settings_file() == default_file
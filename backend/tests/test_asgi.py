@@ -0,0 +1,34 @@
+"""Tests for the ASGI entry point's WSGI bridge (asgi.py)"""
+
+import asyncio
+import logging
+
+import asgi
+
+
+def run_bridge(path='/api/broken'):
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'headers': []}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi._wsgi_bridge(scope, receive, send))
+    return sent
+
+
+def test_bridge_error_is_logged_with_traceback(monkeypatch, caplog):
+    def wsgi_app(environ, start_response):
+        raise RuntimeError('bridge broke')
+
+    monkeypatch.setattr(asgi.flask_app, 'wsgi_app', wsgi_app)
+    with caplog.at_level(logging.ERROR):
+        sent = run_bridge()
+
+    assert sent[0]['type'] == 'http.response.start' and sent[0]['status'] == 500
+    record = next(r for r in caplog.records if 'WSGI bridge error' in r.getMessage())
+    assert 'GET /api/broken' in record.getMessage()
+    assert record.exc_info and record.exc_info[0] is RuntimeError
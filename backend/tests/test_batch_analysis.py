@@ -0,0 +1,76 @@
+"""Tests for batch analysis outcomes and deadlines (services/batch_analysis.py)"""
+
+import pytest
+
+from services import batch_analysis
+from services.batch_analysis import analyze_jobs_ordered, get_batch_job_limit
+from utils.deadline import deadline_scope, remaining_time
+from services.scheduler import PREFILTER, get_priority, priority_scope
+
+RESULTS = {
+    'ai': {'status': 'RELEVANT', 'reason': 'Matches skills'},
+    'fallback': {'status': 'RELEVANT', 'reason': 'Keyword match', 'fallback': True},
+    'error': {'status': 'ERROR', 'reason': 'Analysis failed: boom'},
+}
+
+
+@pytest.fixture
+def fake_analysis(monkeypatch):
+    windows = []
+
+    def analyze_job_post(job_data, user_profile, ai_settings):
+        windows.append(remaining_time())
+        if job_data['kind'] == 'raise':
+            raise RuntimeError('settings broke')
+        return dict(RESULTS[job_data['kind']])
+
+    monkeypatch.setattr(batch_analysis, 'analyze_job_post', analyze_job_post)
+    return windows
+
+
+def test_fallbacks_and_errors_are_reported_separately(fake_analysis):
+    jobs = [{'kind': kind} for kind in ('ai', 'fallback', 'error', 'raise', 'ai')] + [{}]
+    batch = analyze_jobs_ordered(jobs, {}, {})
+
+    assert (batch['count'], batch['succeeded'], batch['fallback'], batch['failed']) == (6, 2, 1, 3)
+    outcomes = batch['results']
+    assert outcomes[0] == {'success': True, 'result': RESULTS['ai'], 'index': 0}
+    assert outcomes[1]['success'] and outcomes[1]['fallback']
+    assert outcomes[2] == {'success': False, 'error': 'Analysis failed: boom', 'index': 2}
+    assert outcomes[3]['error'] == 'settings broke'
+
+
+def test_each_job_gets_its_own_deadline_window(fake_analysis, monkeypatch):
+    monkeypatch.setenv('ANALYZE_BATCH_JOB_TIMEOUT', '2')
+    analyze_jobs_ordered([{'kind': 'ai'}] * 3, {}, {})
+    assert all(0 < window <= 2 for window in fake_analysis)
+
+    with deadline_scope(1):
+        analyze_jobs_ordered([{'kind': 'ai'}], {}, {})
+    assert fake_analysis[-1] <= 1
+
+
+def test_batch_limit_fits_waves_in_request_deadline(monkeypatch):
+    monkeypatch.setenv('ANALYZE_BATCH_JOB_TIMEOUT', '8')
+    with deadline_scope(25):
+        assert get_batch_job_limit() == 12
+        assert get_batch_job_limit(2) == 6
+    with deadline_scope(5):
+        assert get_batch_job_limit() == 4
+    with deadline_scope(1000):
+        assert get_batch_job_limit() == 50
+
+
+def test_batch_jobs_run_at_the_batch_priority(monkeypatch):
+    from app import ROUTE_PRIORITIES
+
+    priorities = []
+
+    def analyze_job_post(job_data, user_profile, ai_settings):
+        priorities.append(get_priority())
+        return dict(RESULTS['ai'])
+
+    monkeypatch.setattr(batch_analysis, 'analyze_job_post', analyze_job_post)
+    with priority_scope(ROUTE_PRIORITIES['analyze_jobs']):
+        analyze_jobs_ordered([{'kind': 'ai'}] * 4, {}, {}, 2)
+    assert priorities == [PREFILTER] * 4
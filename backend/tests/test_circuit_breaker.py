@@ -0,0 +1,113 @@
+"""Tests for provider circuit breaker state transitions (services/circuit_breaker.py)"""
+
+import pytest
+
+from services import circuit_breaker
+from services.circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', fake)
+    return fake
+
+
+def make_breaker():
+    return CircuitBreaker('test', window_seconds=60, min_calls=4, error_rate_threshold=0.5,
+                          slow_call_seconds=5, slow_rate_threshold=0.8, open_seconds=30)
+
+
+def trip(breaker):
+    for _ in range(breaker.min_calls):
+        assert breaker.allow_request()
+        breaker.record_failure(0.1)
+
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure(0.1)
+    assert breaker.get_state() == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_opens_on_error_rate_and_rejects(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    assert breaker.get_state() == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.retry_after() == pytest.approx(30)
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_opens_on_slow_calls(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record_success(6.0)
+    assert breaker.get_state() == CircuitBreaker.OPEN
+
+
+def test_old_failures_leave_the_window(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure(0.1)
+    clock.now += 61
+    breaker.record_failure(0.1)
+    assert breaker.get_state() == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_one_probe_and_closes_on_success(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30
+    assert breaker.get_state() == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success(0.1)
+    assert breaker.get_state() == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_half_open_reopens_on_failure_or_slow_probe(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.record_failure(0.1)
+    assert breaker.get_state() == CircuitBreaker.OPEN
+
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.record_success(6.0)
+    assert breaker.get_state() == CircuitBreaker.OPEN
+    assert breaker.stats()['times_opened'] == 3
+
+
+def test_release_frees_half_open_permit(clock):
+    breaker = make_breaker()
+    trip(breaker)
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.release()
+    assert breaker.allow_request()
+
+
+def test_health_score(clock):
+    breaker = make_breaker()
+    assert breaker.health_score() == 1.0
+    breaker.record_success(0.0)
+    breaker.record_failure(0.0)
+    assert breaker.health_score() == pytest.approx(0.5)
+    breaker.record_failure(0.0)
+    breaker.record_failure(0.0)
+    assert breaker.get_state() == CircuitBreaker.OPEN
+    assert breaker.health_score() == 0.0
@@ -0,0 +1,40 @@
+"""Tests for request deadline propagation (utils/deadline.py)"""
+
+import pytest
+
+from utils.deadline import DeadlineExceeded, deadline_scope, get_call_timeout, get_deadline, set_deadline, reset_deadline
+
+
+def test_call_timeout_without_deadline_is_default():
+    assert get_deadline() is None
+    assert get_call_timeout(30.0) == 30.0
+
+
+def test_call_timeout_keeps_reserve_back():
+    with deadline_scope(10):
+        timeout = get_call_timeout(30.0, reserve=2.0, minimum=1.0)
+    assert 7.5 < timeout <= 8.0
+
+
+def test_call_timeout_is_capped_by_default():
+    with deadline_scope(60):
+        assert get_call_timeout(5.0, reserve=1.0, minimum=1.0) == 5.0
+
+
+def test_call_timeout_raises_when_too_little_time_is_left():
+    with deadline_scope(1.5):
+        with pytest.raises(DeadlineExceeded):
+            get_call_timeout(30.0, reserve=1.0, minimum=1.0)
+
+
+def test_nested_deadline_only_tightens():
+    with deadline_scope(5):
+        outer = get_deadline()
+        token = set_deadline(60)
+        try:
+            assert get_deadline() is outer
+        finally:
+            reset_deadline(token)
+        with deadline_scope(1):
+            assert get_deadline().expires_at < outer.expires_at
+    assert get_deadline() is None
@@ -0,0 +1,172 @@
+"""Tests for outbox helpers (services/email_outbox.py)"""
+
+import os
+import smtplib
+import socket
+import threading
+
+import pytest
+
+from utils.deadline import DeadlineExceeded
+from services.email_outbox import (DEFAULT_OUTBOX_DB, EmailOutbox, is_transient_error, parse_domain_intervals,
+                                   resolve_idempotency_key)
+
+
+@pytest.mark.parametrize('error', [
+    smtplib.SMTPResponseException(421, b'Service not available'),
+    smtplib.SMTPDataError(451, b'Try again later'),
+    smtplib.SMTPRecipientsRefused({'a@example.com': (450, b'Mailbox busy')}),
+    smtplib.SMTPServerDisconnected('Connection unexpectedly closed'),
+    socket.timeout('timed out'),
+    ConnectionRefusedError(),
+    DeadlineExceeded('no time left'),
+])
+def test_transient_errors(error):
+    assert is_transient_error(error)
+
+
+@pytest.mark.parametrize('error', [
+    smtplib.SMTPAuthenticationError(535, b'Bad credentials'),
+    smtplib.SMTPDataError(554, b'Rejected'),
+    smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'No such user')}),
+    smtplib.SMTPRecipientsRefused({'a@example.com': (450, b'Busy'), 'b@example.com': (550, b'No such user')}),
+    smtplib.SMTPRecipientsRefused({}),
+    smtplib.SMTPException('unknown'),
+    FileNotFoundError('resume.pdf'),
+    ValueError('bad message'),
+])
+def test_permanent_errors(error):
+    assert not is_transient_error(error)
+
+
+def test_parse_domain_intervals():
+    assert parse_domain_intervals('gmail.com=5, Outlook.com = 2.5') == {'gmail.com': 5.0, 'outlook.com': 2.5}
+
+
+@pytest.mark.parametrize('spec', [None, '', ' , ', 'gmail.com', 'gmail.com=', '=5'])
+def test_parse_domain_intervals_empty(spec):
+    assert parse_domain_intervals(spec) == {}
+
+
+def test_parse_domain_intervals_skips_invalid_entries():
+    assert parse_domain_intervals('gmail.com=fast,yahoo.com=4') == {'yahoo.com': 4.0}
+
+
+MESSAGE = {'email': 'HR@Example.com', 'subject': 'Application', 'body': 'Hello'}
+
+
+def test_idempotency_key_derived_from_message():
+    key = resolve_idempotency_key(MESSAGE)
+    assert key.startswith('derived:')
+    assert key == resolve_idempotency_key(dict(MESSAGE, email=' hr@example.com '))
+    assert key != resolve_idempotency_key(dict(MESSAGE, body='Hello again'))
+    assert key != resolve_idempotency_key(dict(MESSAGE, subject='Other role'))
+
+
+def test_idempotency_key_from_message_field():
+    assert resolve_idempotency_key(dict(MESSAGE, idempotency_key=42)) == '42'
+
+
+def test_idempotency_key_from_request_header():
+    assert resolve_idempotency_key(MESSAGE, 'req-1') == 'req-1'
+    assert resolve_idempotency_key(dict(MESSAGE, idempotency_key='m'), 'req-1') == 'req-1:m'
+
+
+def test_bulk_request_key_is_scoped_per_message():
+    assert resolve_idempotency_key(MESSAGE, 'req-1', 0) == 'req-1:0'
+    assert resolve_idempotency_key(MESSAGE, 'req-1', 1) == 'req-1:1'
+    assert resolve_idempotency_key(dict(MESSAGE, idempotency_key='m'), 'req-1', 1) == 'req-1:m'
+
+
+def test_default_outbox_is_next_to_app_regardless_of_working_directory():
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert DEFAULT_OUTBOX_DB == os.path.join(backend_dir, 'email_outbox.sqlite3')
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    outbox = EmailOutbox(db_path=str(tmp_path / 'outbox.sqlite3'))
+    # Keep the background senders out of these tests
+    monkeypatch.setattr(outbox, 'ensure_started', lambda: None)
+    return outbox
+
+
+def test_enqueue_with_same_key_returns_original(outbox):
+    first = outbox.enqueue('hr@example.com', 'Application', 'Hello', idempotency_key='k1')
+    second = outbox.enqueue('hr@example.com', 'Application', 'Hello', idempotency_key='k1')
+    assert not first['duplicate']
+    assert second['duplicate'] and second['id'] == first['id']
+    assert outbox._connect().execute('SELECT COUNT(*) FROM outbox').fetchone()[0] == 1
+
+
+def test_inline_send_reserves_its_key(outbox):
+    first = outbox.reserve_inline('hr@example.com', 'Application', 'Hello', idempotency_key='k1')
+    assert first['status'] == 'sending' and not first['duplicate']
+
+    # A double-submit while the first send is in progress doesn't send again
+    second = outbox.reserve_inline('hr@example.com', 'Application', 'Hello', idempotency_key='k1')
+    assert second['duplicate'] and second['id'] == first['id'] and second['status'] == 'sending'
+
+    assert outbox.finish_inline(first['id'])['status'] == 'sent'
+    third = outbox.reserve_inline('hr@example.com', 'Application', 'Hello', idempotency_key='k1')
+    assert third['duplicate'] and third['status'] == 'sent'
+    assert outbox.enqueue('hr@example.com', 'Application', 'Hello', idempotency_key='k1')['id'] == first['id']
+
+
+def test_failed_inline_send_frees_its_key(outbox):
+    first = outbox.reserve_inline('hr@example.com', 'Application', 'Hello', idempotency_key='k1')
+    failed = outbox.finish_inline(first['id'], 'Failed to send email: 550 No such user')
+    assert failed['status'] == 'failed'
+    retry = outbox.reserve_inline('hr@example.com', 'Application', 'Hello', idempotency_key='k1')
+    assert not retry['duplicate'] and retry['id'] != first['id']
+
+
+def test_concurrent_inline_sends_reserve_once(outbox):
+    records = []
+    barrier = threading.Barrier(8)
+
+    def reserve():
+        barrier.wait()
+        records.append(outbox.reserve_inline('hr@example.com', 'Application', 'Hello', idempotency_key='k1'))
+
+    threads = [threading.Thread(target=reserve) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(records) == 8
+    assert sum(1 for record in records if not record['duplicate']) == 1
+    assert len({record['id'] for record in records}) == 1
+
+
+def test_abandoned_inline_reservation_expires(tmp_path):
+    outbox = EmailOutbox(db_path=str(tmp_path / 'outbox.sqlite3'), claim_timeout=0.01)
+    first = outbox.reserve_inline('hr@example.com', 'Application', 'Hello', idempotency_key='k1')
+    outbox._connect().execute('UPDATE outbox SET updated_at = updated_at - 1 WHERE id = ?', (first['id'],))
+    assert not outbox.reserve_inline('hr@example.com', 'Application', 'Hello', idempotency_key='k1')['duplicate']
+    # The background senders never claim an inline send
+    assert outbox.claim_next() is None
+
+
+def test_inline_route_sends_a_double_submit_once(outbox, monkeypatch):
+    import app as app_module
+
+    sends = []
+
+    def send_email(to_email, subject, body, attachment_path=None):
+        sends.append(to_email)
+        return {'success': True, 'message': f'Email sent successfully to {to_email}'}
+
+    monkeypatch.setattr(app_module, 'EMAIL_QUEUE_ENABLED', False)
+    monkeypatch.setattr(app_module, 'get_email_outbox', lambda: outbox)
+    monkeypatch.setattr(app_module.email_service, 'send_email', send_email)
+
+    def post():
+        # Call the view directly, without the request hooks that start the prober and senders
+        with app_module.app.test_request_context('/api/send-email', method='POST', json=MESSAGE):
+            return app_module.send_email().get_json()
+
+    first, second = post(), post()
+    assert sends == ['HR@Example.com']
+    assert first['duplicate'] is False
+    assert second['duplicate'] is True and second['id'] == first['id']
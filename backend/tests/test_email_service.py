@@ -0,0 +1,111 @@
+"""Tests for message rendering and delivery (services/email_service.py)"""
+
+import re
+import smtplib
+
+import pytest
+
+from services.email_service import EmailService
+
+
+def normalize(text):
+    """Replace the random MIME boundary so two renderings can be compared"""
+    boundary = re.search(r'boundary="([^"]+)"', text).group(1)
+    return text.replace(boundary, 'BOUNDARY')
+
+
+@pytest.fixture
+def service():
+    service = EmailService()
+    service.email = 'sender@example.com'
+    return service
+
+
+def test_render_without_attachment_matches_build(service):
+    args = ('hr@example.com', 'Application', 'Hello,\n\nPlease find my resume attached.')
+    assert normalize(service.render_message(*args)) == normalize(service.build_message(*args).as_string())
+
+
+def test_render_with_missing_attachment_matches_build(service, tmp_path):
+    args = ('hr@example.com', 'Application', 'Hello', str(tmp_path / 'missing.pdf'))
+    assert normalize(service.render_message(*args)) == normalize(service.build_message(*args).as_string())
+
+
+def test_render_splices_cached_attachment(service, tmp_path):
+    resume = tmp_path / 'resume.pdf'
+    resume.write_bytes(b'%PDF-1.4\n' + bytes(range(256)) * 20)
+    args = ('hr@example.com', 'Application – Backend Developer', 'Hello 👋\nSee attached.', str(resume))
+
+    expected = normalize(service.build_message(*args).as_string())
+    assert normalize(service.render_message(*args)) == expected
+    # Second rendering comes from the attachment cache
+    assert normalize(service.render_message(*args)) == expected
+    assert service.attachment_cache.stats()['hits'] >= 1
+
+
+class FakeSMTP:
+    """SMTP session that drops the connection at a chosen command"""
+
+    def __init__(self, disconnect_at=None):
+        self.disconnect_at = disconnect_at
+        self.commands = []
+
+    def _command(self, name, reply=(250, b'OK')):
+        self.commands.append(name)
+        if name == self.disconnect_at:
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        return reply
+
+    def ehlo_or_helo_if_needed(self):
+        pass
+
+    def mail(self, sender):
+        return self._command('mail')
+
+    def rcpt(self, recipient):
+        return self._command('rcpt')
+
+    def data(self, text):
+        return self._command('data')
+
+    def rset(self):
+        return self._command('rset')
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def deliver_with(service, monkeypatch, sessions):
+    opened = []
+
+    def connect():
+        opened.append(sessions.pop(0))
+        return opened[-1]
+
+    monkeypatch.setattr(service.pool, '_connect', connect)
+    service.deliver('hr@example.com', 'Subject: Application\n\nHello')
+    return opened
+
+
+def test_disconnect_before_data_is_retried_on_a_fresh_connection(service, monkeypatch):
+    opened = deliver_with(service, monkeypatch, [FakeSMTP(disconnect_at='mail'), FakeSMTP()])
+    assert [session.commands for session in opened] == [['mail'], ['mail', 'rcpt', 'data']]
+
+
+def test_disconnect_during_data_is_not_retried(service, monkeypatch):
+    sessions = [FakeSMTP(disconnect_at='data'), FakeSMTP()]
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        deliver_with(service, monkeypatch, sessions)
+    # The message may have been accepted, so no second connection carries it again
+    assert len(sessions) == 1
+
+
+def test_refused_recipient_is_raised():
+    service = EmailService()
+    session = FakeSMTP()
+    session.rcpt = lambda recipient: (550, b'No such user')
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        service._send_envelope(session, 'hr@example.com')
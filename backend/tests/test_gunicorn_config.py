@@ -0,0 +1,67 @@
+"""Tests for the gunicorn worker modes (gunicorn.conf.py)"""
+
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loads the config the way gunicorn does and resolves the worker class, in a
+# fresh interpreter since the gevent mode monkey-patches the process
+LOAD_CONFIG = '''
+import json, runpy
+from gunicorn.config import Config
+namespace = runpy.run_path('gunicorn.conf.py')
+config = Config()
+for name, value in namespace.items():
+    if name in config.settings:
+        config.set(name, value)
+patched = False
+if config.worker_class_str == 'gevent':
+    from gevent import monkey
+    patched = monkey.is_module_patched('socket')
+print(json.dumps({'worker_class': config.worker_class_str, 'worker': config.worker_class.__name__,
+                  'threads': config.threads, 'worker_connections': config.worker_connections,
+                  'workers': config.workers, 'timeout': config.timeout, 'patched': patched}))
+'''
+
+GEVENT_AVAILABLE = importlib.util.find_spec('gevent') is not None
+
+
+def load_config(without_gevent=False, **env):
+    pytest.importorskip('gunicorn')
+    environ = {name: value for name, value in os.environ.items() if not name.startswith('GUNICORN_')}
+    environ.update(env)
+    # A None entry in sys.modules makes the import fail as if gevent were not installed
+    script = ("import sys; sys.modules['gevent'] = None\n" if without_gevent else '') + LOAD_CONFIG
+    output = subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=environ,
+                            capture_output=True, text=True, timeout=60, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_sync_workers_by_default():
+    config = load_config()
+    assert (config['worker'], config['threads'], config['workers']) == ('SyncWorker', 1, 2)
+    assert config['timeout'] == 30
+
+
+def test_gthread_workers():
+    config = load_config(GUNICORN_WORKER_CLASS='gthread', GUNICORN_WORKERS='3')
+    assert (config['worker'], config['threads'], config['workers']) == ('ThreadWorker', 8, 3)
+    assert load_config(GUNICORN_WORKER_CLASS='GThread', GUNICORN_THREADS='16')['threads'] == 16
+
+
+@pytest.mark.skipif(not GEVENT_AVAILABLE, reason='gevent is not installed')
+def test_gevent_workers():
+    config = load_config(GUNICORN_WORKER_CLASS='gevent', GUNICORN_WORKER_CONNECTIONS='500')
+    assert (config['worker'], config['worker_connections']) == ('GeventWorker', 500)
+    assert config['patched']
+
+
+def test_gevent_falls_back_to_gthread_without_gevent():
+    config = load_config(without_gevent=True, GUNICORN_WORKER_CLASS='gevent')
+    assert (config['worker'], config['threads']) == ('ThreadWorker', 8)
@@ -0,0 +1,48 @@
+"""Tests for the hedge budget (services/hedging.py)"""
+
+import asyncio
+from concurrent.futures import Future
+
+from services.hedging import HedgeBudget
+
+
+def test_budget_limits_hedges_to_earned_tokens():
+    budget = HedgeBudget(ratio=0.5, burst=1.0, max_in_flight=10)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    budget.record_request()
+    assert not budget.try_spend()
+    budget.record_request()
+    assert budget.try_spend()
+
+
+def test_in_flight_cap_holds_until_both_calls_finish():
+    budget = HedgeBudget(ratio=1.0, burst=5.0, max_in_flight=1)
+    primary, hedge = Future(), Future()
+    assert budget.try_spend()
+    budget.release_when_done((primary, hedge))
+    assert not budget.try_spend()
+
+    hedge.set_result({'status': 'RELEVANT'})
+    assert budget.in_flight() == 1
+    assert not budget.try_spend()
+
+    primary.set_result({'status': 'RELEVANT'})
+    assert budget.in_flight() == 0
+    assert budget.try_spend()
+
+
+def test_in_flight_cap_releases_on_cancelled_tasks():
+    async def scenario():
+        budget = HedgeBudget(ratio=1.0, burst=5.0, max_in_flight=1)
+        primary = asyncio.ensure_future(asyncio.sleep(10))
+        hedge = asyncio.ensure_future(asyncio.sleep(0))
+        assert budget.try_spend()
+        budget.release_when_done((primary, hedge))
+        await hedge
+        primary.cancel()
+        await asyncio.gather(primary, return_exceptions=True)
+        await asyncio.sleep(0)
+        return budget.in_flight()
+
+    assert asyncio.run(scenario()) == 0
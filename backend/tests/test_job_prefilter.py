@@ -0,0 +1,31 @@
+"""Tests for pre-filter response parsing (services/job_prefilter.py)"""
+
+from services.job_prefilter import parse_batch_response
+
+BATCH = [{'title': f'Job {number}'} for number in range(4)]
+
+
+def test_keeps_relevant_and_maybe():
+    decisions = parse_batch_response('Job1: RELEVANT\nJob2: MAYBE\nJob3: RELEVANT\nJob4: MAYBE', BATCH)
+    assert [(d['index'], d['label']) for d in decisions] == [(0, 'RELEVANT'), (1, 'MAYBE'), (2, 'RELEVANT'), (3, 'MAYBE')]
+    assert [d['score'] for d in decisions] == [1.0, 0.5, 1.0, 0.5]
+
+
+def test_drops_not_relevant():
+    decisions = parse_batch_response('Job1: NOT_RELEVANT\nJob2: not relevant\nJob3: RELEVANT\nJob4: NOT_RELEVANT', BATCH)
+    assert [d['index'] for d in decisions] == [2]
+
+
+def test_drops_lines_without_a_label():
+    decisions = parse_batch_response('Job1: RELEVANT\nsure, here you go\nJob3: MAYBE\nJob4: RELEVANT', BATCH)
+    assert [d['index'] for d in decisions] == [0, 2, 3]
+
+
+def test_missing_lines_keep_job_as_maybe():
+    decisions = parse_batch_response('Job1: NOT_RELEVANT\nJob2: RELEVANT', BATCH)
+    assert [(d['index'], d['label']) for d in decisions] == [(1, 'RELEVANT'), (2, 'MAYBE'), (3, 'MAYBE')]
+
+
+def test_offset_shifts_indices():
+    decisions = parse_batch_response('RELEVANT\nNOT_RELEVANT\nMAYBE\nRELEVANT', BATCH, offset=10)
+    assert [d['index'] for d in decisions] == [10, 12, 13]
@@ -0,0 +1,34 @@
+"""Tests for prompt assembly and the profile prefix cache (services/prompt_builder.py)"""
+
+from services.ai_agent import UserProfile
+from services.prompt_builder import (ProfilePrefixCache, build_analysis_messages, estimate_tokens,
+                                     PROVIDER_CACHE_MIN_TOKENS)
+
+PROFILE = UserProfile(
+    name='Ada', experience=3, domain='Backend', skills=['Python', 'Flask'],
+    preferred_roles=['Backend Engineer'], preferred_work_type=['Remote'],
+    excluded_roles=['Sales'], preferred_company_types=['Startup'], email='ada@example.com'
+)
+
+
+def test_prefix_is_memoized_and_reports_its_size():
+    cache = ProfilePrefixCache()
+    first = build_analysis_messages('Job one', PROFILE, cache)
+    second = build_analysis_messages('Job two', PROFILE, cache)
+
+    assert first[0] == second[0]
+    assert first[1]['content'].split('JOB POST CONTENT:')[0] == second[1]['content'].split('JOB POST CONTENT:')[0]
+
+    stats = cache.stats()
+    assert (stats['entries'], stats['hits'], stats['misses']) == (1, 1, 1)
+    prefix_tokens = estimate_tokens(first[0]['content']) + estimate_tokens(cache.get(PROFILE)['profile'])
+    assert stats['max_prefix_tokens'] == prefix_tokens
+    assert stats['provider_cache_min_tokens'] == PROVIDER_CACHE_MIN_TOKENS
+
+
+def test_default_prefix_is_too_short_for_provider_caching():
+    cache = ProfilePrefixCache()
+    cache.get(PROFILE)
+
+    assert cache.stats()['max_prefix_tokens'] < PROVIDER_CACHE_MIN_TOKENS
+    assert cache.stats()['provider_cacheable'] == 0
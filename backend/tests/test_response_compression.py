@@ -0,0 +1,93 @@
+"""Tests for response compression negotiation and streaming (services/response_compression.py)"""
+
+import zlib
+
+import pytest
+
+from services import response_compression
+from services.response_compression import choose_encoding, encode_stream, get_transfer_stats
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None),
+    ('', None),
+    ('gzip', 'gzip'),
+    ('gzip, deflate, br', 'gzip'),
+    ('deflate, gzip;q=0.5', 'gzip'),
+    ('gzip;q=0', None),
+    ('GZIP ; Q=1.0', 'gzip'),
+    ('gzip;q=abc', None),
+    ('identity', None),
+    ('*', 'gzip'),
+    ('*;q=0, identity', None),
+])
+def test_choose_encoding_without_brotli(monkeypatch, header, expected):
+    monkeypatch.setattr(response_compression, 'BROTLI_AVAILABLE', False)
+    assert choose_encoding(header) == expected
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, br', 'br'),
+    ('br;q=0.5, gzip', 'gzip'),
+    ('br;q=0, gzip;q=0.1', 'gzip'),
+    ('*', 'br'),
+])
+def test_choose_encoding_prefers_brotli_on_tie(monkeypatch, header, expected):
+    monkeypatch.setattr(response_compression, 'BROTLI_AVAILABLE', True)
+    assert choose_encoding(header) == expected
+
+
+def test_choose_encoding_disabled(monkeypatch):
+    monkeypatch.setattr(response_compression, 'COMPRESSION_ENABLED', False)
+    assert choose_encoding('gzip') is None
+
+
+class Chunks:
+    """Iterable body that remembers whether it was closed"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+def test_encode_stream_flushes_each_chunk():
+    lines = ['{"index":0,"status":"RELEVANT"}\n', b'{"index":1,"status":"MAYBE"}\n', '{"done":true}\n']
+    body = Chunks(lines)
+    decoder = zlib.decompressobj(31)
+    decoded = []
+    for chunk in encode_stream(body, 'gzip', 'test_stream_gzip'):
+        decoded.append(decoder.decompress(chunk))
+    # Every input line is decodable as soon as its chunk arrives
+    assert decoded[:3] == [line if isinstance(line, bytes) else line.encode() for line in lines]
+    assert decoder.eof
+    assert body.closed
+
+    stats = get_transfer_stats().stats()['test_stream_gzip']
+    assert stats['responses'] == 1
+    assert stats['compressed'] == 1
+    assert stats['body_bytes'] == sum(len(line) for line in lines)
+    assert stats['encodings'] == {'gzip': 1}
+
+
+def test_encode_stream_passes_through_without_encoding():
+    body = Chunks(['a\n', b'b\n', ''])
+    assert list(encode_stream(body, None, 'test_stream_plain')) == [b'a\n', b'b\n']
+    assert body.closed
+    stats = get_transfer_stats().stats()['test_stream_plain']
+    assert stats['body_bytes'] == stats['wire_bytes'] == 4
+    assert stats['compressed'] == 0
+
+
+def test_encode_stream_closes_body_when_client_disconnects():
+    body = Chunks(['a\n', 'b\n'])
+    stream = encode_stream(body, 'gzip', 'test_stream_closed')
+    next(stream)
+    stream.close()
+    assert body.closed
+    assert get_transfer_stats().stats()['test_stream_closed']['responses'] == 1
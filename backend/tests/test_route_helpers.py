@@ -0,0 +1,70 @@
+"""Tests for request validation shared by app.py and asgi.py (services/route_helpers.py)"""
+
+import pytest
+
+from services.route_helpers import (parse_analyze_request, parse_prefilter_request, parse_send_request,
+                                    queued_send_response, server_error)
+
+
+@pytest.mark.parametrize('data, error', [
+    (None, 'No data provided'),
+    ({}, 'No data provided'),
+    ({'user_profile': {'name': 'A'}}, 'Job data is required'),
+])
+def test_analyze_request_errors(data, error):
+    assert parse_analyze_request(data)[2] == error
+
+
+def test_analyze_request():
+    assert parse_analyze_request({'job_data': {'title': 'Dev'}}) == ({'title': 'Dev'}, {}, None)
+
+
+@pytest.mark.parametrize('data, error', [
+    (None, 'No data provided'),
+    ({'jobs': []}, 'Jobs array is required'),
+    ({'jobs': [{}], 'response_mode': 'summary'}, 'response_mode must be one of: full, ids'),
+    ({'jobs': [{}], 'fields': 'title'}, 'fields must be a list of job field names'),
+])
+def test_prefilter_request_errors(data, error):
+    assert parse_prefilter_request(data) == ({}, error)
+
+
+def test_prefilter_request():
+    params, error = parse_prefilter_request({'jobs': [{'title': 'Dev'}], 'response_mode': 'ids'})
+    assert error is None
+    assert params == {'jobs': [{'title': 'Dev'}], 'user_profile': {}, 'response_mode': 'ids', 'fields': None}
+
+
+MESSAGE = {'email': 'hr@example.com', 'subject': 'Application', 'body': 'Hello'}
+
+
+@pytest.mark.parametrize('data, error', [
+    (None, 'No data provided'),
+    (dict(MESSAGE, body=''), 'Email, subject, and body are required'),
+    (dict(MESSAGE, resume_path='/nonexistent/resume.pdf'), 'Resume file not found'),
+])
+def test_send_request_errors(data, error):
+    assert parse_send_request(data) == ({}, error)
+
+
+def test_send_request(tmp_path):
+    resume = tmp_path / 'resume.pdf'
+    resume.write_bytes(b'%PDF')
+    message, error = parse_send_request(dict(MESSAGE, resume_path=str(resume)))
+    assert error is None
+    assert message == {'to_email': 'hr@example.com', 'subject': 'Application', 'body': 'Hello',
+                       'attachment_path': str(resume)}
+    assert parse_send_request(dict(MESSAGE, resume_path=''))[0]['attachment_path'] is None
+
+
+def test_queued_send_response_status():
+    record = {'id': 'm1', 'status': 'queued', 'duplicate': False}
+    payload, status = queued_send_response(record, 'hr@example.com')
+    assert status == 202
+    assert payload['status_url'] == '/api/email-status/m1'
+    assert queued_send_response(dict(record, duplicate=True), 'hr@example.com')[1] == 200
+
+
+def test_server_error_hides_details_outside_debug():
+    assert server_error('Failed', ValueError('secret path'), False) == {'error': 'Failed', 'details': None}
+    assert server_error('Failed', ValueError('secret path'), True)['details'] == 'secret path'
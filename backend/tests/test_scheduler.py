@@ -0,0 +1,98 @@
+"""Tests for the provider call scheduler (services/scheduler.py)"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.deadline import DeadlineExceeded, deadline_scope
+from services.scheduler import ProviderCallScheduler, INTERACTIVE, PREFILTER, BACKGROUND
+
+WEIGHTS = {INTERACTIVE: 8, PREFILTER: 3, BACKGROUND: 1}
+
+
+def queue_waiter(scheduler, priority_class, order):
+    """Start a thread that queues for a slot, records its dispatch and frees the slot again"""
+    def run():
+        with scheduler.slot(priority_class):
+            order.append(priority_class)
+
+    queued = scheduler.stats()['classes'][priority_class]['queued']
+    thread = threading.Thread(target=run)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while scheduler.stats()['classes'][priority_class]['queued'] == queued:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+    return thread
+
+
+def test_free_slots_go_to_the_smallest_weighted_tag():
+    scheduler = ProviderCallScheduler(max_concurrency=1, weights=WEIGHTS)
+    order = []
+    scheduler.acquire(INTERACTIVE)
+    threads = [queue_waiter(scheduler, BACKGROUND, order)]
+    threads += [queue_waiter(scheduler, PREFILTER, order) for _ in range(4)]
+    threads += [queue_waiter(scheduler, INTERACTIVE, order)]
+    scheduler.release(INTERACTIVE)
+    for thread in threads:
+        thread.join(5)
+
+    # Interactive jumps the queue; background still gets its 1-in-4 share next to prefilter (weight 3)
+    assert order == [INTERACTIVE, PREFILTER, PREFILTER, BACKGROUND, PREFILTER, PREFILTER]
+    assert scheduler.stats()['in_flight'] == 0
+
+
+def test_queued_call_expires_at_the_deadline():
+    scheduler = ProviderCallScheduler(max_concurrency=1, weights=WEIGHTS)
+    scheduler.acquire(INTERACTIVE)
+    with deadline_scope(1.2):
+        with pytest.raises(DeadlineExceeded):
+            scheduler.acquire(PREFILTER)
+    assert scheduler.stats()['classes'][PREFILTER]['queued'] == 0
+
+    # The expired waiter is skipped when the slot frees up
+    scheduler.release(INTERACTIVE)
+    assert scheduler.stats()['in_flight'] == 0
+    scheduler.acquire(PREFILTER)
+    assert scheduler.stats()['classes'][PREFILTER]['running'] == 1
+
+
+def test_cancelled_task_hands_back_a_slot_it_was_given():
+    scheduler = ProviderCallScheduler(max_concurrency=1, weights=WEIGHTS)
+
+    async def run():
+        await scheduler.acquire_async(INTERACTIVE)
+        waiter = asyncio.ensure_future(scheduler.acquire_async(INTERACTIVE))
+        await asyncio.sleep(0)
+        assert scheduler.stats()['classes'][INTERACTIVE]['queued'] == 1
+
+        # The slot is handed over, but the task is cancelled before it resumes
+        scheduler.release(INTERACTIVE)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(run())
+    stats = scheduler.stats()
+    assert stats['in_flight'] == 0
+    assert stats['classes'][INTERACTIVE] == {'weight': 8, 'queued': 0, 'running': 0}
+
+
+def test_cancelled_task_leaves_the_queue():
+    scheduler = ProviderCallScheduler(max_concurrency=1, weights=WEIGHTS)
+
+    async def run():
+        await scheduler.acquire_async(INTERACTIVE)
+        waiter = asyncio.ensure_future(scheduler.acquire_async(BACKGROUND))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        scheduler.release(INTERACTIVE)
+
+    asyncio.run(run())
+    stats = scheduler.stats()
+    assert stats['in_flight'] == 0
+    assert stats['classes'][BACKGROUND]['queued'] == 0
@@ -0,0 +1,70 @@
+"""Tests for cross-worker request coalescing (services/singleflight.py)"""
+
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+from services.singleflight import SingleFlight, FCNTL_AVAILABLE
+
+pytestmark = pytest.mark.skipif(not FCNTL_AVAILABLE, reason='cross-process coalescing needs fcntl')
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_lock_directory_and_results_are_private(tmp_path):
+    base_dir = tmp_path / 'singleflight'
+    base_dir.mkdir(mode=0o755)
+    group = SingleFlight('analyze-job', lock_dir=str(base_dir))
+    group.do('key', lambda: {'email': 'hr@example.com'})
+
+    assert mode(base_dir) == 0o700
+    assert mode(group.lock_dir) == 0o700
+    for name in os.listdir(group.lock_dir):
+        assert mode(os.path.join(group.lock_dir, name)) == 0o600
+
+
+def test_sequential_calls_are_not_cached(tmp_path):
+    group = SingleFlight('analyze-job', lock_dir=str(tmp_path))
+    calls = []
+    assert group.do('key', lambda: calls.append(1) or len(calls)) == (1, False)
+    assert group.do('key', lambda: calls.append(1) or len(calls)) == (2, False)
+
+
+def test_follower_in_another_worker_shares_result(tmp_path):
+    # Two groups with the same name and directory stand in for two gunicorn workers
+    leader_group = SingleFlight('analyze-job', lock_dir=str(tmp_path))
+    follower_group = SingleFlight('analyze-job', lock_dir=str(tmp_path))
+    started = threading.Event()
+
+    def slow_analysis():
+        started.set()
+        time.sleep(0.3)
+        return {'status': 'RELEVANT'}
+
+    leader = threading.Thread(target=leader_group.do, args=('key', slow_analysis))
+    leader.start()
+    assert started.wait(5)
+    result = follower_group.do('key', lambda: pytest.fail('follower should not run the analysis'))
+    leader.join()
+
+    assert result == ({'status': 'RELEVANT'}, True)
+
+
+def test_idle_lock_is_removed_only_when_unlocked(tmp_path):
+    group = SingleFlight('analyze-job', lock_dir=str(tmp_path))
+    lock_path = os.path.join(group.lock_dir, 'key.lock')
+    lock_fd, acquired, waited = group._lock_file(lock_path)
+    assert acquired and not waited
+
+    group._remove_idle_lock(lock_path)
+    assert os.path.exists(lock_path)
+
+    os.close(lock_fd)
+    group._remove_idle_lock(lock_path)
+    assert not os.path.exists(lock_path)
+    assert group.do('key', lambda: 'fresh') == ('fresh', False)
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible fake provider
+Serves the chat completions protocol used by the openai and groq clients, with
+configurable latency, errors, streaming and canned or malformed outputs, so
+benchmarks and tests run without API keys or network
+
+Point a provider at it with the "base_url" AI setting (or --base-url in
+bulk_analyze.py):
+    openai: http://127.0.0.1:8300/v1
+    groq:   http://127.0.0.1:8300   (the groq client adds /openai/v1)
+
+Usage:
+    cd backend && python tools/fake_provider.py --port 8300 --latency-ms 400 --latency-dist lognormal \\
+        --error-rate 0.02 --malformed-rate 0.05
+"""
+
+import argparse
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETION_PATHS = ('/v1/chat/completions', '/openai/v1/chat/completions', '/chat/completions')
+MODELS_PATHS = ('/v1/models', '/openai/v1/models')
+
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+
+MALFORMED_OUTPUTS = [
+    'Sure! Here is the analysis you asked for: status RELEVANT, the role fits.',
+    '{"status": "RELEVANT", "reason": "Good fit", "contact": null, "email_subject": "Application',
+    '```json\n{status: RELEVANT, reason: missing quotes}\n```'
+]
+
+
+class FakeProviderConfig:
+    """Behaviour settings shared by all request handlers"""
+
+    def __init__(self, args):
+        self.latency_ms = args.latency_ms
+        self.latency_jitter_ms = args.latency_jitter_ms
+        self.latency_dist = args.latency_dist
+        self.ms_per_token = args.ms_per_token
+        self.error_rate = args.error_rate
+        self.error_codes = [int(code) for code in args.error_codes.split(',') if code.strip()]
+        self.hang_rate = args.hang_rate
+        self.hang_seconds = args.hang_seconds
+        self.malformed_rate = args.malformed_rate
+        self.relevant_rate = args.relevant_rate
+        self.cached_prefix_tokens = args.cached_prefix_tokens
+        self.random = random.Random(args.seed)
+        self.random_lock = threading.Lock()
+
+        self.canned = None
+        if args.canned:
+            with open(args.canned, 'r', encoding='utf-8') as f:
+                outputs = json.load(f)
+            self.canned = itertools.cycle(outputs if isinstance(outputs, list) else [outputs])
+
+        self.stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'hangs': 0, 'malformed': 0, 'streamed': 0,
+                      'prompt_tokens': 0, 'completion_tokens': 0}
+
+    def roll(self) -> float:
+        with self.random_lock:
+            return self.random.random()
+
+    def sample_latency(self) -> float:
+        """Draw a base response latency in seconds from the configured distribution"""
+        mean = self.latency_ms / 1000.0
+        jitter = self.latency_jitter_ms / 1000.0
+        with self.random_lock:
+            if self.latency_dist == 'uniform':
+                value = self.random.uniform(mean - jitter, mean + jitter)
+            elif self.latency_dist == 'normal':
+                value = self.random.gauss(mean, jitter)
+            elif self.latency_dist == 'exponential':
+                value = self.random.expovariate(1.0 / mean) if mean > 0 else 0.0
+            elif self.latency_dist == 'lognormal':
+                # Median at the configured latency with a long right tail
+                sigma = max(0.05, jitter / mean) if mean > 0 else 0.5
+                value = mean * math.exp(self.random.gauss(0, sigma))
+            else:
+                value = mean
+        return max(0.0, value)
+
+    def count(self, **fields):
+        with self.stats_lock:
+            for field, amount in fields.items():
+                self.stats[field] = self.stats.get(field, 0) + amount
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / 4))
+
+
+def build_content(config: FakeProviderConfig, request: dict) -> str:
+    """Produce a plausible response for the app's prompts"""
+    if config.canned is not None:
+        with config.random_lock:
+            output = next(config.canned)
+        return output if isinstance(output, str) else json.dumps(output)
+
+    if config.roll() < config.malformed_rate:
+        config.count(malformed=1)
+        with config.random_lock:
+            return config.random.choice(MALFORMED_OUTPUTS)
+
+    messages = request.get('messages', [])
+    system = next((m.get('content', '') for m in messages if m.get('role') == 'system'), '')
+    user = messages[-1].get('content', '') if messages else ''
+    relevant = config.roll() < config.relevant_rate
+
+    # Pre-filter batch prompt: one label line per job
+    if 'job relevance analyzer' in system:
+        job_count = len(re.findall(r'^\s*Job \d+:', user, re.MULTILINE)) or 1
+        labels = []
+        for index in range(job_count):
+            roll = config.roll()
+            label = 'RELEVANT' if roll < config.relevant_rate else ('MAYBE' if roll < config.relevant_rate + 0.1 else 'NOT_RELEVANT')
+            labels.append(f"Job{index + 1}: {label}")
+        return '\n'.join(labels)
+
+    contact_match = EMAIL_PATTERN.search(user)
+    contact = contact_match.group(0) if contact_match else None
+    status = 'RELEVANT' if relevant else 'NOT RELEVANT'
+    reason = 'Skills and role match the profile' if relevant else 'Role does not match the profile'
+
+    # Classification stage prompt: no email
+    if 'job relevance classifier' in system:
+        return json.dumps({'status': status, 'reason': reason, 'contact': contact})
+
+    # Connection tests and probes
+    if 'job post' not in (system + user).lower():
+        return 'Hello'
+
+    return json.dumps({
+        'status': status,
+        'reason': reason,
+        'contact': contact,
+        'email_subject': 'Application for the advertised role' if relevant else '',
+        'email_body': 'Dear Hiring Team,\n\nI would like to apply for this role.\n\nBest regards' if relevant else '',
+        'attachment_required': relevant
+    })
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    """Chat completions request handler"""
+
+    protocol_version = 'HTTP/1.1'
+    config = None  # set by make_server()
+
+    def log_message(self, format, *args):
+        # Quiet by default; per-request logging skews benchmarks
+        pass
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path in MODELS_PATHS:
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'fake-model', 'object': 'model', 'owned_by': 'fake'}]})
+        elif path in ('/health', '/stats'):
+            with self.config.stats_lock:
+                self._send_json(200, dict(self.config.stats))
+        else:
+            self._send_json(404, {'error': {'message': f'Unknown path {path}', 'type': 'invalid_request_error'}})
+
+    def do_POST(self):
+        path = self.path.split('?', 1)[0]
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if path not in COMPLETION_PATHS:
+            self._send_json(404, {'error': {'message': f'Unknown path {path}', 'type': 'invalid_request_error'}})
+            return
+
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': {'message': 'Invalid JSON body', 'type': 'invalid_request_error'}})
+            return
+
+        config = self.config
+        config.count(requests=1)
+
+        if config.roll() < config.hang_rate:
+            # Simulate a stalled upstream; the client's timeout should fire first
+            config.count(hangs=1)
+            time.sleep(config.hang_seconds)
+
+        time.sleep(config.sample_latency())
+
+        if config.error_codes and config.roll() < config.error_rate:
+            config.count(errors=1)
+            with config.random_lock:
+                status = config.random.choice(config.error_codes)
+            self._send_json(status, {'error': {'message': f'Simulated upstream error {status}', 'type': 'server_error'}})
+            return
+
+        content = build_content(config, request)
+        prompt_text = ''.join(str(m.get('content', '')) for m in request.get('messages', []))
+        prompt_tokens = estimate_tokens(prompt_text)
+        completion_tokens = estimate_tokens(content)
+        max_tokens = request.get('max_tokens')
+        if max_tokens and completion_tokens > max_tokens:
+            completion_tokens = max_tokens
+        config.count(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+        if config.ms_per_token:
+            time.sleep(completion_tokens * config.ms_per_token / 1000.0)
+
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'prompt_tokens_details': {'cached_tokens': min(prompt_tokens, config.cached_prefix_tokens)}
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = request.get('model', 'fake-model')
+
+        if request.get('stream'):
+            config.count(streamed=1)
+            self._stream(completion_id, model, content, usage)
+            return
+
+        self._send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': usage
+        })
+
+    def _stream(self, completion_id: str, model: str, content: str, usage: dict):
+        """Send the completion as server-sent events, a few words per chunk"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta, finish_reason=None, include_usage=False):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }
+            if include_usage:
+                chunk['usage'] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        event({'role': 'assistant', 'content': ''})
+        pieces = re.findall(r'\S+\s*', content) or [content]
+        for start in range(0, len(pieces), 4):
+            event({'content': ''.join(pieces[start:start + 4])})
+            if self.config.ms_per_token:
+                time.sleep(4 * self.config.ms_per_token / 1000.0)
+        event({}, finish_reason='stop', include_usage=True)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Local OpenAI-compatible fake chat completions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8300)
+    parser.add_argument('--latency-ms', type=float, default=300, help='Mean (or median for lognormal) latency')
+    parser.add_argument('--latency-jitter-ms', type=float, default=100, help='Spread of the latency distribution')
+    parser.add_argument('--latency-dist', choices=['fixed', 'uniform', 'normal', 'lognormal', 'exponential'], default='lognormal')
+    parser.add_argument('--ms-per-token', type=float, default=0, help='Extra generation time per completion token')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with an error status')
+    parser.add_argument('--error-codes', default='500,503,429', help='Comma-separated error statuses to choose from')
+    parser.add_argument('--hang-rate', type=float, default=0.0, help='Fraction of requests that stall before answering')
+    parser.add_argument('--hang-seconds', type=float, default=60.0, help='How long a stalled request waits')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='Fraction of responses that are not valid JSON')
+    parser.add_argument('--relevant-rate', type=float, default=0.6, help='Fraction of jobs judged relevant')
+    parser.add_argument('--cached-prefix-tokens', type=int, default=0, help='Prompt tokens reported as cached')
+    parser.add_argument('--canned', help='JSON file with a response (or list of responses) to cycle through')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible runs')
+    return parser.parse_args(argv)
+
+
+class FakeProviderServer(ThreadingHTTPServer):
+    """Threaded server with a listen backlog deep enough for thousands of concurrent clients"""
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def make_server(args) -> ThreadingHTTPServer:
+    """Create the fake provider server (not yet serving)"""
+    handler = type('ConfiguredFakeProviderHandler', (FakeProviderHandler,), {'config': FakeProviderConfig(args)})
+    return FakeProviderServer((args.host, args.port), handler)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = make_server(args)
+    host, port = server.server_address[:2]
+    print(f"🧪 Fake provider listening on http://{host}:{port}")
+    print(f"   openai base_url: http://{host}:{port}/v1")
+    print(f"   groq base_url:   http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Local SMTP sink
+Accepts mail over SMTP (EHLO, AUTH PLAIN/LOGIN, optional STARTTLS, MAIL/RCPT/DATA,
+NOOP, RSET, QUIT) and discards or saves it, with configurable latency and
+rejections, so email sending can be benchmarked without a real mail server
+
+Point the backend at it with:
+    SMTP_SERVER=127.0.0.1 SMTP_PORT=8025 SMTP_USE_TLS=False
+(any EMAIL_ADDRESS / EMAIL_PASSWORD is accepted). Pass --tls-cert/--tls-key to
+offer STARTTLS and keep SMTP_USE_TLS=True.
+
+Usage:
+    cd backend && python tools/smtp_sink.py --port 8025 --latency-ms 20
+"""
+
+import argparse
+import base64
+import os
+import random
+import socketserver
+import ssl
+import threading
+import time
+import uuid
+
+MAX_MESSAGE_SIZE = 25 * 1024 * 1024
+
+
+class SMTPSinkConfig:
+    """Behaviour settings and counters shared by all sessions"""
+
+    def __init__(self, args):
+        self.hostname = args.hostname
+        self.greeting_latency_ms = args.greeting_latency_ms
+        self.latency_ms = args.latency_ms
+        self.reject_rate = args.reject_rate
+        self.save_dir = args.save_dir
+        self.random = random.Random(args.seed)
+        self.random_lock = threading.Lock()
+
+        self.ssl_context = None
+        if args.tls_cert and args.tls_key:
+            self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self.ssl_context.load_cert_chain(args.tls_cert, args.tls_key)
+
+        if self.save_dir:
+            os.makedirs(self.save_dir, exist_ok=True)
+
+        self.stats_lock = threading.Lock()
+        self.stats = {'connections': 0, 'active_connections': 0, 'logins': 0, 'starttls': 0,
+                      'messages': 0, 'recipients': 0, 'rejected': 0, 'bytes': 0, 'noops': 0}
+
+    def roll(self) -> float:
+        with self.random_lock:
+            return self.random.random()
+
+    def count(self, **fields):
+        with self.stats_lock:
+            for field, amount in fields.items():
+                self.stats[field] = self.stats.get(field, 0) + amount
+
+    def snapshot(self) -> dict:
+        with self.stats_lock:
+            return dict(self.stats)
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """One SMTP session"""
+
+    config = None  # set by make_server()
+
+    def handle(self):
+        config = self.config
+        config.count(connections=1, active_connections=1)
+        try:
+            if config.greeting_latency_ms:
+                time.sleep(config.greeting_latency_ms / 1000.0)
+            self.reply(f"220 {config.hostname} ESMTP sink ready")
+            self.reset()
+            self.session()
+        except (ConnectionError, ssl.SSLError, OSError):
+            pass
+        finally:
+            config.count(active_connections=-1)
+
+    def reset(self):
+        self.mail_from = None
+        self.recipients = []
+
+    def reply(self, line: str):
+        self.wfile.write(line.encode('utf-8') + b"\r\n")
+        self.wfile.flush()
+
+    def read_line(self) -> str:
+        line = self.rfile.readline(MAX_MESSAGE_SIZE)
+        if not line:
+            raise ConnectionError('client closed the connection')
+        return line.decode('utf-8', errors='replace').rstrip('\r\n')
+
+    def session(self):
+        while True:
+            line = self.read_line()
+            command, _, argument = line.partition(' ')
+            command = command.upper()
+
+            if command == 'EHLO':
+                extensions = ['PIPELINING', f'SIZE {MAX_MESSAGE_SIZE}', '8BITMIME', 'AUTH PLAIN LOGIN']
+                if self.config.ssl_context and not isinstance(self.connection, ssl.SSLSocket):
+                    extensions.append('STARTTLS')
+                lines = [self.config.hostname] + extensions
+                for extension in lines[:-1]:
+                    self.reply(f"250-{extension}")
+                self.reply(f"250 {lines[-1]}")
+            elif command == 'HELO':
+                self.reply(f"250 {self.config.hostname}")
+            elif command == 'STARTTLS':
+                self.start_tls()
+            elif command == 'AUTH':
+                self.auth(argument)
+            elif command == 'MAIL':
+                self.reset()
+                self.mail_from = argument
+                self.reply("250 OK")
+            elif command == 'RCPT':
+                if self.mail_from is None:
+                    self.reply("503 Need MAIL before RCPT")
+                    continue
+                self.recipients.append(argument)
+                self.reply("250 OK")
+            elif command == 'DATA':
+                self.data()
+            elif command == 'NOOP':
+                self.config.count(noops=1)
+                self.reply("250 OK")
+            elif command == 'RSET':
+                self.reset()
+                self.reply("250 OK")
+            elif command == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply(f"502 Command not implemented: {command}")
+
+    def start_tls(self):
+        if not self.config.ssl_context or isinstance(self.connection, ssl.SSLSocket):
+            self.reply("454 TLS not available")
+            return
+        self.reply("220 Ready to start TLS")
+        self.connection = self.config.ssl_context.wrap_socket(self.connection, server_side=True)
+        self.rfile = self.connection.makefile('rb', self.rbufsize)
+        self.wfile = self.connection.makefile('wb', self.wbufsize)
+        self.config.count(starttls=1)
+        self.reset()
+
+    def auth(self, argument: str):
+        mechanism, _, initial = argument.partition(' ')
+        mechanism = mechanism.upper()
+        if mechanism == 'PLAIN':
+            if not initial:
+                self.reply("334 ")
+                initial = self.read_line()
+            base64.b64decode(initial or '', validate=False)
+        elif mechanism == 'LOGIN':
+            if not initial:
+                self.reply("334 VXNlcm5hbWU6")
+                self.read_line()
+            self.reply("334 UGFzc3dvcmQ6")
+            self.read_line()
+        else:
+            self.reply(f"504 Unrecognized authentication type {mechanism}")
+            return
+        # Any credentials are accepted
+        self.config.count(logins=1)
+        self.reply("235 Authentication successful")
+
+    def data(self):
+        if not self.recipients:
+            self.reply("503 Need RCPT before DATA")
+            return
+        self.reply("354 End data with <CR><LF>.<CR><LF>")
+        chunks = []
+        size = 0
+        while True:
+            line = self.rfile.readline(MAX_MESSAGE_SIZE)
+            if not line:
+                raise ConnectionError('client closed the connection during DATA')
+            if line in (b".\r\n", b".\n"):
+                break
+            if line.startswith(b".."):
+                line = line[1:]
+            size += len(line)
+            if self.config.save_dir:
+                chunks.append(line)
+
+        if self.config.latency_ms:
+            time.sleep(self.config.latency_ms / 1000.0)
+
+        if self.config.roll() < self.config.reject_rate:
+            self.config.count(rejected=1)
+            self.reply("451 Simulated temporary failure, try again later")
+        else:
+            message_id = uuid.uuid4().hex
+            if self.config.save_dir:
+                with open(os.path.join(self.config.save_dir, f"{message_id}.eml"), 'wb') as f:
+                    f.writelines(chunks)
+            self.config.count(messages=1, recipients=len(self.recipients), bytes=size)
+            self.reply(f"250 OK queued as {message_id}")
+        self.reset()
+
+
+class SMTPSinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Local SMTP sink for email benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--hostname', default='smtp-sink.local', help='Name announced in the greeting')
+    parser.add_argument('--greeting-latency-ms', type=float, default=0, help='Delay before the 220 greeting')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Delay before accepting each message')
+    parser.add_argument('--reject-rate', type=float, default=0.0, help='Fraction of messages answered with 451')
+    parser.add_argument('--save-dir', help='Write accepted messages here as .eml files')
+    parser.add_argument('--tls-cert', help='Certificate file; with --tls-key, offers STARTTLS')
+    parser.add_argument('--tls-key', help='Private key file for --tls-cert')
+    parser.add_argument('--stats-interval', type=float, default=0, help='Print counters every N seconds')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible runs')
+    return parser.parse_args(argv)
+
+
+def make_server(args) -> SMTPSinkServer:
+    """Create the SMTP sink server (not yet serving)"""
+    handler = type('ConfiguredSMTPSinkHandler', (SMTPSinkHandler,), {'config': SMTPSinkConfig(args)})
+    return SMTPSinkServer((args.host, args.port), handler)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = make_server(args)
+    host, port = server.server_address[:2]
+    print(f"📭 SMTP sink listening on {host}:{port}"
+          f"{' (STARTTLS offered)' if server.RequestHandlerClass.config.ssl_context else ''}")
+
+    if args.stats_interval > 0:
+        def report():
+            while True:
+                time.sleep(args.stats_interval)
+                print(f"📊 {server.RequestHandlerClass.config.snapshot()}")
+        threading.Thread(target=report, daemon=True).start()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"📊 {server.RequestHandlerClass.config.snapshot()}")
+
+
+if __name__ == '__main__':
+    main()
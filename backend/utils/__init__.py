@@ -9,6 +9,7 @@ from .env_manager import (
     getenv_bool,
     getenv_int,
     getenv_float,
+    parse_bool,
     require_env
 )
 
@@ -20,6 +21,24 @@ from .crypto import (
     validate_api_key_format
 )
 
+from .deadline import (
+    Deadline,
+    DeadlineExceeded,
+    get_deadline,
+    set_deadline,
+    reset_deadline,
+    deadline_scope,
+    remaining_time,
+    get_request_timeout,
+    get_call_timeout
+)
+
+from .json_codec import (
+    ORJSON_AVAILABLE,
+    JSON_BACKEND,
+    FastJSONProvider
+)
+
 __all__ = [
     'EnvManager',
     'get_env_manager',
@@ -27,10 +46,23 @@ __all__ = [
     'getenv_bool',
     'getenv_int',
     'getenv_float',
+    'parse_bool',
     'require_env',
     'SecureCrypto',
     'get_crypto_instance',
     'encrypt_api_key',
     'decrypt_api_key',
-    'validate_api_key_format'
+    'validate_api_key_format',
+    'Deadline',
+    'DeadlineExceeded',
+    'get_deadline',
+    'set_deadline',
+    'reset_deadline',
+    'deadline_scope',
+    'remaining_time',
+    'get_request_timeout',
+    'get_call_timeout',
+    'ORJSON_AVAILABLE',
+    'JSON_BACKEND',
+    'FastJSONProvider'
 ]
@@ -6,6 +6,7 @@ Provides AES-256 encryption for sensitive data
 import os
 import base64
 import hashlib
+import threading
 from pathlib import Path
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
@@ -40,6 +41,8 @@ class SecureCrypto:
         
         self.master_password = master_password.encode()
         self.salt = b'linkedin_job_assistant_salt'  # In production, use random salt per installation
+        self._fernet = None
+        self._fernet_lock = threading.Lock()
         
     def _save_crypto_key_to_env_file(self, crypto_key: str):
         """Save the generated crypto key to .env file"""
@@ -78,7 +81,16 @@ class SecureCrypto:
             print(f"CRYPTO_MASTER_KEY={crypto_key}")
         
     def _get_fernet_key(self) -> Fernet:
-        """Generate Fernet key from master password"""
+        """Get the Fernet instance, deriving the key from the master password once"""
+        # PBKDF2 with 100k iterations is deliberately slow; derive once per process
+        if self._fernet is None:
+            with self._fernet_lock:
+                if self._fernet is None:
+                    self._fernet = self._derive_fernet()
+        return self._fernet
+    
+    def _derive_fernet(self) -> Fernet:
+        """Derive the Fernet key from the master password"""
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
@@ -117,12 +129,16 @@ class SecureCrypto:
 
 # Global crypto instance
 _crypto_instance = None
+_crypto_instance_lock = threading.Lock()
 
 def get_crypto_instance() -> SecureCrypto:
     """Get or create the global crypto instance"""
     global _crypto_instance
     if _crypto_instance is None:
-        _crypto_instance = SecureCrypto()
+        # Only one thread may generate the master key when none is configured
+        with _crypto_instance_lock:
+            if _crypto_instance is None:
+                _crypto_instance = SecureCrypto()
     return _crypto_instance
 
 
@@ -0,0 +1,140 @@
+"""
+Request deadline utilities
+Propagates the time budget of an HTTP request down to provider calls
+"""
+
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+from .env_manager import getenv_float
+
+
+class DeadlineExceeded(Exception):
+    """Raised when there is not enough time left for an operation"""
+    pass
+
+
+class Deadline:
+    """Absolute point in time by which a request must be answered"""
+
+    def __init__(self, timeout: float):
+        """
+        Initialize deadline
+
+        Args:
+            timeout: Seconds from now until the deadline
+        """
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        """Seconds left until the deadline (never negative)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        """Check if the deadline has passed"""
+        return self.remaining() <= 0
+
+
+_current_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+def get_deadline() -> Optional[Deadline]:
+    """Get the deadline of the current request, if any"""
+    return _current_deadline.get()
+
+
+def set_deadline(timeout: float) -> contextvars.Token:
+    """
+    Set the deadline for the current request context
+
+    A deadline that is already active is only ever tightened, never extended
+
+    Args:
+        timeout: Seconds from now until the deadline
+
+    Returns:
+        Token to pass to reset_deadline()
+    """
+    current = _current_deadline.get()
+    deadline = Deadline(timeout)
+    if current is not None and current.expires_at < deadline.expires_at:
+        deadline = current
+    return _current_deadline.set(deadline)
+
+
+def reset_deadline(token: contextvars.Token):
+    """Restore the deadline that was active before set_deadline()"""
+    _current_deadline.reset(token)
+
+
+@contextmanager
+def deadline_scope(timeout: Optional[float]):
+    """Context manager that applies a deadline to the enclosed block"""
+    if timeout is None:
+        yield get_deadline()
+        return
+    token = set_deadline(timeout)
+    try:
+        yield get_deadline()
+    finally:
+        reset_deadline(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left in the current request, or None without a deadline"""
+    deadline = get_deadline()
+    return deadline.remaining() if deadline else None
+
+
+def get_request_timeout(client_timeout: Optional[str] = None) -> float:
+    """
+    Get the time budget for an incoming HTTP request
+
+    Args:
+        client_timeout: X-Request-Timeout header value, which can only shorten
+            REQUEST_DEADLINE_SECONDS
+
+    Returns:
+        Seconds until the request deadline
+    """
+    # Stay under gunicorn's worker timeout so slow providers fall back instead of killing the worker
+    timeout = getenv_float('REQUEST_DEADLINE_SECONDS', 25.0)
+    if client_timeout:
+        try:
+            timeout = min(timeout, float(client_timeout))
+        except ValueError:
+            pass
+    return timeout
+
+
+def get_call_timeout(default: float, reserve: Optional[float] = None, minimum: Optional[float] = None) -> float:
+    """
+    Get the timeout to use for an outbound call
+
+    Args:
+        default: Timeout to use when no deadline is set (also an upper bound)
+        reserve: Seconds kept back for fallback work and the response
+        minimum: Smallest timeout worth attempting a call with
+
+    Returns:
+        Timeout in seconds
+
+    Raises:
+        DeadlineExceeded: If less than minimum seconds remain
+    """
+    deadline = get_deadline()
+    if deadline is None:
+        return default
+
+    if reserve is None:
+        reserve = getenv_float('DEADLINE_RESERVE_SECONDS', 1.0)
+    if minimum is None:
+        minimum = getenv_float('PROVIDER_MIN_TIMEOUT_SECONDS', 1.0)
+
+    available = deadline.remaining() - reserve
+    if available < minimum:
+        raise DeadlineExceeded(f"Request deadline leaves {max(0.0, available):.2f}s, need at least {minimum:.2f}s")
+    return min(default, available)
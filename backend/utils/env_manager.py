@@ -4,8 +4,9 @@ Centralized environment variable loading with .env support
 """
 
 import os
+import threading
 from pathlib import Path
-from typing import Union, Optional
+from typing import Any, Union, Optional
 
 # Import dotenv if available
 try:
@@ -103,8 +104,7 @@ class EnvManager:
         Returns:
             Boolean value of environment variable
         """
-        value = self.get(key, str(default)).lower()
-        return value in ('true', '1', 'yes', 'on')
+        return parse_bool(self.get(key), default)
     
     def get_int(self, key: str, default: int = 0) -> int:
         """
@@ -177,12 +177,15 @@ class EnvManager:
 
 # Global environment manager instance
 _env_manager = None
+_env_manager_lock = threading.Lock()
 
 def get_env_manager() -> EnvManager:
     """Get or create the global environment manager instance"""
     global _env_manager
     if _env_manager is None:
-        _env_manager = EnvManager()
+        with _env_manager_lock:
+            if _env_manager is None:
+                _env_manager = EnvManager()
     return _env_manager
 
 def getenv(key: str, default: Optional[str] = None) -> Optional[str]:
@@ -199,6 +202,23 @@ def getenv(key: str, default: Optional[str] = None) -> Optional[str]:
     env_manager = get_env_manager()
     return env_manager.get(key, default)
 
+def parse_bool(value: Any, default: bool = False) -> bool:
+    """
+    Parse a boolean setting the way environment variables are parsed
+    
+    Args:
+        value: Setting value ('true'/'1'/'yes'/'on' are true, other strings false)
+        default: Value used when the setting is None
+        
+    Returns:
+        Boolean value of the setting
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('true', '1', 'yes', 'on')
+
 def getenv_bool(key: str, default: bool = False) -> bool:
     """
     Convenience function to get environment variable as boolean
@@ -0,0 +1,112 @@
+"""
+JSON encoding for request and response bodies
+Uses orjson when it is installed and the standard library otherwise, and
+provides the Flask JSON provider built on it
+"""
+
+import json
+from typing import Any, Callable, Optional, Union
+
+from flask.json.provider import DefaultJSONProvider
+
+from .env_manager import getenv, getenv_bool
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# JSON_BACKEND=json forces the standard library even when orjson is installed
+JSON_BACKEND = 'orjson' if ORJSON_AVAILABLE and getenv('JSON_BACKEND', 'auto').lower() in ('auto', 'orjson') else 'json'
+
+
+def dumps_bytes(obj: Any, default: Optional[Callable[[Any], Any]] = None, sort_keys: bool = False,
+                indent: bool = False) -> bytes:
+    """
+    Serialize a value to JSON bytes, compact unless indent is set
+
+    Args:
+        obj: Value to serialize
+        default: Called for objects the encoder doesn't support; returns a
+            serializable value or raises TypeError
+        sort_keys: Sort the keys of every dict
+        indent: Pretty-print with two-space indentation
+
+    Returns:
+        Encoded JSON
+    """
+    if JSON_BACKEND == 'orjson':
+        # Dates go through default like they do with the stdlib encoder
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=default, option=option)
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits and other values orjson rejects; the stdlib encoder decides
+            pass
+    return _stdlib_dumps(obj, default, sort_keys, indent).encode('utf-8')
+
+
+def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None, sort_keys: bool = False,
+          indent: bool = False) -> str:
+    """Serialize a value to a JSON string (see dumps_bytes())"""
+    if JSON_BACKEND == 'orjson':
+        return dumps_bytes(obj, default, sort_keys, indent).decode('utf-8')
+    return _stdlib_dumps(obj, default, sort_keys, indent)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Deserialize JSON from text or UTF-8 bytes
+
+    Raises:
+        ValueError: If the data is not valid JSON
+    """
+    if JSON_BACKEND == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _stdlib_dumps(obj: Any, default: Optional[Callable[[Any], Any]], sort_keys: bool, indent: bool) -> str:
+    # ASCII output: escaping is cheaper here than building and encoding a wide string
+    if indent:
+        return json.dumps(obj, default=default, sort_keys=sort_keys, indent=2)
+    return json.dumps(obj, default=default, sort_keys=sort_keys, separators=(',', ':'))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider for request.get_json() and jsonify() built on this codec
+
+    Serializes dates, UUIDs, dataclasses and Markup like Flask's default
+    provider. Output is compact unless the app is in debug mode, and keys are
+    only sorted with JSON_SORT_KEYS=True.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.sort_keys = getenv_bool('JSON_SORT_KEYS', False)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """Serialize data as JSON to a string (json.dumps() options other than indent fall back to it)"""
+        if set(kwargs) - {'default', 'sort_keys', 'indent', 'separators', 'ensure_ascii'}:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, kwargs.get('default', self.default), kwargs.get('sort_keys', self.sort_keys),
+                     bool(kwargs.get('indent')))
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        """Deserialize data as JSON from a string or bytes"""
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        """Serialize the arguments as a JSON response, encoded straight to bytes"""
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = dumps_bytes(obj, self.default, self.sort_keys, indent) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -385,7 +385,8 @@ class ResumeParser:
                 'match_percentage': 0
             }
 
-# Global instance for use across the application
+# Global instance for use across the application; it is only read after
+# construction, so request threads share it without locking
 resume_parser = ResumeParser()
 
 def parse_resume_file(file_path: str) -> Dict[str, Any]:
@@ -824,8 +824,10 @@ class BackgroundService {
 
             const result = await response.json();
 
-            // Store successful result in cache
-            await this.cache.storeAnalysis(jobData, result);
+            // Store successful result in cache (the backend's rule-based fallback is retried next time)
+            if (!result.fallback) {
+                await this.cache.storeAnalysis(jobData, result);
+            }
 
             return { success: true, data: result };
 
@@ -856,11 +858,20 @@ class BackgroundService {
                 body: JSON.stringify(emailData)
             });
 
+            const result = await response.json().catch(() => ({}));
             if (!response.ok) {
-                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+                throw new Error(result.error || `HTTP ${response.status}: ${response.statusText}`);
+            }
+
+            // Queued sends (202) are only accepted; follow them until they are delivered or fail
+            if (result.status_url && result.status !== 'sent') {
+                const delivery = await this.waitForEmailDelivery(result.status_url);
+                if (delivery.status === 'failed') {
+                    throw new Error(delivery.last_error || 'Email delivery failed');
+                }
+                result.status = delivery.status;
             }
 
-            const result = await response.json();
             return { success: true, data: result };
 
         } catch (error) {
@@ -869,6 +880,30 @@ class BackgroundService {
         }
     }
 
+    // Poll a queued email's delivery state until it is sent or failed, or the wait runs out
+    async waitForEmailDelivery(statusUrl, timeoutMs = 60000, intervalMs = 2000) {
+        const giveUpAt = Date.now() + timeoutMs;
+        let delivery = { status: 'queued' };
+
+        while (Date.now() < giveUpAt) {
+            await new Promise(resolve => setTimeout(resolve, intervalMs));
+            try {
+                const response = await fetch(`${this.API_BASE_URL}${statusUrl}`);
+                if (response.ok) {
+                    delivery = await response.json();
+                    if (delivery.status === 'sent' || delivery.status === 'failed') {
+                        return delivery;
+                    }
+                }
+            } catch (error) {
+                console.warn('Error checking email status:', error);
+            }
+        }
+
+        // Still queued (e.g. retrying a transient SMTP failure); the backend keeps trying
+        return delivery;
+    }
+
     // Get user profile from storage
     async getUserProfile() {
         try {
@@ -925,7 +960,8 @@ class BackgroundService {
                 },
                 body: JSON.stringify({
                     jobs: data.jobs,
-                    user_profile: await this.getUserProfileData()
+                    user_profile: await this.getUserProfileData(),
+                    response_mode: 'ids'
                 })
             });
 
@@ -934,6 +970,11 @@ class BackgroundService {
             }
 
             const result = await response.json();
+
+            // Slim responses list the kept jobs by index instead of sending them back
+            if (Array.isArray(result.results)) {
+                result.filteredJobs = result.results.map(kept => data.jobs[kept.index]);
+            }
             return { success: true, data: result };
 
         } catch (error) {
@@ -845,7 +845,8 @@ class LinkedInJobAssistant {
       });
 
       if (response && response.success) {
-        this.showNotification('Email sent successfully!', 'success');
+        const queued = response.data && response.data.status && response.data.status !== 'sent';
+        this.showNotification(queued ? 'Email queued for delivery' : 'Email sent successfully!', 'success');
         document.getElementById('job-assistant-modal').remove();
       } else {
         this.showNotification(response.error || 'Failed to send email', 'error');
@@ -337,7 +337,8 @@ class PopupController {
             });
 
             if (response && response.success) {
-                this.showNotification('Email sent successfully!', 'success');
+                const queued = response.data?.status && response.data.status !== 'sent';
+                this.showNotification(queued ? 'Email queued for delivery' : 'Email sent successfully!', 'success');
                 this.updateStats('applied');
             } else {
                 throw new Error(response?.error || 'Failed to send email');
@@ -345,7 +346,7 @@ class PopupController {
 
         } catch (error) {
             console.error('Error sending email:', error);
-            this.showNotification('Failed to send email', 'error');
+            this.showNotification(error.message || 'Failed to send email', 'error');
         } finally {
             this.hideLoading();
         }